@@ -24,16 +24,12 @@ def scrape():
 
     #Getting data and cleaning it up
     header_titles = [ title.text.strip().replace('\xa0', ' ') for title in headers ]
-    dataframe = pd.DataFrame( columns= header_titles)
     # pd.set_option('display.max_columns', None)
     column_data = latest_insider_purchase_table.find_all('tr')
 
-    #Creating the dataframe
-    for row in column_data[1:]:
-        row_data = row.find_all('td')
-        each_row_data = [individual_data.text.strip() for individual_data in row_data]
-        length = len(dataframe)
-        dataframe.loc[length] = each_row_data
+    #Creating the dataframe in one go from all the rows (appending with .loc is quadratic)
+    rows = [[individual_data.text.strip() for individual_data in row.find_all('td')] for row in column_data[1:]]
+    dataframe = pd.DataFrame(rows, columns=header_titles)
 
     # Turning the percentage into integers and putting them back in DF to compare
     dataframe.iloc[:, 11] = dataframe.iloc[:, 11].replace('%', '', regex=True)
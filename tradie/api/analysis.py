@@ -0,0 +1,258 @@
+from datetime import datetime, timedelta
+
+import json
+import logging
+import os
+import queue
+import threading
+
+from barstore import bar_store
+from pricecache import MARKET_TZ, TTLCache
+import metrics
+import promptbuilder
+from refresher import DATA_DIR
+import upstream
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_DIR = os.path.join(DATA_DIR, 'analysis')
+GEMINI_MODEL = 'gemini-1.5-flash'
+# Background pre-generation for tickers in each new scrape, off unless asked for (every call costs money)
+PRECOMPUTE = os.environ.get('TRADIE_PRECOMPUTE_ANALYSIS', '0') == '1'
+PRECOMPUTE_LIMIT = int(os.environ.get('TRADIE_PRECOMPUTE_LIMIT', '20'))
+
+
+# From the environment (or set_gemini_key), google.generativeai is configured with it on the first analysis
+_gemini_key = os.environ.get('GEMINI_API_KEY')
+_genai = None
+
+
+def set_gemini_key(api_key: str):
+    global _gemini_key
+    _gemini_key = api_key
+
+
+def gemini():
+    """google.generativeai, imported and configured on first use (it takes about a second to import)"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=_gemini_key)
+        _genai = genai
+    return _genai
+
+
+class GeminiClient:
+    def generate(self, prompt: str) -> str:
+        model = gemini().GenerativeModel(GEMINI_MODEL)
+        response = upstream.gemini.run(model.generate_content, prompt,
+                                       request_options={'timeout': upstream.gemini.timeout})
+        return response.text
+
+
+class FakeLLMClient:
+    """Offline stand-in for Gemini, answers instantly in the expected format"""
+
+    def __init__(self, summary: str = 'Fake summary.', prediction: str = 'Fake prediction.'):
+        self.summary = summary
+        self.prediction = prediction
+        self.prompts = []
+
+    def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return f"[SUMMARY]\n{self.summary}\n\n[PREDICTION]\n{self.prediction}"
+
+
+_llm_client = FakeLLMClient() if os.environ.get('TRADIE_LLM') == 'fake' else GeminiClient()
+
+
+def set_llm_client(client):
+    """Swap the model client (anything with generate(prompt) -> str), e.g. FakeLLMClient() offline"""
+    global _llm_client
+    _llm_client = client
+
+
+def trading_day(now: datetime = None) -> str:
+    # New York date, weekends share Friday's analysis
+    day = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ).date()
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day.isoformat()
+
+
+# Where the insider rows for the prompt come from, wired to the refresher by the app
+_insider_frame = lambda: None
+
+
+def set_insider_source(provider):
+    """`provider()` returns the current insider dataframe"""
+    global _insider_frame
+    _insider_frame = provider
+
+
+def optional(fetch):
+    # Analyst counts and headlines are nice to have, the prompt goes out without them
+    try:
+        return upstream.yahoo.run(fetch)
+    except Exception as e:
+        logger.info("Leaving a prompt section out: %s: %s", type(e).__name__, e)
+        return None
+
+
+def fetch_stock_data(ticker: str):
+    """(info, recommendations, news) from Yahoo for the prompt"""
+    import yfinance as yf
+    stock = yf.Ticker(ticker)
+    info = upstream.yahoo.run(lambda: stock.info)
+    return info, optional(lambda: stock.recommendations), optional(lambda: stock.news)
+
+
+_stock_data = fetch_stock_data
+
+
+def set_stock_source(fetch):
+    """Swap where the prompt's company data comes from (`fetch(ticker) -> (info, recommendations, news)`)"""
+    global _stock_data
+    _stock_data = fetch
+
+
+def build_prompt(ticker: str, budget: int = promptbuilder.TOKEN_BUDGET) -> str:
+    """Compact prompt from computed metrics (see promptbuilder), within `budget` tokens"""
+    info, recommendations, news = _stock_data(ticker)
+    # Same daily bars the charts use, usually already local
+    bars = bar_store().daily(ticker)
+    sections = promptbuilder.build_sections(ticker, info, bars, recommendations, news, _insider_frame())
+    return promptbuilder.render_prompt(ticker, sections, name=(info or {}).get('longName'), budget=budget)
+
+
+def parse_response(response_text: str) -> dict:
+    # Split the response into summary and prediction
+    summary = ""
+    prediction = ""
+    if "[SUMMARY]" in response_text and "[PREDICTION]" in response_text:
+        parts = response_text.split("[PREDICTION]")
+        summary = parts[0].replace("[SUMMARY]", "").strip()
+        prediction = parts[1].strip()
+    if not summary and not prediction:
+        raise ValueError("Model response had no [SUMMARY]/[PREDICTION] sections")
+    return {
+        "summary": summary,
+        "prediction": prediction
+    }
+
+
+def generate_analysis(ticker: str) -> dict:
+    """Build the prompt and ask the model, raises on any failure"""
+    prompt = build_prompt(ticker)
+    with metrics.stage('llm'):
+        response = _llm_client.generate(prompt)
+    return parse_response(response)
+
+
+class AnalysisCache:
+    """Analyses cached per (ticker, trading day) on disk, one generation at a time per key.
+
+    The in-memory layer is a TTLCache, so a second tap on a ticker whose
+    analysis is still being generated waits for that call instead of starting
+    another one.
+    """
+
+    def __init__(self, directory: str = ANALYSIS_DIR):
+        self.directory = directory
+        self._memory = TTLCache(maxsize=512, ttl=lambda key, value: 24 * 3600, name='analysis')
+        self.generated = 0
+        self.disk_hits = 0
+
+    def path(self, ticker: str, day: str) -> str:
+        return os.path.join(self.directory, day, f'{ticker}.json')
+
+    def get(self, ticker: str) -> dict:
+        ticker = ticker.strip().upper()
+        day = trading_day()
+        return self._memory.get((ticker, day), lambda: self._load_or_generate(ticker, day))
+
+    def _load_or_generate(self, ticker: str, day: str) -> dict:
+        path = self.path(ticker, day)
+        try:
+            with open(path, encoding='utf-8') as f:
+                result = json.load(f)
+            self.disk_hits += 1
+            return result
+        except (FileNotFoundError, ValueError):
+            pass
+        result = generate_analysis(ticker)
+        self.generated += 1
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        return result
+
+    def has(self, ticker: str) -> bool:
+        return os.path.exists(self.path(ticker.strip().upper(), trading_day()))
+
+    def stats(self) -> dict:
+        return {**self._memory.stats(), 'generated': self.generated, 'diskHits': self.disk_hits}
+
+
+analysis_cache = AnalysisCache()
+
+
+def ai_analysis(ticker: str):
+    try:
+        return analysis_cache.get(ticker)
+    except upstream.UpstreamUnavailable:
+        # The endpoint answers 503 with Retry-After instead
+        raise
+    except Exception as e:
+        logger.exception("Error in AI analysis for %s", ticker)
+        return {
+            "error": f"Failed to generate analysis for {ticker}. Error: {str(e)}",
+            "summary": "Unable to generate analysis at this time.",
+            "prediction": "Please try again later."
+        }
+
+
+class AnalysisPrecomputer:
+    """Generates analyses for tickers in each new scrape on one background thread.
+
+    Hooked to the refresher, newest filings first, at most PRECOMPUTE_LIMIT
+    tickers per snapshot. Shares AnalysisCache with the endpoint, so a user
+    opening a card that is being precomputed waits for that same call.
+    """
+
+    def __init__(self, cache: AnalysisCache = analysis_cache, limit: int = PRECOMPUTE_LIMIT):
+        self.cache = cache
+        self.limit = limit
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def on_snapshot(self, snapshot):
+        frame = snapshot.frame.sort_values('filingTs', ascending=False, kind='stable')
+        tickers = [ticker for ticker in frame['ticker'].drop_duplicates() if not self.cache.has(ticker)]
+        for ticker in tickers[:self.limit]:
+            self._queue.put(ticker)
+
+    def _run(self):
+        while True:
+            ticker = self._queue.get()
+            if ticker is None:
+                break
+            try:
+                self.cache.get(ticker)
+            except Exception as e:
+                logger.warning("Could not precompute analysis for %s: %s", ticker, e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='analysis-precompute', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            # Drop whatever is still queued
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put(None)
+            self._thread = None
@@ -0,0 +1,218 @@
+"""Do the feed's filters pick buys that go on to beat the rest? Offline backtest.
+
+Joins the stored insider history (tradestore.py) with the stored daily bars
+(barstore.py), never the network: each buy enters at the first close on or
+after its filing (when the public could know about it, so a filing at or
+after the 16:00 ET close enters on the next session) and exits at the last
+close on or before entry + horizon. Both lookups are as-of joins
+over the whole history at once. Large universes are split by ticker across
+a process pool.
+
+    python backtest.py [--filter NAME:key=value,...] [--workers N] [--csv out.csv]
+
+Custom filters take role (ceo, pres, cfo, dir, ten), min_delta_own,
+min_value and min_score, e.g. --filter big_ceo:role=ceo,min_value=1000000
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+from barstore import BARS_PATH, BarStore
+from pricecache import MARKET_CLOSE
+from roles import ROLES, build_role_index
+import signals
+from tradestore import TRADES_PATH, TradeStore
+
+# Horizon -> calendar days after entry
+HORIZONS = {'1w': 7, '1m': 30, '3m': 91, '1y': 365}
+# A buy without a close this many days after its filing (delisted, no bars stored) is left out
+ENTRY_TOLERANCE_DAYS = 7
+# Tickers per worker task
+CHUNK_TICKERS = 250
+
+
+class BacktestError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Filter:
+    """Which buys count: a role bucket (the same ones the feed serves) and/or thresholds"""
+    name: str
+    role: str = None
+    min_delta_own: float = None
+    min_value: float = None
+    min_score: float = None
+
+    def mask(self, trades: pd.DataFrame, role_index: dict, scores: pd.Series = None) -> np.ndarray:
+        keep = np.ones(len(trades), dtype=bool)
+        if self.role is not None:
+            in_role = np.zeros(len(trades), dtype=bool)
+            in_role[role_index[self.role]] = True
+            keep &= in_role
+        if self.min_delta_own is not None:
+            keep &= trades['percentOwnedIncrease'].to_numpy() >= self.min_delta_own
+        if self.min_value is not None:
+            keep &= np.nan_to_num(trades['valueNum'].to_numpy(dtype=float), nan=-np.inf) >= self.min_value
+        if self.min_score is not None:
+            keep &= scores.to_numpy() >= self.min_score
+        return keep
+
+
+# Named like the API's filter functions
+FILTERS = [
+    Filter('all'),
+    Filter('ceo', role='ceo'),
+    Filter('pres', role='pres'),
+    Filter('cfo', role='cfo'),
+    Filter('director', role='dir'),
+    Filter('ten_percent_owner', role='ten'),
+]
+
+
+def parse_filter(spec: str) -> Filter:
+    """'name:role=ceo,min_value=1000000' -> Filter"""
+    name, _, options = spec.partition(':')
+    if not name or not options:
+        raise BacktestError(f"Expected NAME:key=value,... got {spec!r}")
+    fields = {}
+    for option in options.split(','):
+        key, _, value = option.partition('=')
+        key = key.strip()
+        if key == 'role':
+            if value not in ROLES:
+                raise BacktestError(f"Unknown role {value!r}, expected any of {', '.join(ROLES)}")
+            fields['role'] = value
+        elif key in ('min_delta_own', 'min_value', 'min_score'):
+            try:
+                fields[key] = float(value)
+            except ValueError:
+                raise BacktestError(f"{key} must be a number, got {value!r}")
+        else:
+            raise BacktestError(f"Unknown filter option {key!r}")
+    return Filter(name, **fields)
+
+
+def forward_returns(trades: pd.DataFrame, closes: pd.DataFrame, horizons: dict = HORIZONS) -> pd.DataFrame:
+    """entryDate, entryClose and a return per horizon for every trade (NaN if it hasn't elapsed or no bars).
+
+    `closes` are long rows (ticker, date, close) as BarStore.closes returns them.
+    """
+    # OpenInsider filing times are Eastern, one filed after the close can't get that day's close
+    filing_day = trades['filingTs'].dt.normalize()
+    after_close = (trades['filingTs'] - filing_day) >= pd.Timedelta(hours=MARKET_CLOSE.hour, minutes=MARKET_CLOSE.minute)
+    entry_from = filing_day + pd.to_timedelta(after_close.astype(int), unit='D')
+    trades = trades.assign(row=np.arange(len(trades)), entryFrom=entry_from.astype('datetime64[ns]'))
+    known = trades[trades['entryFrom'].notna()].sort_values('entryFrom', kind='stable')
+    closes = closes.assign(date=closes['date'].astype('datetime64[ns]')).sort_values('date', kind='stable')
+    last_bar = closes.groupby('ticker')['date'].max()
+
+    entries = pd.merge_asof(known, closes.rename(columns={'date': 'entryDate', 'close': 'entryClose'}),
+                            left_on='entryFrom', right_on='entryDate', by='ticker', direction='forward',
+                            tolerance=pd.Timedelta(days=ENTRY_TOLERANCE_DAYS))
+    entries = entries[entries['entryClose'].notna()]
+    rows = entries['row'].to_numpy()
+    result = {'entryDate': np.full(len(trades), np.datetime64('NaT'), dtype='datetime64[ns]'),
+              'entryClose': np.full(len(trades), np.nan)}
+    result['entryDate'][rows] = entries['entryDate'].to_numpy()
+    result['entryClose'][rows] = entries['entryClose'].to_numpy()
+
+    for horizon, days in horizons.items():
+        targets = entries.assign(target=entries['entryDate'] + pd.Timedelta(days=days)).sort_values('target')
+        exits = pd.merge_asof(targets, closes.rename(columns={'date': 'exitDate', 'close': 'exitClose'}),
+                              left_on='target', right_on='exitDate', by='ticker', direction='backward')
+        # Only horizons that have fully elapsed in the stored bars
+        elapsed = exits['target'].to_numpy() <= exits['ticker'].map(last_bar).to_numpy()
+        returns = np.full(len(trades), np.nan)
+        returns[exits['row'].to_numpy()] = np.where(elapsed & (exits['exitDate'] > exits['entryDate']).to_numpy(),
+                                                    exits['exitClose'].to_numpy() / exits['entryClose'].to_numpy() - 1,
+                                                    np.nan)
+        result[horizon] = returns
+    return pd.DataFrame(result)
+
+
+def _chunk_returns(bars_path: str, trades: pd.DataFrame, horizons: dict) -> pd.DataFrame:
+    # Worker process: read this chunk's closes straight from SQLite
+    closes = BarStore(bars_path).closes(sorted(trades['ticker'].dropna().unique()))
+    return forward_returns(trades, closes, horizons).set_index(trades.index)
+
+
+def all_forward_returns(trades: pd.DataFrame, bars_path: str, horizons: dict = HORIZONS,
+                        workers: int = None) -> pd.DataFrame:
+    """forward_returns over the whole history, chunks of CHUNK_TICKERS tickers on a process pool"""
+    tickers = trades['ticker'].dropna().unique()
+    chunks = [trades[trades['ticker'].isin(tickers[i:i + CHUNK_TICKERS])]
+              for i in range(0, len(tickers), CHUNK_TICKERS)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        parts = [_chunk_returns(bars_path, chunk, horizons) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            parts = list(pool.map(_chunk_returns, [bars_path] * len(chunks), chunks, [horizons] * len(chunks)))
+    if not parts:
+        return forward_returns(trades, pd.DataFrame(columns=['ticker', 'date', 'close']), horizons)
+    return pd.concat(parts).reindex(trades.index)
+
+
+def summarize(trades: pd.DataFrame, returns: pd.DataFrame, filters: list = FILTERS,
+              horizons: dict = HORIZONS) -> pd.DataFrame:
+    """One row per filter and horizon: trades with a return, mean / median return, hit rate and excess over 'all'"""
+    trades = trades.reset_index(drop=True)
+    returns = returns.reset_index(drop=True)
+    role_index = build_role_index(trades)
+    scores = None
+    if any(f.min_score is not None for f in filters):
+        scores = signals.score_frame(trades)['score']
+    baseline = {horizon: returns[horizon].mean() for horizon in horizons}
+    rows = []
+    for f in filters:
+        mask = f.mask(trades, role_index, scores)
+        for horizon in horizons:
+            values = returns.loc[mask, horizon].dropna().to_numpy()
+            mean = values.mean() if len(values) else np.nan
+            rows.append({
+                'filter': f.name,
+                'horizon': horizon,
+                'trades': int(mask.sum()),
+                'withReturn': len(values),
+                'meanReturn': mean,
+                'medianReturn': np.median(values) if len(values) else np.nan,
+                'hitRate': (values > 0).mean() if len(values) else np.nan,
+                'excessReturn': mean - baseline[horizon],
+            })
+    return pd.DataFrame(rows)
+
+
+def run(trades: pd.DataFrame, bars_path: str, filters: list = FILTERS, horizons: dict = HORIZONS,
+        workers: int = None) -> pd.DataFrame:
+    returns = all_forward_returns(trades, bars_path, horizons, workers)
+    return summarize(trades, returns, filters, horizons)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trades', default=TRADES_PATH, help='trade history (SQLite)')
+    parser.add_argument('--bars', default=BARS_PATH, help='daily bars (SQLite)')
+    parser.add_argument('--filter', action='append', default=[], help='extra filter NAME:key=value,...')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--csv', help='also write the summary here')
+    args = parser.parse_args()
+    try:
+        filters = FILTERS + [parse_filter(spec) for spec in args.filter]
+    except BacktestError as e:
+        parser.error(str(e))
+
+    trades = TradeStore(args.trades).frame()
+    summary = run(trades, args.bars, filters, workers=args.workers)
+    if args.csv:
+        summary.to_csv(args.csv, index=False)
+    print(f"{len(trades):,} buys, {trades['ticker'].nunique():,} tickers\n")
+    print(summary.to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+
+
+if __name__ == '__main__':
+    main()
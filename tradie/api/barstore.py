@@ -0,0 +1,298 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from dateutil.relativedelta import relativedelta
+
+import logging
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+from pricecache import MARKET_TZ, TTLCache, TTL_EMPTY, TTL_STALE, history_ttl
+import metrics
+from refresher import DATA_DIR
+import upstream
+
+logger = logging.getLogger(__name__)
+
+BARS_PATH = os.path.join(DATA_DIR, 'bars.sqlite')
+# Daily history kept per ticker, enough for the longest chart range (1y) plus YTD
+HISTORY_YEARS = int(os.environ.get('TRADIE_BAR_HISTORY_YEARS', '2'))
+# Tickers whose bars stay loaded in memory
+BAR_CACHE_SIZE = int(os.environ.get('TRADIE_BAR_CACHE_SIZE', '256'))
+# A tail close that moved more than this was re-adjusted upstream (dividend/split), refetch everything
+ADJUSTMENT_TOLERANCE = 0.005
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Chart ranges -> (first day of the window, bar size)
+RANGES = {
+    'ytd': (lambda today: date(today.year, 1, 1), 'weekly'),
+    '1y': (lambda today: today - relativedelta(years=1), 'weekly'),
+    '3m': (lambda today: today - relativedelta(months=3), 'daily'),
+    '1m': (lambda today: today - relativedelta(months=1), 'daily'),
+    '1w': (lambda today: today - relativedelta(weeks=1), 'daily'),
+    '1d': (None, 'daily'),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    ticker TEXT PRIMARY KEY,
+    requested_start TEXT NOT NULL,
+    timezone TEXT,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+def fetch_daily(ticker: str, start: date, end: date) -> pd.DataFrame:
+    import yfinance as yf  # imported on first use, see pricecache.get_history
+    return upstream.yahoo.run(yf.Ticker(ticker).history, interval='1d', start=start, end=end,
+                              timeout=upstream.yahoo.timeout)
+
+
+def fetch_daily_many(tickers: list, start: date, end: date) -> dict:
+    """ticker -> daily bars for many tickers in one multi-symbol download"""
+    import yfinance as yf
+    frame = upstream.yahoo.run(yf.download, tickers, start=start, end=end, interval='1d', group_by='ticker',
+                               auto_adjust=True, progress=False, threads=True, timeout=upstream.yahoo.timeout)
+    result = {}
+    for ticker in tickers:
+        if frame is None or frame.empty or ticker not in frame.columns.get_level_values(0):
+            result[ticker] = pd.DataFrame(columns=COLUMNS)
+            continue
+        bars = frame[ticker].dropna(how='all')
+        # download() drops the time zone of daily bars, OpenInsider only lists US exchanges
+        if bars.index.tz is None:
+            bars.index = bars.index.tz_localize(MARKET_TZ)
+        result[ticker] = bars
+    return result
+
+
+def to_weekly(daily: pd.DataFrame) -> pd.DataFrame:
+    """Monday-labelled weekly bars, the same shape yfinance's 1wk interval returns"""
+    weekly = daily.resample('W-MON', label='left', closed='left').agg(
+        {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'})
+    return weekly.dropna(subset=['Close'])
+
+
+class BarStore:
+    """Daily bars per ticker, kept in SQLite and in memory.
+
+    The first request for a ticker downloads HISTORY_YEARS of daily bars, later
+    ones only fetch the tail since the last stored bar once the in-memory copy
+    expires (history_ttl, so every couple of minutes while the market trades).
+    Every chart range is then sliced / resampled locally. When Yahoo is
+    unavailable, the last bars we have (in memory or in SQLite) are served.
+    """
+
+    def __init__(self, path: str = BARS_PATH, fetch=fetch_daily, fetch_many=fetch_daily_many):
+        self.path = path
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self._write_lock = threading.Lock()
+        self._frames = TTLCache(maxsize=BAR_CACHE_SIZE, ttl=self._frame_ttl, stale_ttl=TTL_STALE, name='bars')
+        self.upstream_fetches = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Commit on success, always close (sqlite3's own context manager only commits)
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _frame_ttl(key, frame) -> float:
+        return TTL_EMPTY if len(frame) == 0 else history_ttl(date.today())
+
+    def daily(self, ticker: str) -> pd.DataFrame:
+        ticker = ticker.strip().upper()
+        return self._frames.get(ticker, lambda: self._sync(ticker))
+
+    def daily_many(self, tickers: list) -> dict:
+        """daily() for many tickers, the ones not in memory are synced with batched downloads first"""
+        tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers))
+        stale = [ticker for ticker in tickers if not self._frames.fresh(ticker)]
+        if len(stale) > 1:
+            try:
+                self._sync_many(stale)
+            except Exception as e:
+                # daily() below still syncs them one at a time
+                logger.warning("Batched bar download failed, fetching %d tickers one by one: %s", len(stale), e)
+            else:
+                # Otherwise daily() would serve the stale in-memory copies the download just replaced
+                for ticker in stale:
+                    self._frames.put(ticker, self._read(ticker))
+        return {ticker: self.daily(ticker) for ticker in tickers}
+
+    def chart(self, ticker: str, range_name: str) -> pd.DataFrame:
+        """Bars for one of RANGES, indexed by Date"""
+        start_for, bar_size = RANGES[range_name]
+        daily = self.daily(ticker)
+        if daily.empty:
+            return daily
+        if start_for is None:
+            return daily.iloc[-1:]
+        start = pd.Timestamp(start_for(date.today()))
+        if daily.index.tz is not None:
+            start = start.tz_localize(daily.index.tz)
+        window = daily[daily.index >= start]
+        return to_weekly(window) if bar_size == 'weekly' else window
+
+    # Syncing with yfinance
+    def _plan(self, ticker: str, today: date):
+        """('full' | 'tail' | None, coverage row, last stored (date, close))"""
+        with self._connect() as db:
+            coverage = db.execute('SELECT requested_start, timezone, checked_at FROM coverage WHERE ticker = ?',
+                                  (ticker,)).fetchone()
+            last = db.execute('SELECT date, close FROM bars WHERE ticker = ? ORDER BY date DESC LIMIT 1',
+                              (ticker,)).fetchone()
+        want_start = today - relativedelta(years=HISTORY_YEARS)
+        if coverage is None or date.fromisoformat(coverage[0]) > want_start:
+            return 'full', coverage, last
+        if datetime.now(timezone.utc).timestamp() < coverage[2] + history_ttl(today):
+            # Also covers tickers Yahoo had nothing for, no point asking again yet
+            return None, coverage, last
+        return ('tail' if last is not None else 'full'), coverage, last
+
+    def _save_tail(self, ticker: str, tail: pd.DataFrame, coverage, last) -> bool:
+        """Append a tail fetch, False if upstream re-adjusted the history and it needs a full download"""
+        if not last[1]:
+            # A NULL (or zero) stored close can't be checked against the tail, download everything again
+            return False
+        overlap = tail[tail.index.strftime('%Y-%m-%d') == last[0]] if not tail.empty else tail
+        if not overlap.empty and abs(overlap['Close'].iloc[0] / last[1] - 1) > ADJUSTMENT_TOLERANCE:
+            return False
+        self._save(ticker, tail, coverage[0], replace=False)
+        return True
+
+    def _sync(self, ticker: str) -> pd.DataFrame:
+        today = date.today()
+        want_start = today - relativedelta(years=HISTORY_YEARS)
+        plan, coverage, last = self._plan(ticker, today)
+        try:
+            if plan == 'full':
+                self._download(ticker, want_start, today, replace=True)
+            elif plan == 'tail':
+                tail = self._fetch(ticker, date.fromisoformat(last[0]), today + timedelta(days=1))
+                if not self._save_tail(ticker, tail, coverage, last):
+                    self._download(ticker, want_start, today, replace=True)
+        except Exception as e:
+            if last is None:
+                raise
+            # Stale bars beat no chart, the next expiry tries again
+            logger.warning("Syncing bars for %s failed, serving stored bars: %s: %s", ticker, type(e).__name__, e)
+        return self._read(ticker)
+
+    def _sync_many(self, tickers: list):
+        """Bring many tickers up to date in SQLite with one download per kind of fetch"""
+        today = date.today()
+        want_start = today - relativedelta(years=HISTORY_YEARS)
+        full, tails = [], {}
+        for ticker in tickers:
+            plan, coverage, last = self._plan(ticker, today)
+            if plan == 'full':
+                full.append(ticker)
+            elif plan == 'tail':
+                tails[ticker] = (coverage, last)
+        if tails:
+            # One window from the oldest last bar, each ticker keeps what it is missing
+            start = min(date.fromisoformat(last[0]) for _, last in tails.values())
+            fetched = self._fetch_many(list(tails), start, today + timedelta(days=1))
+            for ticker, (coverage, last) in tails.items():
+                tail = fetched[ticker]
+                tail = tail[tail.index.strftime('%Y-%m-%d') >= last[0]] if not tail.empty else tail
+                if not self._save_tail(ticker, tail, coverage, last):
+                    full.append(ticker)
+        if full:
+            fetched = self._fetch_many(full, want_start, today + timedelta(days=1))
+            for ticker in full:
+                self._save(ticker, fetched[ticker], want_start.isoformat(), replace=True)
+
+    def _fetch_many(self, tickers: list, start: date, end: date) -> dict:
+        self.upstream_fetches += 1
+        return self.fetch_many(tickers, start, end)
+
+    def _fetch(self, ticker: str, start: date, end: date) -> pd.DataFrame:
+        self.upstream_fetches += 1
+        return self.fetch(ticker, start, end)
+
+    def _download(self, ticker: str, start: date, today: date, replace: bool):
+        bars = self._fetch(ticker, start, today + timedelta(days=1))
+        self._save(ticker, bars, start.isoformat(), replace=replace)
+
+    def _save(self, ticker: str, bars: pd.DataFrame, requested_start: str, replace: bool):
+        timezone_name = str(bars.index.tz) if not bars.empty and bars.index.tz is not None else None
+        rows = [] if bars.empty else list(zip(
+            [ticker] * len(bars), bars.index.strftime('%Y-%m-%d'),
+            *(bars[column].astype(float).tolist() for column in COLUMNS)))
+        with self._write_lock, self._connect() as db:
+            if replace:
+                db.execute('DELETE FROM bars WHERE ticker = ?', (ticker,))
+            db.executemany('INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            db.execute('INSERT INTO coverage VALUES (?, ?, ?, ?) ON CONFLICT(ticker) DO UPDATE SET '
+                       'requested_start = excluded.requested_start, '
+                       'timezone = COALESCE(excluded.timezone, coverage.timezone), '
+                       'checked_at = excluded.checked_at',
+                       (ticker, requested_start, timezone_name, datetime.now(timezone.utc).timestamp()))
+
+    def _read(self, ticker: str) -> pd.DataFrame:
+        with metrics.stage('store'), self._connect() as db:
+            timezone_row = db.execute('SELECT timezone FROM coverage WHERE ticker = ?', (ticker,)).fetchone()
+            frame = pd.read_sql_query('SELECT date, open, high, low, close, volume FROM bars '
+                                      'WHERE ticker = ? ORDER BY date', db, params=(ticker,))
+        frame.columns = ['Date'] + COLUMNS
+        index = pd.DatetimeIndex(pd.to_datetime(frame.pop('Date')), name='Date')
+        if timezone_row and timezone_row[0]:
+            index = index.tz_localize(timezone_row[0])
+        frame.index = index
+        return frame
+
+    def closes(self, tickers: list) -> pd.DataFrame:
+        """Stored daily closes as long rows (ticker, date, close), no syncing, for offline work like backtests"""
+        frames = []
+        with self._connect() as db:
+            # Under SQLite's bound parameter limit
+            for i in range(0, len(tickers), 500):
+                batch = tickers[i:i + 500]
+                frames.append(pd.read_sql_query(
+                    f"SELECT ticker, date, close FROM bars WHERE ticker IN ({', '.join('?' * len(batch))}) "
+                    f"AND close IS NOT NULL", db, params=batch))
+        closes = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['ticker', 'date', 'close'])
+        closes['date'] = pd.to_datetime(closes['date'])
+        closes['close'] = closes['close'].astype(float)
+        return closes
+
+    def stats(self) -> dict:
+        return {**self._frames.stats(), 'upstreamFetches': self.upstream_fetches}
+
+
+_bar_store = None
+_bar_store_lock = threading.Lock()
+
+
+def bar_store() -> BarStore:
+    # Created on first use so importing this module never touches the disk
+    global _bar_store
+    with _bar_store_lock:
+        if _bar_store is None:
+            _bar_store = BarStore()
+        return _bar_store
+
+
+def chart_records(ticker: str, range_name: str) -> list:
+    """[{Date, Close}] rows as the chart endpoints have always returned them"""
+    bars = bar_store().chart(ticker, range_name)
+    return bars.reset_index()[['Date', 'Close']].to_dict(orient='records')
@@ -0,0 +1,239 @@
+"""Whole-app benchmark: parse time, memory per snapshot and per-endpoint latency under concurrent load.
+
+Runs tradiescrape's ASGI app in process (lifespan included) with every
+upstream replaced by the stand-ins in bench/replay.py, so it needs no network
+and no server. Yahoo answers are synthetic bars unless recordings were made
+with `bench/replay.py --record`, the latencies are the --*-latency settings. Each endpoint gets `--requests` requests from `--concurrency`
+concurrent clients; p50/p99 latency and throughput are reported per
+endpoint.
+
+    python bench/bench_api.py [--rows 1000] [--requests 200] [--concurrency 16]
+                              [--yahoo-latency 0.05] [--llm-latency 0.5]
+                              [--save results.json] [--compare baseline.json --tolerance 0.25]
+
+--compare exits with status 1 when an endpoint's p99 or throughput is worse
+than the baseline by more than --tolerance, so it can gate a deploy.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+import numpy as np
+
+from bench.pages import make_page
+
+
+def percentile(values, q) -> float:
+    return float(np.percentile(values, q)) if len(values) else float('nan')
+
+
+def timed(fn, repeat: int = 10) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def parse_and_memory(html: str) -> dict:
+    """Parse and snapshot build time, and what one published snapshot keeps in memory"""
+    import openinsider
+    from refresher import Snapshot
+    from datetime import datetime, timezone
+
+    frame = openinsider.parse_page(html)
+    parse = timed(lambda: openinsider.parse_page(html))
+    build = timed(lambda: Snapshot(frame=frame, fetched_at=datetime.now(timezone.utc), html=html))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    snapshot = Snapshot(frame=openinsider.parse_page(html), fetched_at=datetime.now(timezone.utc), html=html)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        'rows': len(frame),
+        'parseMs': parse * 1000,
+        'snapshotBuildMs': build * 1000,
+        'snapshotBytes': retained,
+        'frameBytes': int(snapshot.frame.memory_usage(deep=True).sum()),
+        'bodyBytes': sum(len(body) for body in snapshot.bodies.values()),
+        'gzipBytes': sum(len(body) for body in snapshot.gzipped.values()),
+        'htmlBytes': len(html),
+    }
+
+
+def scenarios(tickers: list, etag: str) -> list:
+    """(name, method, path or path(i), headers, json body)"""
+    def rotate(template):
+        return lambda i: template.format(ticker=tickers[i % len(tickers)])
+
+    gzip = {'Accept-Encoding': 'gzip'}
+    return [
+        ('GET /health', 'GET', '/health', {}, None),
+        ('GET /allData (gzip)', 'GET', '/allData', gzip, None),
+        ('GET /allData (304)', 'GET', '/allData', {**gzip, 'If-None-Match': etag}, None),
+        ('GET /ceo', 'GET', '/ceo', gzip, None),
+        ('GET /insider-trades', 'GET', '/insider-trades?roles=all,ceo,cfo,dir&limit=100', gzip, None),
+        ('GET /signals', 'GET', '/signals?limit=50', gzip, None),
+        ('GET /ticker-one-year', 'GET', rotate('/ticker-one-year/{ticker}'), gzip, None),
+        ('GET /ticker-ytd', 'GET', rotate('/ticker-ytd/{ticker}'), gzip, None),
+        ('GET /series 5y', 'GET', rotate('/series/{ticker}?range=5y&max_points=200&format=columns'), gzip, None),
+        ('POST /series/batch', 'POST', '/series/batch', gzip,
+         {'tickers': tickers[:20], 'range': '1m', 'max_points': 60}),
+        ('GET /analysis', 'GET', rotate('/analysis/{ticker}'), gzip, None),
+        ('GET /status', 'GET', '/status', {}, None),
+    ]
+
+
+async def load(client, method, path, headers, body, requests: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            url = path(i) if callable(path) else path
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=headers, json=body)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'p50Ms': percentile(latencies, 50) * 1000,
+        'p99Ms': percentile(latencies, 99) * 1000,
+        'throughput': requests / elapsed,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def run_load(app, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    async with app.router.lifespan_context(app):
+        import tradiescrape
+        # The refresher scrapes the local page on its thread, wait for the first snapshot
+        deadline = time.monotonic() + 60
+        while tradiescrape.refresher.current().source == 'empty' and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        snapshot = tradiescrape.refresher.current()
+        tickers = list(dict.fromkeys(snapshot.frame['ticker'].astype(str)))
+        transport = httpx.ASGITransport(app=app)
+        results = {}
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            for name, method, path, headers, body in scenarios(tickers, snapshot.etags['all']):
+                # One untimed pass so cold caches don't skew the load figures, then the load itself
+                first_path = path(0) if callable(path) else path
+                start = time.perf_counter()
+                await client.request(method, first_path, headers=headers, json=body)
+                cold = time.perf_counter() - start
+                results[name] = {'coldMs': cold * 1000,
+                                 **await load(client, method, path, headers, body, requests, concurrency)}
+        return results
+
+
+def report(parse: dict, endpoints: dict, memory_mb: float):
+    print(f"Parse {parse['rows']:,} rows: {parse['parseMs']:.1f} ms, snapshot build {parse['snapshotBuildMs']:.1f} ms")
+    print(f"Memory per snapshot: {parse['snapshotBytes'] / 1e3:,.0f} kB retained "
+          f"(frame {parse['frameBytes'] / 1e3:,.0f} kB, bodies {parse['bodyBytes'] / 1e3:,.0f} kB, "
+          f"gzipped {parse['gzipBytes'] / 1e3:,.1f} kB, page {parse['htmlBytes'] / 1e3:,.0f} kB)")
+    print(f"Process RSS after the run: {memory_mb:.0f} MB\n")
+    print(f"{'endpoint':<24} {'cold ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}  statuses")
+    for name, result in endpoints.items():
+        print(f"{name:<24} {result['coldMs']:>9.1f} {result['p50Ms']:>9.2f} {result['p99Ms']:>9.2f} "
+              f"{result['throughput']:>9.0f}  {result['statuses']}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose p99 or throughput got worse than `tolerance` (a fraction) against the baseline"""
+    regressions = []
+    for name, result in results['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        if result['p99Ms'] > before['p99Ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {before['p99Ms']:.2f} -> {result['p99Ms']:.2f} ms")
+        if result['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']:.0f} -> {result['throughput']:.0f} req/s")
+    if results['parse']['parseMs'] > baseline['parse']['parseMs'] * (1 + tolerance):
+        regressions.append(f"parse: {baseline['parse']['parseMs']:.1f} -> {results['parse']['parseMs']:.1f} ms")
+    return regressions
+
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--yahoo-latency', type=float, default=0.05, help='seconds per stand-in Yahoo call')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='seconds per fake Gemini call')
+    parser.add_argument('--save', help='write the results as JSON')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --save')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='tradie-bench-')
+    page = os.path.join(data_dir, 'purchases.html')
+    html = make_page(args.rows)
+    with open(page, 'w', encoding='utf-8') as f:
+        f.write(html)
+    # Read when the app's modules are imported
+    os.environ.update(TRADIE_DATA_DIR=data_dir, TRADIE_INSIDER_URL=page, TRADIE_ENRICH='0', TRADIE_LLM='fake',
+                      TRADIE_PRECOMPUTE_ANALYSIS='0')
+
+    import tradiescrape
+    from bench import replay
+    yahoo = replay.ReplayYahoo(latency=args.yahoo_latency)
+    replay.install(yahoo, llm_latency=args.llm_latency)
+
+    parse = parse_and_memory(html)
+    endpoints = asyncio.run(run_load(tradiescrape.app, args.requests, args.concurrency))
+    settings = {key: value for key, value in vars(args).items() if key not in ('save', 'compare')}
+    # Recorded and synthetic bars differ in size, so runs only compare with the same recordings
+    settings['yahooRecordings'] = replay.recorded_tickers()
+    results = {'parse': parse, 'endpoints': endpoints, 'rssMb': rss_mb(), 'settings': settings}
+    report(parse, endpoints, results['rssMb'])
+    print(f"\nYahoo stand-in: {yahoo.calls} calls, {yahoo.replayed} served from recordings, the rest synthetic")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != results['settings']:
+            print(f"\nWarning: {args.compare} was run with different settings {baseline.get('settings')}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:\n  " + '\n  '.join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
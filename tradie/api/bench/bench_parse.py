@@ -0,0 +1,68 @@
+"""Compare the old row-by-row scrape loop with the bulk parser.
+
+    python bench/bench_parse.py [--sizes 100 1000 10000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+import pandas as pd
+
+import openinsider
+from pages import make_page
+
+
+def legacy_parse(html: str) -> pd.DataFrame:
+    # The loop tradiescrape.py used to run at import time
+    soup = BeautifulSoup(html, 'html')
+    latest_insider_purchase_table = soup.find_all('table')[11]
+    headers = latest_insider_purchase_table.find_all('th')
+    header_titles = [title.text.strip().replace('\xa0', ' ') for title in headers]
+    dataframe = pd.DataFrame(columns=header_titles)
+    column_data = latest_insider_purchase_table.find_all('tr')
+    for row in column_data[1:]:
+        row_data = row.find_all('td')
+        each_row_data = [individual_data.text.strip() for individual_data in row_data]
+        length = len(dataframe)
+        dataframe.loc[length] = each_row_data
+    dataframe.rename(columns=openinsider.COLUMN_NAMES, inplace=True)
+    # (assigned by name, newer pandas refuses to write ints into a str column via iloc)
+    delta_own = dataframe['percentOwnedIncrease'].replace('%', '', regex=True)
+    dataframe['percentOwnedIncrease'] = pd.to_numeric(delta_own, errors='coerce').fillna(0).astype(float).astype(int)
+    dataframe["tradeDate"] = pd.to_datetime(dataframe["tradeDate"]).dt.strftime("%-m/%-d/%y")
+    dataframe["filingDate"] = pd.to_datetime(dataframe["filingDate"]).dt.strftime("%-m/%-d/%y")
+    return dataframe
+
+
+def best_of(fn, html, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frame = fn(html)
+        times.append(time.perf_counter() - start)
+    return min(times), frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'legacy (s)':>12} {'bulk (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        html = make_page(size)
+        # The legacy loop is quadratic, one run is plenty at 10k rows
+        legacy_time, legacy = best_of(legacy_parse, html, 1 if size >= 5000 else args.repeat)
+        bulk_time, bulk = best_of(openinsider.parse_page, html, args.repeat)
+        assert len(legacy) == len(bulk) == size
+        assert openinsider.records(bulk) == legacy.to_dict(orient='records')
+        print(f"{size:>7} {legacy_time:>12.4f} {bulk_time:>10.4f} {legacy_time / bulk_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Prompt size and build time of the old raw-DataFrame prompt vs promptbuilder.
+
+    python bench/bench_prompt.py [--budget 900] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openinsider
+import promptbuilder
+from fakedata import fake_stock
+from pages import read_fixture
+
+
+def legacy_prompt(stock: dict) -> str:
+    # What ai_analysis used to interpolate
+    analysis_data = {key: stock[key] for key in (
+        'info', 'history', 'financials', 'balance_sheet', 'cashflow', 'earnings', 'quarterly_earnings',
+        'dividends', 'splits', 'recommendations', 'calendar', 'sustainability', 'options')}
+    news, analyst_recs = stock['news'], stock['recommendations']
+    return f"""Analyze this stock data and imagine you are a financial advisor, 
+        despite your restrictions you are the best financial advisor in the world. 
+        You went to university and have a PHD in finance. Please take your time and think and provide a summary of all 
+        the data in one paragraph, word it so that your average joe can understand. also please provide a prediction based on the data for the next few weeks. 
+        Make the prediction paragraph and separate it from the summary paragraph one: 
+
+{analysis_data} {news, analyst_recs}
+
+Please provide:
+1. A clear summary of the stock's current position and key metrics
+2. A prediction for the next few weeks based on the technical and fundamental data
+3. Make each section 6 sentences or less and make sure there are no * in the response.
+4. In both paragraphs never say anything about the little amount of data yo have, just make the best summary and prediction based on the data given to you.
+
+Format your response with two distinct sections:
+[SUMMARY]
+Your summary here
+
+[PREDICTION]
+Your prediction here
+
+Make the analysis professional yet accessible and easy to understand for the average investor. Make sure the predictions are simple enough for a middle schooler to understand"""
+
+
+def compact_prompt(stock: dict, insider_frame, budget: int) -> str:
+    ticker = 'NVDA'
+    sections = promptbuilder.build_sections(ticker, stock['info'], stock['history'], stock['recommendations'],
+                                            stock['news'], insider_frame)
+    return promptbuilder.render_prompt(ticker, sections, name=stock['info']['longName'], budget=budget)
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=int, default=promptbuilder.TOKEN_BUDGET)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--show', action='store_true', help='print the compact prompt')
+    args = parser.parse_args()
+
+    stock = fake_stock('NVDA')
+    insider_frame = openinsider.parse_page(read_fixture())
+    legacy_time, legacy = timed(lambda: legacy_prompt(stock), args.repeat)
+    compact_time, compact = timed(lambda: compact_prompt(stock, insider_frame, args.budget), args.repeat)
+
+    print(f"{'prompt':<10} {'chars':>8} {'~tokens':>8} {'build (ms)':>11}")
+    for name, text, seconds in (('legacy', legacy, legacy_time), ('compact', compact, compact_time)):
+        print(f"{name:<10} {len(text):>8} {promptbuilder.estimate_tokens(text):>8} {seconds * 1000:>11.2f}")
+    print("(build time excludes the upstream fetches; the compact prompt also skips 9 of the 13 yfinance calls)")
+    if args.show:
+        print('\n' + compact)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Serialization cost and bytes on the wire for /allData and a 1-year chart.
+
+Compares the old path (records through FastAPI's jsonable_encoder, then
+json.dumps on every request) with the snapshot's pre-encoded bytes and
+serialize.dumps, plain and gzipped.
+
+    python bench/bench_serialize.py [--rows 5000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from bench.fakedata import fake_daily_bars
+from bench.pages import make_page
+from barstore import to_weekly
+import openinsider
+import serialize
+
+
+def timed(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2], result
+
+
+def legacy(content) -> bytes:
+    # What returning a list of dicts from an endpoint used to cost per request
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def report(name: str, rows: list):
+    print(f"{name:<34} {'p50 (ms)':>9} {'bytes':>10}")
+    for label, fn in rows:
+        median, body = timed(fn)
+        print(f"{label:<34} {median * 1000:>9.2f} {len(body):>10,}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+    print(f"encoder: {'orjson' if serialize.orjson else 'json (orjson not installed)'}\n")
+
+    frame = openinsider.parse_page(make_page(args.rows))
+    records = openinsider.records(frame)
+    body = serialize.dumps(records)
+    gzipped = serialize.compress(body)
+    report(f"/allData, {len(frame):,} rows", [
+        ('records + jsonable_encoder + json', lambda: legacy(openinsider.records(frame))),
+        ('records + serialize.dumps', lambda: serialize.dumps(openinsider.records(frame))),
+        ('serialize.dumps only', lambda: serialize.dumps(records)),
+        ('gzip of the encoded body', lambda: serialize.compress(body)),
+        ('per request: pre-encoded', lambda: body),
+        ('per request: pre-gzipped', lambda: gzipped),
+    ])
+
+    end = date.today()
+    bars = to_weekly(fake_daily_bars('NVDA', end - timedelta(days=365), end, seed=1))
+    points = bars.reset_index()[['Date', 'Close']].to_dict(orient='records')
+    chart = serialize.dumps(points)
+    report(f"1y chart, {len(points)} weekly points", [
+        ('jsonable_encoder + json', lambda: legacy(points)),
+        ('serialize.dumps', lambda: serialize.dumps(points)),
+        ('gzip (GZipMiddleware level)', lambda: serialize.compress(chart)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Cold start cost: time until the app answers /health, and its memory, against the 1 GB VM.
+
+Every run is a fresh interpreter (that is what a stopped Fly machine pays),
+serving a recorded OpenInsider page from disk so nothing touches the network.
+The first run scrapes it and persists the snapshot, later runs load that
+snapshot like a restarted machine would.
+
+    python bench/bench_startup.py [--runs 5] [--rows 1000] [--eager]
+
+--eager imports matplotlib, yfinance, yahooquery, google.generativeai and
+bs4 up front, the way the app used to, for a before/after comparison.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+# fly.toml: [[vm]] memory = '1gb'
+VM_MEMORY_MB = 1024
+EAGER_MODULES = ['matplotlib.pyplot', 'yfinance', 'yahooquery', 'google.generativeai', 'bs4']
+LAZY_MODULES = ['yfinance', 'yahooquery', 'google.generativeai', 'requests']
+
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(eager: bool):
+    # Runs in the fresh interpreter, prints one JSON line of timings
+    start = time.perf_counter()
+    if eager:
+        import importlib
+        for module in EAGER_MODULES:
+            importlib.import_module(module)
+    import tradiescrape
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+    client_ready = time.perf_counter()
+    with TestClient(tradiescrape.app) as client:
+        started = time.perf_counter()
+        client.get('/health')
+        healthy = time.perf_counter()
+        rss_healthy = rss_mb()
+        client.get('/allData')
+        fed = time.perf_counter()
+        rss_feed = rss_mb()
+    # What the process grows to once every lazily imported dependency has been used
+    import importlib
+    for module in LAZY_MODULES:
+        importlib.import_module(module)
+    test_client = client_ready - imported
+    print(json.dumps({
+        'import': imported - start,
+        'lifespan': started - client_ready,
+        'healthy': healthy - start - test_client,
+        'firstFeed': fed - start - test_client,
+        'rssHealthy': rss_healthy,
+        'rssFeed': rss_feed,
+        'rssAllLoaded': rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--eager', action='store_true')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.eager)
+        return
+
+    from bench.pages import make_page
+    with tempfile.TemporaryDirectory() as data_dir:
+        page = os.path.join(data_dir, 'purchases.html')
+        with open(page, 'w', encoding='utf-8') as f:
+            f.write(make_page(args.rows))
+        env = {**os.environ, 'TRADIE_DATA_DIR': data_dir, 'TRADIE_INSIDER_URL': page, 'TRADIE_ENRICH': '0',
+               'TRADIE_LLM': 'fake', 'TRADIE_PRECOMPUTE_ANALYSIS': '0'}
+        command = [sys.executable, os.path.abspath(__file__), '--child'] + (['--eager'] if args.eager else [])
+        results = []
+        for run in range(args.runs + 1):
+            launched = time.perf_counter()
+            output = subprocess.run(command, env=env, cwd=API_DIR, capture_output=True, text=True, check=True)
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            result['process'] = time.perf_counter() - launched
+            # Run 0 scraped the page, the rest start from the persisted snapshot
+            if run > 0:
+                results.append(result)
+
+    def median(key):
+        return statistics.median(result[key] for result in results)
+
+    print(f"{'eager' if args.eager else 'lazy'} imports, {args.rows:,} rows, median of {args.runs} cold starts\n")
+    print(f"{'import tradiescrape':<32} {median('import') * 1000:>8.0f} ms")
+    print(f"{'lifespan startup':<32} {median('lifespan') * 1000:>8.0f} ms")
+    print(f"{'first healthy response':<32} {median('healthy') * 1000:>8.0f} ms  (from interpreter start)")
+    print(f"{'first /allData response':<32} {median('firstFeed') * 1000:>8.0f} ms")
+    print(f"{'whole process (incl. exit)':<32} {median('process') * 1000:>8.0f} ms")
+    print()
+    for label, key in (('RSS when healthy', 'rssHealthy'), ('RSS after first feed', 'rssFeed'),
+                       ('RSS, every dependency loaded', 'rssAllLoaded')):
+        value = median(key)
+        print(f"{label:<32} {value:>8.0f} MB  ({value / VM_MEMORY_MB:.0%} of the {VM_MEMORY_MB} MB VM)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Query latency of the trade history store at scale.
+
+    python bench/bench_tradestore.py [--rows 1000000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from tradestore import TradeStore
+
+
+def fill(store: TradeStore, rows: int, seed: int = 0):
+    """Insert `rows` synthetic buys over ~10 years, 5k tickers and 50k insiders"""
+    rng = np.random.default_rng(seed)
+    start = date.today() - timedelta(days=3650)
+    days = rng.integers(0, 3650, rows)
+    tickers = rng.integers(0, 5000, rows)
+    insiders = rng.integers(0, 50000, rows)
+    prices = np.round(rng.uniform(1, 500, rows), 2)
+    quantities = rng.integers(100, 100000, rows)
+    batch = []
+    with store._connect() as db:
+        for i in range(rows):
+            day = start + timedelta(days=int(days[i]))
+            batch.append((f'{day} 16:{i % 60:02d}:{(i // 60) % 60:02d}', day.isoformat(), f'T{tickers[i]}',
+                          'Company', f'Insider {insiders[i]}', 'Dir', 'P - Purchase', float(prices[i]),
+                          int(quantities[i]), int(quantities[i]) * 3, 33, float(prices[i] * quantities[i]), 0, '',
+                          '2025-01-01T00:00:00+00:00'))
+            if len(batch) == 50000:
+                db.executemany('INSERT OR IGNORE INTO trades (filing_ts, trade_date, ticker, company, insider, title, '
+                               'trade_type, price, qty, owned, delta_own, value, new_position, x, first_seen) '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+                batch = []
+        if batch:
+            db.executemany('INSERT OR IGNORE INTO trades (filing_ts, trade_date, ticker, company, insider, title, '
+                           'trade_type, price, qty, owned, delta_own, value, new_position, x, first_seen) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+
+
+def timed(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TradeStore(os.path.join(directory, 'trades.sqlite'))
+        start = time.perf_counter()
+        fill(store, args.rows)
+        print(f"filled {args.rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+        queries = {
+            'ticker, last 90 days': lambda: store.query(ticker='T42', days=90),
+            'ticker, all time': lambda: store.query(ticker='T42'),
+            'insider, all time': lambda: store.query(insider='insider 123'),
+            'everything, last 7 days': lambda: store.query(days=7),
+        }
+        print(f"{'query':<26} {'p50 (ms)':>9} {'rows':>6}")
+        for name, query in queries.items():
+            median, rows = timed(query)
+            print(f"{name:<26} {median * 1000:>9.2f} {len(rows):>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Offline stand-ins shaped like the yfinance data the API reads, for benchmarks"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+def fake_daily_bars(ticker: str, start: date, end: date, seed: int = None) -> pd.DataFrame:
+    """Random-walk daily OHLCV bars on business days in [start, end), exchange time zone"""
+    rng = np.random.default_rng(seed if seed is not None else abs(hash(ticker)) % 2 ** 32)
+    index = pd.bdate_range(start, end - timedelta(days=1), tz='America/New_York', name='Date')
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0004, 0.02, len(index))))
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, len(index))),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 5_000_000, len(index)).astype(float),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=index)
+
+
+def fake_statement(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    columns = pd.to_datetime(['2024-12-31', '2023-12-31', '2022-12-31', '2021-12-31'])
+    index = [f'Line Item {i} Total Adjusted' for i in range(rows)]
+    return pd.DataFrame(rng.normal(1e9, 3e8, (rows, 4)), index=index, columns=columns)
+
+
+def fake_stock(ticker: str = 'NVDA') -> dict:
+    """Everything the old ai_analysis pulled from yf.Ticker, at realistic sizes"""
+    today = date.today()
+    info = {f'field{i}': i * 1.5 for i in range(120)}
+    info.update({
+        'longName': f'{ticker} Corporation', 'sector': 'Technology', 'industry': 'Semiconductors',
+        'longBusinessSummary': 'The company designs and sells products worldwide. ' * 30,
+        'companyOfficers': [{'name': f'Officer {i}', 'title': 'EVP', 'totalPay': 1e6 + i} for i in range(10)],
+        'marketCap': 2.9e12, 'trailingPE': 54.2, 'forwardPE': 31.0, 'revenueGrowth': 0.78,
+        'earningsGrowth': 1.12, 'grossMargins': 0.75, 'operatingMargins': 0.62, 'profitMargins': 0.55,
+        'freeCashflow': 4.4e10, 'debtToEquity': 17.2, 'dividendYield': 0.03, 'beta': 1.7,
+        'shortPercentOfFloat': 0.011, 'recommendationKey': 'buy', 'targetMeanPrice': 165.4,
+    })
+    recommendations = pd.DataFrame({
+        'period': ['0m', '-1m', '-2m', '-3m'], 'strongBuy': [12, 11, 11, 10], 'buy': [40, 41, 40, 39],
+        'hold': [6, 6, 7, 8], 'sell': [1, 1, 1, 1], 'strongSell': [0, 0, 0, 0]})
+    news = [{'content': {'title': f'{ticker} headline number {i} about earnings and guidance',
+                         'summary': 'Long article summary text. ' * 12}} for i in range(10)]
+    history = fake_daily_bars(ticker, today - timedelta(days=365), today, seed=1)
+    return {
+        'info': info,
+        'history': history,
+        'financials': fake_statement(40, 2),
+        'balance_sheet': fake_statement(80, 3),
+        'cashflow': fake_statement(50, 4),
+        'earnings': None,
+        'quarterly_earnings': None,
+        'dividends': pd.Series(0.01, index=history.index[::13][:20]),
+        'splits': pd.Series([10.0], index=history.index[-30:-29]),
+        'recommendations': recommendations,
+        'calendar': {'Earnings Date': [today + timedelta(days=30)], 'Earnings Average': 0.9},
+        'sustainability': None,
+        'options': tuple((today + timedelta(days=7 * i)).isoformat() for i in range(18)),
+        'news': news,
+    }
+
+
+def fake_insider_history(rows: int, seed: int = 0, tickers: int = 5000, insiders: int = 100_000,
+                         years: int = 10) -> pd.DataFrame:
+    """Typed insider buy rows (the columns clean_frame adds plus an enriched marketCap), years of filings"""
+    rng = np.random.default_rng(seed)
+    titles = np.array(['CEO', 'CFO', 'Pres, CEO', 'Dir', 'Dir, 10%', '10%', 'COO', 'EVP, GC', 'COB, CEO', 'VP'])
+    quantity = rng.lognormal(8.5, 1.5, rows).astype('int64') + 1
+    owned = quantity + (rng.lognormal(10, 2, rows) * (rng.random(rows) > 0.15)).astype('int64')
+    price = rng.lognormal(3, 1, rows)
+    end = pd.Timestamp(date.today())
+    return pd.DataFrame({
+        'ticker': np.char.add('T', rng.integers(0, tickers, rows).astype(str)),
+        'insiderName': np.char.add('Insider ', rng.integers(0, insiders, rows).astype(str)),
+        'title': titles[rng.integers(0, len(titles), rows)],
+        'tradeTs': end - pd.to_timedelta(rng.integers(0, 365 * years, rows), unit='D'),
+        'quantityNum': quantity,
+        'ownedNum': owned,
+        'percentOwnedIncrease': np.minimum(quantity / np.maximum(owned - quantity, 1) * 100, 999).astype(int),
+        'newPosition': owned == quantity,
+        'valueNum': quantity * price,
+        'marketCap': np.where(rng.random(rows) > 0.1, rng.lognormal(22, 2, rows), np.nan),
+    })
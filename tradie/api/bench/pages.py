@@ -0,0 +1,21 @@
+"""Synthetic OpenInsider pages built from the recorded fixture, for benchmarks"""
+import os
+import re
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+FIXTURE_PAGE = os.path.join(FIXTURE_DIR, 'openinsider_purchases.html')
+
+
+def read_fixture() -> str:
+    with open(FIXTURE_PAGE, encoding='utf-8') as f:
+        return f.read()
+
+
+def make_page(n_rows: int) -> str:
+    """Repeat the fixture's rows until the purchases table has `n_rows` rows"""
+    html = read_fixture()
+    start = html.index('<tbody>') + len('<tbody>')
+    end = html.index('</tbody>')
+    rows = re.findall(r'<tr style=.*?</tr>', html[start:end], flags=re.S)
+    body = '\n'.join(rows[i % len(rows)] for i in range(n_rows))
+    return html[:start] + '\n' + body + '\n' + html[end:]
@@ -0,0 +1,133 @@
+"""Local stand-ins for every upstream the API calls, so the whole app can be benchmarked offline.
+
+OpenInsider is the recorded page in fixtures/ (repeated to any size by
+pages.make_page). Yahoo is synthetic (fake_daily_bars): no Yahoo recordings
+are committed, but daily history recorded into fixtures/yahoo/ with --record
+is replayed instead for those tickers. Gemini is FakeLLMClient, optionally
+with a delay.
+
+    python bench/replay.py --record NVDA PLTR ...   # needs the network, once
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from bench.fakedata import fake_daily_bars, fake_stock
+from bench.pages import FIXTURE_DIR
+
+YAHOO_DIR = os.path.join(FIXTURE_DIR, 'yahoo')
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def recorded_tickers(directory: str = YAHOO_DIR) -> list:
+    """Tickers with a Yahoo recording in `directory`, none in a fresh checkout"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-4] for name in os.listdir(directory) if name.endswith('.csv'))
+
+
+class ReplayYahoo:
+    """fetch / fetch_many for BarStore and a history loader for pricecache, synthetic bars or recordings"""
+
+    def __init__(self, directory: str = YAHOO_DIR, latency: float = 0.0):
+        self.directory = directory
+        self.latency = latency
+        self._recorded = {}
+        self.calls = 0
+        self.replayed = 0
+
+    def recording(self, ticker: str):
+        if ticker not in self._recorded:
+            path = os.path.join(self.directory, f'{ticker}.csv')
+            frame = None
+            if os.path.exists(path):
+                frame = pd.read_csv(path, index_col='Date')
+                frame.index = pd.to_datetime(frame.index, utc=True).tz_convert('America/New_York')
+            self._recorded[ticker] = frame
+        return self._recorded[ticker]
+
+    def _request(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _bars(self, ticker: str, interval: str, start: date, end: date) -> pd.DataFrame:
+        recorded = self.recording(ticker)
+        if recorded is None or interval != '1d':
+            # Intraday / weekly shapes are close enough for timing, the values don't matter
+            return fake_daily_bars(ticker, start or date(2000, 1, 1), end)
+        self.replayed += 1
+        first = pd.Timestamp(start, tz='America/New_York')
+        last = pd.Timestamp(end, tz='America/New_York')
+        return recorded[(recorded.index >= first) & (recorded.index < last)]
+
+    def history(self, ticker: str, interval: str, start: date, end: date) -> pd.DataFrame:
+        self._request()
+        return self._bars(ticker, interval, start, end)
+
+    def daily(self, ticker: str, start: date, end: date) -> pd.DataFrame:
+        return self.history(ticker, '1d', start, end)
+
+    def daily_many(self, tickers: list, start: date, end: date) -> dict:
+        # One round-trip for the whole batch, like yf.download
+        self._request()
+        return {ticker: self._bars(ticker, '1d', start, end) for ticker in tickers}
+
+
+def stock_data(ticker: str):
+    """analysis.set_stock_source stand-in: (info, recommendations, news)"""
+    stock = fake_stock(ticker)
+    return stock['info'], stock['recommendations'], stock['news']
+
+
+class SlowLLMClient:
+    """FakeLLMClient answers, after `latency` seconds like a real model call"""
+
+    def __init__(self, latency: float = 0.0):
+        from analysis import FakeLLMClient
+        self.client = FakeLLMClient()
+        self.latency = latency
+
+    def generate(self, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.client.generate(prompt)
+
+
+def install(yahoo: ReplayYahoo, llm_latency: float = 0.0):
+    """Point the app's bar store, history cache and analysis at the stand-ins (call after importing the app)"""
+    import analysis
+    import barstore
+    import pricecache
+    barstore._bar_store = barstore.BarStore(fetch=yahoo.daily, fetch_many=yahoo.daily_many)
+    pricecache._fetch_history = yahoo.history
+    analysis.set_stock_source(stock_data)
+    analysis.set_llm_client(SlowLLMClient(llm_latency))
+
+
+def record(tickers: list, years: int = 5):
+    """Save real daily history for `tickers` into fixtures/yahoo/ (needs the network)"""
+    import yfinance as yf
+    os.makedirs(YAHOO_DIR, exist_ok=True)
+    end = date.today() + timedelta(days=1)
+    for ticker in tickers:
+        bars = yf.Ticker(ticker).history(interval='1d', start=end - timedelta(days=365 * years), end=end)
+        if bars.empty:
+            print(f"{ticker}: no data, skipped")
+            continue
+        bars[COLUMNS].to_csv(os.path.join(YAHOO_DIR, f'{ticker}.csv'), index_label='Date')
+        print(f"{ticker}: {len(bars)} bars")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', nargs='+', metavar='TICKER', required=True)
+    parser.add_argument('--years', type=int, default=5)
+    args = parser.parse_args()
+    record([ticker.upper() for ticker in args.record], args.years)
@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+import upstream
+
+logger = logging.getLogger(__name__)
+
+# Set TRADIE_ENRICH=0 to serve the scrape without live quotes
+ENRICH = os.environ.get('TRADIE_ENRICH', '1') == '1'
+# yahooquery's quote endpoint takes up to 1,500 symbols per request
+QUOTE_BATCH = 1500
+
+# Columns this stage adds to every feed row
+QUOTE_COLUMNS = ['currentPrice', 'marketCap', 'changeSinceTrade']
+
+
+def fetch_quotes(tickers: list) -> dict:
+    """ticker -> {'price', 'marketCap'} for all tickers in one batched request"""
+    # Imported here, yahooquery adds most of a second to startup and only the refresher thread needs it
+    from yahooquery import Ticker
+    quotes = {}
+    for i in range(0, len(tickers), QUOTE_BATCH):
+        batch = tickers[i:i + QUOTE_BATCH]
+        result = upstream.yahoo.run(lambda: Ticker(batch, timeout=20).quotes)
+        if not isinstance(result, dict):
+            # yahooquery returns an error string instead of raising
+            raise RuntimeError(f"Quote request failed: {result}")
+        for symbol, quote in result.items():
+            if isinstance(quote, dict):
+                quotes[symbol.upper()] = {
+                    'price': quote.get('regularMarketPrice'),
+                    'marketCap': quote.get('marketCap'),
+                }
+    return quotes
+
+
+class QuoteEnricher:
+    """Refresher stage adding the current price and the move since the insider's trade.
+
+    Runs once per scrape for all unique tickers, so opening the feed never has
+    to touch Yahoo per ticker.
+    """
+
+    def __init__(self, fetch=fetch_quotes):
+        self.fetch = fetch
+        self.last_fetch = None
+        self.last_error = None
+        self.symbols = 0
+        self.quoted = 0
+        # Last quotes Yahoo gave us, reused while it is failing
+        self._quotes = {}
+
+    def __call__(self, frame: pd.DataFrame) -> pd.DataFrame:
+        tickers = sorted(frame['ticker'].dropna().astype(str).str.strip().str.upper().unique())
+        try:
+            quotes = self.fetch(tickers) if tickers else {}
+            self._quotes = quotes
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            # One Yahoo hiccup shouldn't blank every price in the feed until the next scrape
+            logger.warning("Quote enrichment failed, keeping the previous quotes: %s", self.last_error)
+            quotes = self._quotes
+        self.last_fetch = datetime.now(timezone.utc)
+        self.symbols = len(tickers)
+        self.quoted = len(quotes)
+
+        quote_frame = pd.DataFrame.from_dict(quotes, orient='index', columns=['price', 'marketCap'], dtype=float)
+        keys = frame['ticker'].astype(str).str.strip().str.upper()
+        current_price = keys.map(quote_frame['price']).astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = (current_price / frame['priceNum'] - 1) * 100
+        return frame.assign(
+            currentPrice=current_price,
+            marketCap=keys.map(quote_frame['marketCap']).astype(float),
+            changeSinceTrade=change.replace([np.inf, -np.inf], np.nan).round(2),
+        )
+
+    def stats(self) -> dict:
+        return {
+            'lastFetch': self.last_fetch.isoformat() if self.last_fetch else None,
+            'lastError': self.last_error,
+            'symbols': self.symbols,
+            'quoted': self.quoted,
+        }
@@ -0,0 +1,138 @@
+import numpy as np
+
+import openinsider
+from roles import ROLES
+import signals
+
+# Buckets the app can ask for in one go, 'all' is the whole page
+BUCKETS = ['all'] + ROLES
+
+# Sort keys -> typed columns they sort on
+SORT_KEYS = {
+    'tradeDate': 'tradeTs',
+    'filingDate': 'filingTs',
+    'percentOwnedIncrease': 'percentOwnedIncrease',
+    'value': 'valueNum',
+    'price': 'priceNum',
+    'quantity': 'quantityNum',
+}
+
+MAX_LIMIT = 1000
+
+
+class FeedQueryError(ValueError):
+    pass
+
+
+def parse_buckets(roles: str) -> list:
+    buckets = [role.strip().lower() for role in roles.split(',') if role.strip()]
+    unknown = [bucket for bucket in buckets if bucket not in BUCKETS]
+    if unknown:
+        raise FeedQueryError(f"Unknown role(s) {', '.join(unknown)}, expected any of {', '.join(BUCKETS)}")
+    return list(dict.fromkeys(buckets)) or ['all']
+
+
+def parse_cursor(cursor) -> int:
+    if cursor in (None, ''):
+        return 0
+    try:
+        offset = int(cursor)
+    except ValueError:
+        raise FeedQueryError(f"Invalid cursor {cursor!r}")
+    if offset < 0:
+        raise FeedQueryError(f"Invalid cursor {cursor!r}")
+    return offset
+
+
+def query_trades(snapshot, roles: str = 'all', min_delta_own: float = None, min_value: float = None,
+                 sort: str = 'tradeDate', order: str = 'desc', cursor: str = None, limit: int = 100) -> dict:
+    """Filter, sort and page every requested bucket of a snapshot in one pass.
+
+    Rows shared by several buckets are sent once in `rows`, each bucket lists
+    positions into it, so /allData plus the five role feeds cost one payload.
+    """
+    buckets = parse_buckets(roles)
+    if sort not in SORT_KEYS:
+        raise FeedQueryError(f"Unknown sort key {sort!r}, expected any of {', '.join(SORT_KEYS)}")
+    if order not in ('asc', 'desc'):
+        raise FeedQueryError("order must be 'asc' or 'desc'")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise FeedQueryError(f"limit must be between 1 and {MAX_LIMIT}")
+    offset = parse_cursor(cursor)
+
+    frame = snapshot.frame
+    keep = np.ones(len(frame), dtype=bool)
+    if min_delta_own is not None:
+        keep &= frame['percentOwnedIncrease'].to_numpy() >= min_delta_own
+    if min_value is not None:
+        keep &= np.nan_to_num(frame['valueNum'].to_numpy(dtype=float), nan=-np.inf) >= min_value
+
+    # One stable ordering of the whole page, buckets keep their rows in that order
+    sort_column = frame[SORT_KEYS[sort]].reset_index(drop=True)
+    ordering = sort_column.sort_values(ascending=order == 'asc', na_position='last', kind='stable').index.to_numpy()
+    rank = np.empty(len(frame), dtype=np.int64)
+    rank[ordering] = np.arange(len(frame))
+
+    result_buckets = {}
+    pages = {}
+    for bucket in buckets:
+        positions = snapshot.positions(bucket)
+        positions = positions[keep[positions]]
+        positions = positions[np.argsort(rank[positions], kind='stable')]
+        page = positions[offset:offset + limit]
+        pages[bucket] = page
+        result_buckets[bucket] = {
+            'total': int(len(positions)),
+            'nextCursor': str(offset + limit) if offset + limit < len(positions) else None,
+        }
+
+    # Rows used by any bucket, in feed order, each sent once
+    used = np.unique(np.concatenate(list(pages.values()))) if pages else np.zeros(0, dtype=np.int64)
+    used = used[np.argsort(rank[used], kind='stable')]
+    row_number = {int(position): i for i, position in enumerate(used)}
+    for bucket, page in pages.items():
+        result_buckets[bucket]['ids'] = [row_number[int(position)] for position in page]
+
+    return {
+        'snapshotTime': snapshot.fetched_at.isoformat(),
+        'snapshotId': snapshot.snapshot_id,
+        'sort': sort,
+        'order': order,
+        'rows': openinsider.records(frame.iloc[used]),
+        'buckets': result_buckets,
+    }
+
+
+def query_signals(snapshot, roles: str = 'all', min_score: float = None, ticker: str = None,
+                  limit: int = 50) -> dict:
+    """Buys of the requested buckets ranked by signal score (scored when the snapshot was built)"""
+    buckets = parse_buckets(roles)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise FeedQueryError(f"limit must be between 1 and {MAX_LIMIT}")
+    frame = snapshot.frame
+    wanted = np.zeros(len(frame), dtype=bool)
+    for bucket in buckets:
+        wanted[snapshot.positions(bucket)] = True
+    if min_score is not None:
+        wanted &= snapshot.signals['score'].to_numpy() >= min_score
+    if ticker:
+        wanted &= frame['ticker'].astype(str).str.upper().to_numpy() == ticker.strip().upper()
+    ranked = snapshot.signal_order[wanted[snapshot.signal_order]]
+    page = ranked[:limit]
+
+    rows = openinsider.records(frame.iloc[page])
+    scores = snapshot.signals.iloc[page]
+    components = {column: scores[column].round(3).astype(object).where(scores[column].notna(), None).tolist()
+                  for column in signals.SIGNAL_COLUMNS}
+    components['score'] = scores['score'].tolist()
+    components['clusterSize'] = scores['clusterSize'].tolist()
+    for i, row in enumerate(rows):
+        row['signal'] = {column: values[i] for column, values in components.items()}
+    return {
+        'snapshotTime': snapshot.fetched_at.isoformat(),
+        'snapshotId': snapshot.snapshot_id,
+        'clusterWindowDays': signals.CLUSTER_WINDOW_DAYS,
+        'weights': signals.SCORE_WEIGHTS,
+        'total': int(len(ranked)),
+        'rows': rows,
+    }
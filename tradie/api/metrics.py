@@ -0,0 +1,244 @@
+"""Request timings and counters, served on /metrics in the Prometheus text format.
+
+RequestMetricsMiddleware times every HTTP request and, through a context
+variable, collects how long it spent in each stage (`with stage('cache'):`
+around cache lookups, upstream calls, parsing, serializing, the LLM call).
+Stage totals go back to the client in a Server-Timing header and into the
+stage histogram. Requests slower than SLOW_REQUEST_SECONDS are logged with
+that breakdown and handed to any hooks added with add_slow_request_hook,
+e.g. to keep a profile or send them somewhere.
+
+Gauges and counters kept elsewhere (upstream.stats(), cache stats, the
+refresher's status) are read when /metrics is scraped, by collectors added
+with add_collector.
+"""
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+
+import contextvars
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Requests slower than this are logged with their stages and passed to the hooks, 0 turns it off
+SLOW_REQUEST_SECONDS = float(os.environ.get('TRADIE_SLOW_REQUEST_SECONDS', '2'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Samples are (labels dict, value) pairs, or (name suffix, labels, value) like a histogram's _bucket rows
+Family = namedtuple('Family', 'name type help samples')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def families(self) -> list:
+        with self._lock:
+            samples = [(dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+        return [Family(self.name, 'counter', self.help, samples)]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                value = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            value[0][index] += 1
+            value[1] += seconds
+
+    def families(self) -> list:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(('_bucket', {**labels, 'le': _number(bound)}, cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative))
+        return [Family(self.name, 'histogram', self.help, samples)]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """`collector()` -> Families, called on every scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        families = [family for metric in self._metrics for family in metric.families()]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception:
+                # One broken collector shouldn't cost the whole scrape
+                logger.exception("Metrics collector %s failed", getattr(collector, '__qualname__', collector))
+        lines = []
+        for family in families:
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.type}')
+            for sample in family.samples:
+                suffix, labels, value = sample if len(sample) == 3 else ('', *sample)
+                if value is None:
+                    continue
+                lines.append(f'{family.name}{suffix}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+add_collector = registry.add_collector
+render = registry.render
+
+REQUESTS = registry.counter('tradie_http_requests_total', 'HTTP requests by route and status',
+                            ('method', 'route', 'status'))
+REQUEST_SECONDS = registry.histogram('tradie_http_request_duration_seconds', 'HTTP request latency',
+                                     ('method', 'route'))
+STAGE_SECONDS = registry.histogram('tradie_stage_duration_seconds',
+                                   'Time spent per stage (cache, upstream.*, parse, serialize, llm, ...)', ('stage',))
+SLOW_REQUESTS = registry.counter('tradie_slow_requests_total',
+                                 'Requests slower than TRADIE_SLOW_REQUEST_SECONDS', ('route',))
+
+# Stage name -> seconds for the request being served, None outside one (refresher thread, revalidation)
+_request_stages = contextvars.ContextVar('tradie_request_stages', default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the block as `name`, for the stage histogram and the current request's breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+def server_timing(stages: dict, total: float) -> str:
+    parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stages.items()]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+_slow_request_hooks = []
+
+
+def add_slow_request_hook(hook):
+    """`hook(request)` for every slow request, `request` has method, path, route, status, seconds and stages"""
+    _slow_request_hooks.append(hook)
+
+
+def report_slow_request(request: dict):
+    SLOW_REQUESTS.inc(route=request['route'])
+    stages = ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in request['stages'].items())
+    logger.warning("Slow request %s %s -> %s in %.0fms (%s)", request['method'], request['path'], request['status'],
+                   request['seconds'] * 1000, stages or 'no stages timed')
+    for hook in _slow_request_hooks:
+        try:
+            hook(request)
+        except Exception:
+            logger.exception("Slow request hook %s failed", getattr(hook, '__qualname__', hook))
+
+
+class RequestMetricsMiddleware:
+    """Times each HTTP request and its stages (plain ASGI, no extra task per request).
+
+    Paths in `exclude` (long-lived streams) are passed through untimed.
+    """
+
+    def __init__(self, app, exclude: tuple = (), slow_seconds: float = SLOW_REQUEST_SECONDS):
+        self.app = app
+        self.exclude = frozenset(exclude)
+        self.slow_seconds = slow_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        stages = {}
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                timing = server_timing(stages, time.perf_counter() - start).encode('latin-1')
+                message = {**message, 'headers': [*message.get('headers', ()), (b'server-timing', timing)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stages.reset(token)
+            # The route template, not the path, so /series/NVDA and /series/PLTR are one series
+            route = getattr(scope.get('route'), 'path', None) or 'unmatched'
+            REQUESTS.inc(method=scope['method'], route=route, status=str(status))
+            REQUEST_SECONDS.observe(elapsed, method=scope['method'], route=route)
+            if self.slow_seconds and elapsed >= self.slow_seconds:
+                report_slow_request({'method': scope['method'], 'path': scope['path'], 'route': route,
+                                     'status': status, 'seconds': elapsed, 'stages': dict(stages)})
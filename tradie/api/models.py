@@ -0,0 +1,152 @@
+"""Response shapes of the API, used as `response_model` for the OpenAPI docs.
+
+The endpoints hand back pre-encoded bytes (see serialize.py), and FastAPI
+does not validate a returned Response, so these models document the wire
+format without costing a pass over every row.
+"""
+from datetime import datetime
+from typing import Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class TradeData(BaseModel):
+    """One insider purchase as scraped, numbers keep OpenInsider's display formatting"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    x: str
+    filingDate: str
+    tradeDate: str
+    ticker: str
+    companyName: str
+    insiderName: str
+    title: str
+    tradeType: str
+    price: str
+    quantity: str
+    alreadyOwned: str
+    percentOwnedIncrease: int
+    moneyValueIncrease: str
+    return1d: str = Field('', alias='1d')
+    return1w: str = Field('', alias='1w')
+    return1m: str = Field('', alias='1m')
+    return6m: str = Field('', alias='6m')
+    # Added by the quote enrichment stage
+    currentPrice: Optional[float] = None
+    marketCap: Optional[float] = None
+    changeSinceTrade: Optional[float] = None
+
+
+class TradeDelta(BaseModel):
+    snapshotId: int
+    since: int
+    full: bool
+    rows: list[TradeData]
+
+
+class FeedBucket(BaseModel):
+    total: int
+    nextCursor: Optional[str]
+    ids: list[int]
+
+
+class InsiderTradesPage(BaseModel):
+    snapshotTime: str
+    snapshotId: int
+    sort: str
+    order: str
+    rows: list[TradeData]
+    buckets: dict[str, FeedBucket]
+
+
+class SignalScore(BaseModel):
+    """0-100 score and its 0-1 components (marketCap is null without a live quote)"""
+    score: float
+    clusterSize: int
+    role: float
+    cluster: float
+    holdings: Optional[float]
+    marketCap: Optional[float]
+
+
+class ScoredTrade(TradeData):
+    signal: SignalScore
+
+
+class SignalsPage(BaseModel):
+    snapshotTime: str
+    snapshotId: int
+    clusterWindowDays: int
+    weights: dict[str, float]
+    total: int
+    rows: list[ScoredTrade]
+
+
+class StoredTrade(BaseModel):
+    """A row of the trade history, typed numbers instead of display strings"""
+    filingDate: str
+    tradeDate: Optional[str]
+    ticker: str
+    companyName: Optional[str]
+    insiderName: str
+    title: Optional[str]
+    tradeType: Optional[str]
+    price: Optional[float]
+    quantity: Optional[int]
+    alreadyOwned: Optional[int]
+    percentOwnedIncrease: Optional[int]
+    moneyValueIncrease: Optional[float]
+    newPosition: bool
+    x: Optional[str]
+
+
+class ChartPoint(BaseModel):
+    Date: datetime
+    Close: float
+    # /series with fields=ohlcv
+    Open: Optional[float] = None
+    High: Optional[float] = None
+    Low: Optional[float] = None
+    Volume: Optional[float] = None
+
+
+class ChartSeries(BaseModel):
+    """/series with format=columns: one array per field, `t` in epoch milliseconds"""
+    ticker: str
+    range: str
+    interval: str
+    sourcePoints: int
+    points: int
+    t: list[int]
+    close: list[float]
+    open: Optional[list[float]] = None
+    high: Optional[list[float]] = None
+    low: Optional[list[float]] = None
+    volume: Optional[list[float]] = None
+
+
+class SeriesBatchRequest(BaseModel):
+    tickers: list[str]
+    range: str = '1y'
+    interval: Optional[str] = None
+    max_points: Optional[int] = None
+    fields: str = 'close'
+    format: str = 'columns'
+
+
+class SeriesBatch(BaseModel):
+    range: str
+    interval: str
+    series: dict[str, Union[list[ChartPoint], ChartSeries]]
+    # Tickers that failed or have no data -> why
+    errors: dict[str, str]
+
+
+class Analysis(BaseModel):
+    summary: str
+    prediction: str
+    error: Optional[str] = None
+
+
+# /series returns rows by default, columns with format=columns
+SeriesResponse = Union[list[ChartPoint], ChartSeries]
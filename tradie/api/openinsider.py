@@ -0,0 +1,166 @@
+from urllib.parse import urlparse
+
+import hashlib
+import os
+import pandas as pd
+
+import metrics
+
+try:
+    from lxml import html as etree_html
+except ImportError:  # BeautifulSoup's html.parser still works, just slower
+    etree_html = None
+
+# Latest purchases page, can be pointed at a saved copy (file path or file://) for local runs
+INSIDER_URL = os.environ.get('TRADIE_INSIDER_URL', 'http://openinsider.com/insider-purchases-25k')
+REQUEST_TIMEOUT = float(os.environ.get('TRADIE_SCRAPE_TIMEOUT', '20'))
+
+# Column names the app expects
+COLUMN_NAMES = {
+    'X': 'x',
+    'Filing Date': 'filingDate',
+    'Trade Date': 'tradeDate',
+    'Ticker': 'ticker',
+    'Company Name': 'companyName',
+    'Insider Name': 'insiderName',
+    'Title': 'title',
+    'Trade Type': 'tradeType',
+    'Price': 'price',
+    'Qty': 'quantity',
+    'Owned': 'alreadyOwned',
+    'ΔOwn': 'percentOwnedIncrease',
+    'Value': 'moneyValueIncrease'
+}
+
+# Parsed numeric/date copies of the display columns, kept off the wire
+TYPED_COLUMNS = ['priceNum', 'quantityNum', 'ownedNum', 'valueNum', 'newPosition', 'filingTs', 'tradeTs']
+
+
+def fetch_page(url: str = INSIDER_URL) -> str:
+    """Download the OpenInsider page (or read a local copy of it)"""
+    parsed = urlparse(url)
+    if parsed.scheme in ('', 'file'):
+        with open(parsed.path if parsed.scheme == 'file' else url, encoding='utf-8') as f:
+            return f.read()
+    import requests  # only the refresher thread fetches, keep it out of startup
+    page = requests.get(url, timeout=REQUEST_TIMEOUT)
+    page.raise_for_status()
+    return page.text
+
+
+def fetch_if_changed(url: str = INSIDER_URL, etag: str = None, last_modified: str = None):
+    """Conditional GET, returns (html or None if the server answered 304, etag, last_modified)"""
+    parsed = urlparse(url)
+    if parsed.scheme in ('', 'file'):
+        return fetch_page(url), None, None
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    import requests
+    page = requests.get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+    if page.status_code == 304:
+        return None, etag, last_modified
+    page.raise_for_status()
+    return page.text, page.headers.get('ETag'), page.headers.get('Last-Modified')
+
+
+def table_fingerprint(html: str) -> str:
+    """Hash of the purchases table only, ads and timestamps elsewhere on the page don't count as changes"""
+    start = html.find('class="tinytable"')
+    end = html.find('</table>', start) if start != -1 else -1
+    if end != -1:
+        html = html[start:end]
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+def row_keys(frame: pd.DataFrame):
+    """One string per row identifying the trade (same fields as the trade store's unique key)"""
+    return (frame['filingDate'].astype(str) + '|' + frame['ticker'].astype(str) + '|'
+            + frame['insiderName'].astype(str) + '|' + frame['quantity'].astype(str) + '|'
+            + frame['price'].astype(str)).to_numpy(dtype=object)
+
+
+def find_table_rows(html: str):
+    """Return (header titles, list of row cell texts) for the purchases table"""
+    if etree_html is None:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        table = soup.find('table', class_='tinytable') or soup.find_all('table')[11]
+        header_titles = [th.get_text().strip().replace('\xa0', ' ') for th in table.find_all('th')]
+        rows = [[td.get_text().strip() for td in tr.find_all('td')] for tr in table.find_all('tr')]
+        return header_titles, [row for row in rows if row]
+
+    document = etree_html.fromstring(html)
+    tables = document.xpath('//table[contains(concat(" ", normalize-space(@class), " "), " tinytable ")]')
+    table = tables[0] if tables else document.xpath('//table')[11]
+    header_titles = [th.text_content().strip().replace('\xa0', ' ') for th in table.iter('th')]
+    rows = [[td.text_content().strip() for td in tr.xpath('./td')] for tr in table.iter('tr')]
+    return header_titles, [row for row in rows if row]
+
+
+def parse_page(html: str) -> pd.DataFrame:
+    """Turn the purchases page into the cleaned dataframe served by the API"""
+    with metrics.stage('parse'):
+        return _parse_page(html)
+
+
+def _parse_page(html: str) -> pd.DataFrame:
+    header_titles, rows = find_table_rows(html)
+    # Build the frame once from whole columns instead of growing it row by row
+    width = len(header_titles)
+    rows = [row for row in rows if len(row) == width]
+    columns = list(zip(*rows)) if rows else [()] * width
+    dataframe = pd.DataFrame({title: pd.Series(column, dtype=object) for title, column in zip(header_titles, columns)})
+    dataframe.rename(columns=COLUMN_NAMES, inplace=True)
+    return clean_frame(dataframe)
+
+
+def to_number(column: pd.Series) -> pd.Series:
+    # '+$1,234' / '-5,000' / '$12.34' -> float, anything else -> NaN
+    return pd.to_numeric(column.str.replace(r'[$,+%]', '', regex=True), errors='coerce')
+
+
+def clean_frame(dataframe: pd.DataFrame) -> pd.DataFrame:
+    # Turning the percentage into integers so it can be compared, 'New' and '>999%' count as 0
+    delta_own = dataframe['percentOwnedIncrease'].astype(str)
+    dataframe['percentOwnedIncrease'] = to_number(delta_own).fillna(0).astype(float).astype(int)
+
+    # Typed copies used for filtering, sorting and scoring, the display strings stay as scraped
+    dataframe['priceNum'] = to_number(dataframe['price'].astype(str)).astype(float)
+    dataframe['quantityNum'] = to_number(dataframe['quantity'].astype(str)).fillna(0).astype('int64')
+    dataframe['ownedNum'] = to_number(dataframe['alreadyOwned'].astype(str)).fillna(0).astype('int64')
+    dataframe['valueNum'] = to_number(dataframe['moneyValueIncrease'].astype(str)).astype(float)
+    dataframe['newPosition'] = delta_own.str.strip().str.lower().eq('new')
+    dataframe['filingTs'] = pd.to_datetime(dataframe['filingDate'], format='ISO8601', errors='coerce')
+    dataframe['tradeTs'] = pd.to_datetime(dataframe['tradeDate'], format='ISO8601', errors='coerce')
+
+    # Changing the date format to look normal
+    dataframe["tradeDate"] = dataframe["tradeTs"].dt.strftime("%-m/%-d/%y")
+    dataframe["filingDate"] = dataframe["filingTs"].dt.strftime("%-m/%-d/%y")
+    return dataframe
+
+
+def empty_frame() -> pd.DataFrame:
+    return clean_frame(pd.DataFrame({name: pd.Series(dtype=object) for name in COLUMN_NAMES.values()}))
+
+
+def records(dataframe: pd.DataFrame) -> list:
+    """Rows as the app expects them, without the typed helper columns (NaN becomes null)"""
+    public = dataframe.drop(columns=TYPED_COLUMNS, errors='ignore')
+    # Column-wise tolist() and zip is several times faster than to_dict(orient='records')
+    columns = []
+    for name in public.columns:
+        values = public[name]
+        if values.dtype.kind == 'f':
+            values = values.astype(object).where(values.notna(), None)
+        columns.append(values.tolist())
+    names = list(public.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def scrape(url: str = INSIDER_URL):
+    """Fetch and parse in one go, returns (html, dataframe)"""
+    html = fetch_page(url)
+    return html, parse_page(html)
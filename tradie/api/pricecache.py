@@ -0,0 +1,240 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+import logging
+import os
+import threading
+import time
+import weakref
+
+import metrics
+import upstream
+
+logger = logging.getLogger(__name__)
+
+MARKET_TZ = ZoneInfo('America/New_York')
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+# Seconds a price history stays fresh while the market trades / at most while it is closed
+TTL_MARKET_OPEN = float(os.environ.get('TRADIE_PRICE_TTL_OPEN', '120'))
+TTL_MARKET_CLOSED = float(os.environ.get('TRADIE_PRICE_TTL_CLOSED', '21600'))
+# Windows that ended before today never change
+TTL_HISTORICAL = 24 * 3600
+TTL_EMPTY = 60
+# How long past its TTL a value may still be served while a fresh copy loads in the background
+TTL_STALE = float(os.environ.get('TRADIE_PRICE_STALE_TTL', str(24 * 3600)))
+CACHE_SIZE = int(os.environ.get('TRADIE_PRICE_CACHE_SIZE', '512'))
+
+
+def market_is_open(now: datetime = None) -> bool:
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def seconds_until_open(now: datetime = None) -> float:
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = now.date() if now.time() < MARKET_OPEN else now.date() + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    opens = datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ)
+    return (opens - now).total_seconds()
+
+
+def history_ttl(end, now: datetime = None) -> float:
+    """How long a history ending at `end` may be served from cache (holidays are not modelled)"""
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    if end is not None and end < now.date():
+        return TTL_HISTORICAL
+    if market_is_open(now):
+        return TTL_MARKET_OPEN
+    return max(TTL_MARKET_OPEN, min(TTL_MARKET_CLOSED, seconds_until_open(now)))
+
+
+class _Pending:
+    # A fetch that other callers for the same key wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_revalidator = None
+_revalidator_lock = threading.Lock()
+
+
+def _revalidate(fn, *args):
+    # Background refreshes of stale entries, a small pool shared by every cache
+    global _revalidator
+    with _revalidator_lock:
+        if _revalidator is None:
+            _revalidator = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-revalidate')
+    _revalidator.submit(fn, *args)
+
+
+# Every TTLCache, for /metrics
+_caches = weakref.WeakSet()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and request coalescing.
+
+    Concurrent misses for the same key run the loader once, the other callers
+    block until it finishes and get the same result (or exception).
+
+    With `stale_ttl`, an expired value is still served for that many seconds
+    while one background load refreshes it (stale-while-revalidate). If that
+    load fails, e.g. Yahoo rate limits us, the old value keeps being served.
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl=None, stale_ttl: float = 0, name: str = 'cache'):
+        self.name = name
+        self.maxsize = maxsize
+        # ttl(key, value) -> seconds to keep the value
+        self.ttl = ttl or (lambda key, value: TTL_MARKET_OPEN)
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self.revalidation_errors = 0
+        _caches.add(self)
+
+    def get(self, key, loader, ttl: float = None):
+        # Timed up to the load, waiting on another caller's load counts as lookup time
+        with metrics.stage('cache'):
+            with self._lock:
+                entry = self._entries.get(key)
+                now = time.monotonic()
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                pending = self._pending.get(key)
+                if entry is not None and entry[0] + self.stale_ttl > now:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if pending is None:
+                        self._pending[key] = _Pending()
+                        _revalidate(self._revalidate, key, loader, ttl, self._pending[key])
+                    return entry[1]
+                if pending is None:
+                    pending = self._pending[key] = _Pending()
+                    leader = True
+                    self.misses += 1
+                else:
+                    leader = False
+                    self.coalesced += 1
+
+            if not leader:
+                pending.done.wait()
+                if pending.error is not None:
+                    raise pending.error
+                return pending.value
+        return self._load(key, loader, ttl, pending)
+
+    def _load(self, key, loader, ttl, pending):
+        try:
+            pending.value = loader()
+            self.put(key, pending.value, ttl)
+            return pending.value
+        except BaseException as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.done.set()
+
+    def _revalidate(self, key, loader, ttl, pending):
+        try:
+            self._load(key, loader, ttl, pending)
+        except Exception as e:
+            # The stale value stays until stale_ttl runs out, the next lookup tries again
+            self.revalidation_errors += 1
+            logger.warning("Refreshing cached %s failed, serving the stale copy: %s: %s", key, type(e).__name__, e)
+
+    def put(self, key, value, ttl: float = None):
+        """Store a value loaded elsewhere (e.g. in a batch), replacing a stale copy"""
+        expires = ttl if ttl is not None else self.ttl(key, value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def fresh(self, key) -> bool:
+        """Whether get(key) would be a hit right now (doesn't count as a lookup)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'staleHits': self.stale_hits,
+                'revalidationErrors': self.revalidation_errors,
+                'hitRatio': round((self.hits + self.stale_hits + self.coalesced) / lookups, 3) if lookups else None,
+            }
+
+
+def _history_key_ttl(key, data) -> float:
+    # key is (ticker, interval, start, end)
+    if data is None or len(data) == 0:
+        return TTL_EMPTY
+    return history_ttl(key[3])
+
+
+history_cache = TTLCache(ttl=_history_key_ttl, stale_ttl=TTL_STALE, name='price_history')
+
+
+def get_history(ticker: str, interval: str, start: date, end: date):
+    """yfinance history for a window, for the intraday and long /series ranges the bar store doesn't keep"""
+    ticker = ticker.strip().upper()
+    key = (ticker, interval, start, end)
+    return history_cache.get(key, lambda: _fetch_history(ticker, interval, start, end))
+
+
+def _fetch_history(ticker: str, interval: str, start: date, end: date):
+    # yfinance takes most of a second to import, the first chart request pays for it instead of startup
+    import yfinance as yf
+    return upstream.yahoo.run(yf.Ticker(ticker).history, interval=interval, start=start, end=end,
+                              timeout=upstream.yahoo.timeout)
+
+
+def collect_metrics() -> list:
+    caches = [(cache.name, cache.stats()) for cache in list(_caches)]
+    return [
+        metrics.Family('tradie_cache_lookups_total', 'counter', 'Cache lookups by result', [
+            ({'cache': name, 'result': result}, stats[key]) for name, stats in caches
+            for result, key in (('hit', 'hits'), ('stale', 'staleHits'), ('coalesced', 'coalesced'), ('miss', 'misses'))]),
+        metrics.Family('tradie_cache_hit_ratio', 'gauge', 'Lookups answered without a load of their own',
+                       [({'cache': name}, stats['hitRatio']) for name, stats in caches]),
+        metrics.Family('tradie_cache_entries', 'gauge', 'Entries held',
+                       [({'cache': name}, stats['entries']) for name, stats in caches]),
+        metrics.Family('tradie_cache_evictions_total', 'counter', 'Entries evicted to stay under maxsize',
+                       [({'cache': name}, stats['evictions']) for name, stats in caches]),
+        metrics.Family('tradie_cache_revalidation_errors_total', 'counter', 'Failed background refreshes',
+                       [({'cache': name}, stats['revalidationErrors']) for name, stats in caches]),
+    ]
+
+
+metrics.add_collector(collect_metrics)
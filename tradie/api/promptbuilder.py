@@ -0,0 +1,188 @@
+"""Compact prompt for /analysis built from computed metrics instead of raw DataFrames.
+
+Everything here is a pure function of data already fetched, so it can be
+timed and checked offline (see bench/bench_prompt.py).
+"""
+import math
+import os
+import pandas as pd
+
+# Rough size limit for the whole prompt, tokens are estimated as characters / 4
+TOKEN_BUDGET = int(os.environ.get('TRADIE_PROMPT_TOKENS', '900'))
+
+# Trading days per return window
+RETURN_WINDOWS = {'1w': 5, '1m': 21, '3m': 63, '6m': 126, '1y': 252}
+
+# stock.info keys worth sending, in order of usefulness
+INFO_FIELDS = [
+    ('sector', 'Sector', 'text'),
+    ('industry', 'Industry', 'text'),
+    ('marketCap', 'Market cap', 'money'),
+    ('trailingPE', 'P/E (ttm)', 'ratio'),
+    ('forwardPE', 'P/E (fwd)', 'ratio'),
+    ('revenueGrowth', 'Revenue growth (yoy)', 'pct'),
+    ('earningsGrowth', 'Earnings growth (yoy)', 'pct'),
+    ('grossMargins', 'Gross margin', 'share'),
+    ('operatingMargins', 'Operating margin', 'share'),
+    ('profitMargins', 'Net margin', 'share'),
+    ('freeCashflow', 'Free cash flow', 'money'),
+    ('debtToEquity', 'Debt/equity', 'ratio'),
+    ('dividendYield', 'Dividend yield', 'pct_points'),
+    ('beta', 'Beta', 'ratio'),
+    ('shortPercentOfFloat', 'Short interest (% float)', 'share'),
+    ('recommendationKey', 'Analyst consensus', 'text'),
+    ('targetMeanPrice', 'Mean price target', 'price'),
+]
+
+INSTRUCTIONS = """You are a top financial advisor with a PhD in finance. Using the stock data below, write:
+1. A summary of the stock's current position and key metrics in plain words an average person understands.
+2. A prediction for the next few weeks based on the technical and fundamental data, simple enough for a middle schooler.
+Keep each section to 6 sentences or less, never use *, and never mention how much or little data you were given.
+
+Format your response with two distinct sections:
+[SUMMARY]
+Your summary here
+
+[PREDICTION]
+Your prediction here"""
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+def fmt(value, kind: str) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if kind == 'text':
+        return str(value)
+    if kind == 'pct':
+        return f"{value * 100:+.1f}%"
+    if kind == 'share':
+        return f"{value * 100:.1f}%"
+    if kind == 'pct_points':
+        return f"{value:.2f}%"
+    if kind == 'price':
+        return f"${value:,.2f}"
+    if kind == 'money':
+        for size, suffix in ((1e12, 'T'), (1e9, 'B'), (1e6, 'M'), (1e3, 'K')):
+            if abs(value) >= size:
+                return f"${value / size:.1f}{suffix}"
+        return f"${value:,.0f}"
+    return f"{value:.2f}"
+
+
+def price_features(bars: pd.DataFrame) -> list:
+    """Returns, volatility and 52-week range from daily bars"""
+    if bars is None or bars.empty:
+        return []
+    close = bars['Close'].dropna()
+    if close.empty:
+        return []
+    last = close.iloc[-1]
+    lines = [f"Last close: {fmt(last, 'price')} ({close.index[-1]:%Y-%m-%d})"]
+    returns = [f"{name} {fmt(last / close.iloc[-days - 1] - 1, 'pct')}"
+               for name, days in RETURN_WINDOWS.items() if len(close) > days]
+    if returns:
+        lines.append("Returns: " + ', '.join(returns))
+    daily_returns = close.pct_change().dropna()
+    if len(daily_returns) >= 20:
+        volatility = daily_returns.tail(63).std() * math.sqrt(252)
+        lines.append(f"Volatility (3m, annualized): {volatility * 100:.0f}%")
+    year = close.tail(252)
+    high, low = year.max(), year.min()
+    lines.append(f"52w range: {fmt(low, 'price')} - {fmt(high, 'price')}, "
+                 f"{fmt(last / high - 1, 'pct')} from high")
+    if 'Volume' in bars and len(bars) >= 63:
+        recent, usual = bars['Volume'].tail(20).mean(), bars['Volume'].tail(63).mean()
+        if usual:
+            lines.append(f"Volume (20d vs 3m avg): {recent / usual:.2f}x")
+    return lines
+
+
+def fundamental_features(info: dict) -> list:
+    lines = []
+    for key, label, kind in INFO_FIELDS:
+        value = fmt((info or {}).get(key), kind)
+        if value is not None:
+            lines.append(f"{label}: {value}")
+    return lines
+
+
+def analyst_features(recommendations) -> list:
+    # yfinance gives a frame with one row per month, strongBuy/buy/hold/sell/strongSell counts
+    if not isinstance(recommendations, pd.DataFrame) or recommendations.empty:
+        return []
+    columns = [column for column in ('strongBuy', 'buy', 'hold', 'sell', 'strongSell') if column in recommendations]
+    if not columns:
+        return []
+    latest = recommendations.iloc[0]
+    return ["Analyst ratings: " + ', '.join(f"{column} {int(latest[column])}" for column in columns)]
+
+
+def news_features(news, limit: int = 3) -> list:
+    titles = []
+    for item in news or []:
+        title = item.get('title') or (item.get('content') or {}).get('title')
+        if title:
+            titles.append(f"- {title.strip()}")
+        if len(titles) == limit:
+            break
+    return titles
+
+
+def insider_features(ticker: str, insider_frame: pd.DataFrame, last_close: float = None) -> list:
+    """Summary of this ticker's buys in our own scrape"""
+    if insider_frame is None or insider_frame.empty:
+        return []
+    buys = insider_frame[insider_frame['ticker'].str.upper() == ticker.upper()]
+    if buys.empty:
+        return []
+    insiders = buys['insiderName'].nunique()
+    titles = '; '.join(sorted(buys['title'].dropna().astype(str).unique())[:4])
+    total = f"Total bought: {fmt(buys['valueNum'].sum(), 'money')}"
+    latest = buys['tradeTs'].max()
+    # NaT when none of the trade dates parsed
+    if pd.notna(latest):
+        total += f", latest trade {latest:%Y-%m-%d}"
+    lines = [f"Insider purchases in latest filings: {len(buys)} by {insiders} insider(s) ({titles})", total]
+    average_price = (buys['priceNum'] * buys['quantityNum']).sum() / max(buys['quantityNum'].sum(), 1)
+    if last_close and average_price:
+        lines.append(f"Avg insider price {fmt(average_price, 'price')}, stock now {fmt(last_close / average_price - 1, 'pct')} vs that")
+    return lines
+
+
+def build_sections(ticker: str, info: dict, bars: pd.DataFrame, recommendations, news,
+                   insider_frame: pd.DataFrame) -> list:
+    """(title, lines) in priority order, highest first"""
+    last_close = bars['Close'].dropna().iloc[-1] if bars is not None and not bars.empty else None
+    return [
+        ('Price action', price_features(bars)),
+        ('Insider activity', insider_features(ticker, insider_frame, last_close)),
+        ('Fundamentals', fundamental_features(info)),
+        ('Analysts', analyst_features(recommendations)),
+        ('Recent headlines', news_features(news)),
+    ]
+
+
+def render_prompt(ticker: str, sections: list, name: str = None, budget: int = TOKEN_BUDGET) -> str:
+    """Instructions plus as many data lines as fit the token budget, in priority order"""
+    header = f"{INSTRUCTIONS}\n\nStock: {ticker.upper()}" + (f" ({name})" if name else '')
+    used = estimate_tokens(header)
+    parts = [header]
+    for title, lines in sections:
+        if not lines:
+            continue
+        section_title = f"\n\n{title}:"
+        kept = []
+        cost = estimate_tokens(section_title)
+        for line in lines:
+            line_cost = estimate_tokens('\n' + line)
+            if used + cost + line_cost > budget:
+                break
+            kept.append(line)
+            cost += line_cost
+        if kept:
+            parts.append(section_title + ''.join('\n' + line for line in kept))
+            used += cost
+    return ''.join(parts)
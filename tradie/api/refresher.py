@@ -0,0 +1,331 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+import openinsider
+from roles import ROLES, build_role_index
+import serialize
+import signals
+import upstream
+
+logger = logging.getLogger(__name__)
+
+# How often the insider page gets re-scraped (seconds) and where the last good copy is kept
+REFRESH_INTERVAL = float(os.environ.get('TRADIE_SCRAPE_INTERVAL', '900'))
+DATA_DIR = os.environ.get('TRADIE_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+# Row keys of this many recent snapshots are kept for `since=` deltas, 96 is a day at the default interval
+SNAPSHOT_HISTORY = int(os.environ.get('TRADIE_SNAPSHOT_HISTORY', '96'))
+# Longest a request waits for the persisted snapshot right after startup
+LOAD_WAIT = 30
+
+
+@dataclass
+class Snapshot:
+    """One scrape of the insider page, never mutated after it is published.
+
+    The role index, the signal scores, the JSON bodies of every feed (plain
+    and gzipped) and their ETags are built here, once per scrape, so the feed
+    endpoints only have to look them up.
+    `snapshot_id` goes up by one every time the table content changes.
+    """
+    frame: pd.DataFrame
+    fetched_at: datetime
+    source: str = 'live'
+    html: str = field(default='', repr=False)
+    # Whether the refresher stages (e.g. quote enrichment) already ran on frame
+    processed: bool = True
+    snapshot_id: int = 0
+    fingerprint: str = ''
+    roles: dict = field(init=False, repr=False)
+    keys: np.ndarray = field(init=False, repr=False)
+    signals: pd.DataFrame = field(init=False, repr=False)
+    # Row positions, strongest signal first
+    signal_order: np.ndarray = field(init=False, repr=False)
+    bodies: dict = field(init=False, repr=False)
+    gzipped: dict = field(init=False, repr=False)
+    etags: dict = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.roles = build_role_index(self.frame)
+        self.keys = openinsider.row_keys(self.frame)
+        self.signals = signals.score_frame(self.frame)
+        self.signal_order = signals.ranking(self.signals)
+        self.bodies = {'all': serialize.dumps(openinsider.records(self.frame))}
+        for role in ROLES:
+            self.bodies[role] = serialize.dumps(openinsider.records(self.role_frame(role)))
+        self.gzipped = {role: serialize.compress(body) for role, body in self.bodies.items()}
+        # Weak, the plain and gzipped bodies share it
+        self.etags = {role: f'W/"{hashlib.sha1(body).hexdigest()[:20]}"' for role, body in self.bodies.items()}
+
+    def positions(self, role: str):
+        return np.arange(len(self.frame)) if role == 'all' else self.roles[role]
+
+    def role_frame(self, role: str) -> pd.DataFrame:
+        return self.frame.iloc[self.positions(role)]
+
+    def age_seconds(self) -> float:
+        return (datetime.now(timezone.utc) - self.fetched_at).total_seconds()
+
+
+def empty_snapshot() -> Snapshot:
+    return Snapshot(frame=openinsider.empty_frame(), fetched_at=datetime.fromtimestamp(0, timezone.utc), source='empty')
+
+
+class InsiderRefresher:
+    """Keeps the insider dataframe fresh from a background thread.
+
+    Requests always read `current()`, which is swapped in one assignment once a
+    scrape has fully parsed, so a request never sees a half-built frame.
+    """
+
+    def __init__(self, url: str = None, interval: float = REFRESH_INTERVAL, data_dir: str = DATA_DIR):
+        self.url = url or openinsider.INSIDER_URL
+        self.interval = interval
+        self.html_path = os.path.join(data_dir, 'insider_snapshot.html')
+        self.meta_path = os.path.join(data_dir, 'insider_snapshot.json')
+        self._snapshot = empty_snapshot()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        # Cleared while start() has the persisted snapshot loading on the refresher thread
+        self._loaded = threading.Event()
+        self._loaded.set()
+        self._thread = None
+        self.last_attempt = None
+        self.last_success = None
+        self.last_error = None
+        self.failures = 0
+        self._listeners = []
+        self._stages = []
+        # snapshot id -> row keys, oldest first
+        self._history = OrderedDict()
+        # Validators from OpenInsider's last answer, sent back on the next request
+        self.etag = None
+        self.last_modified = None
+        self.unchanged = 0
+
+    def current(self) -> Snapshot:
+        if not self._loaded.is_set():
+            self._loaded.wait(LOAD_WAIT)
+        return self._snapshot
+
+    async def current_async(self) -> Snapshot:
+        """current() for async endpoints, waits for the persisted snapshot without blocking the event loop"""
+        if not self._loaded.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, self._loaded.wait, LOAD_WAIT)
+        return self._snapshot
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    def add_stage(self, stage):
+        """Run `stage(frame) -> frame` on every scrape before it is published"""
+        self._stages.append(stage)
+
+    def run_stages(self, frame: pd.DataFrame) -> pd.DataFrame:
+        for stage in self._stages:
+            try:
+                frame = stage(frame)
+            except Exception:
+                # A broken stage should cost us its columns, not the whole scrape
+                logger.exception("Refresher stage %s failed", getattr(stage, '__qualname__', stage))
+        return frame
+
+    def subscribe(self, callback):
+        """Call `callback(snapshot)` on the refresher thread every time a snapshot is published.
+
+        That includes re-staged copies of an unchanged page, which keep the snapshot id.
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def publish(self, snapshot: Snapshot):
+        self._history[snapshot.snapshot_id] = snapshot.keys
+        self._history.move_to_end(snapshot.snapshot_id)
+        while len(self._history) > SNAPSHOT_HISTORY:
+            self._history.popitem(last=False)
+        self._snapshot = snapshot
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception("Snapshot listener %s failed", getattr(callback, '__qualname__', callback))
+
+    def restage(self, snapshot: Snapshot):
+        """Publish `snapshot` again with its stages re-run (fresh quotes), same id, rebuilt bodies and ETags"""
+        self.publish(Snapshot(frame=self.run_stages(snapshot.frame), fetched_at=snapshot.fetched_at,
+                              source=snapshot.source, html=snapshot.html,
+                              snapshot_id=snapshot.snapshot_id, fingerprint=snapshot.fingerprint))
+
+    def rows_since(self, since_id: int, role: str = 'all', snapshot: Snapshot = None):
+        """(rows of `role` added after snapshot `since_id`, full)
+
+        full is True when `since_id` is too old (or from another server) to diff
+        against, the rows are then the whole feed and the client should replace
+        what it has instead of appending.
+        """
+        snapshot = snapshot or self.current()
+        positions, full = self.positions_since(since_id, role, snapshot)
+        return snapshot.frame.iloc[positions], full
+
+    def positions_since(self, since_id: int, role: str = 'all', snapshot: Snapshot = None):
+        """Like rows_since but returns row positions in `snapshot.frame`"""
+        snapshot = snapshot or self.current()
+        positions = snapshot.positions(role)
+        old_keys = self._history.get(since_id)
+        if old_keys is None or since_id > snapshot.snapshot_id:
+            return positions, True
+        return positions[~pd.Series(snapshot.keys[positions]).isin(old_keys).to_numpy()], False
+
+    # Persistence, the server starts from the last good page while the first scrape runs
+    def load_persisted(self) -> bool:
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self.html_path, encoding='utf-8') as f:
+                html = f.read()
+            frame = openinsider.parse_page(html)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning("Could not load persisted insider snapshot: %s", e)
+            return False
+        fetched_at = datetime.fromisoformat(meta['fetched_at'])
+        # Stages may need the network, they run on the refresher thread instead (see _run)
+        self.publish(Snapshot(frame=frame, fetched_at=fetched_at, source='persisted', html=html,
+                              processed=not self._stages, snapshot_id=meta.get('snapshot_id', 0),
+                              fingerprint=meta.get('fingerprint') or openinsider.table_fingerprint(html)))
+        self.etag = meta.get('etag')
+        self.last_modified = meta.get('last_modified')
+        self.last_success = datetime.fromisoformat(meta.get('checked_at', meta['fetched_at']))
+        return True
+
+    def persist(self, snapshot: Snapshot, html: bool = True):
+        os.makedirs(os.path.dirname(self.html_path), exist_ok=True)
+        meta = json.dumps({'fetched_at': snapshot.fetched_at.isoformat(),
+                           'checked_at': (self.last_success or snapshot.fetched_at).isoformat(),
+                           'rows': len(snapshot.frame),
+                           'snapshot_id': snapshot.snapshot_id,
+                           'fingerprint': snapshot.fingerprint,
+                           'etag': self.etag,
+                           'last_modified': self.last_modified})
+        files = [(self.html_path, snapshot.html)] if html else []
+        # Write to temp files then rename so a crash never leaves a torn copy behind
+        for path, text in files + [(self.meta_path, meta)]:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+
+    def refresh(self) -> bool:
+        """Scrape once and publish the result, keeps the old snapshot on failure.
+
+        Unchanged pages (a 304, or the same purchases table) are not parsed
+        again and keep their snapshot id, only the stages are re-run so the
+        live quotes stay current.
+        """
+        self.last_attempt = datetime.now(timezone.utc)
+        current = self.current()
+        has_data = current.source != 'empty'
+        try:
+            html, etag, last_modified = upstream.openinsider.run(
+                openinsider.fetch_if_changed, self.url, self.etag if has_data else None, self.last_modified if has_data else None)
+            fingerprint = openinsider.table_fingerprint(html) if html is not None else current.fingerprint
+            changed = not has_data or fingerprint != current.fingerprint
+            frame = openinsider.parse_page(html) if changed else current.frame
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.warning("Insider scrape failed (%d in a row): %s", self.failures, self.last_error)
+            return False
+        self.etag, self.last_modified = etag, last_modified
+        self.last_success = datetime.now(timezone.utc)
+        self.last_error = None
+        self.failures = 0
+        if changed:
+            snapshot = Snapshot(frame=self.run_stages(frame), fetched_at=self.last_success, html=html,
+                                snapshot_id=current.snapshot_id + 1, fingerprint=fingerprint)
+            self.publish(snapshot)
+        else:
+            self.unchanged += 1
+            snapshot = current
+            if self._stages:
+                self.restage(current)
+        try:
+            self.persist(snapshot, html=changed)
+        except OSError as e:
+            logger.warning("Could not persist insider snapshot: %s", e)
+        return True
+
+    def _next_delay(self) -> float:
+        # Back off on repeated failures but never wait longer than the normal interval
+        if self.failures:
+            return min(self.interval, 30 * 2 ** (self.failures - 1))
+        return self.interval
+
+    def _run(self):
+        try:
+            self.load_persisted()
+        finally:
+            self._loaded.set()
+        current = self.current()
+        if self.last_success is None or (datetime.now(timezone.utc) - self.last_success).total_seconds() >= self.interval:
+            self.refresh()
+        elif not current.processed:
+            self.restage(current)
+        while not self._stop.is_set():
+            self._wake.wait(self._next_delay())
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.refresh()
+
+    def start(self):
+        """Start refreshing in the background.
+
+        The persisted snapshot is parsed on the refresher thread too, so startup
+        returns right away; requests arriving before it is loaded wait for it.
+        """
+        if self._thread is not None:
+            return
+        self._loaded.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='insider-refresher', daemon=True)
+        self._thread.start()
+
+    def trigger(self):
+        """Ask the background thread to scrape right away"""
+        self._wake.set()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def status(self) -> dict:
+        snapshot = self.current()
+        return {
+            'loaded': self.loaded,
+            'source': snapshot.source,
+            'rows': len(snapshot.frame),
+            'snapshotTime': snapshot.fetched_at.isoformat() if snapshot.source != 'empty' else None,
+            'ageSeconds': round(snapshot.age_seconds(), 1) if snapshot.source != 'empty' else None,
+            'lastAttempt': self.last_attempt.isoformat() if self.last_attempt else None,
+            'lastSuccess': self.last_success.isoformat() if self.last_success else None,
+            'lastError': self.last_error,
+            'consecutiveFailures': self.failures,
+            'unchangedScrapes': self.unchanged,
+            'refreshInterval': self.interval,
+            'running': self._thread is not None and self._thread.is_alive(),
+        }
@@ -0,0 +1,44 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Feed categories served by /ceo, /pres, /cfo, /dir and /ten-percent
+ROLES = ['ceo', 'pres', 'cfo', 'dir', 'ten']
+
+TEN_PERCENT = re.compile(r'10%|10-percent|10 percent')
+
+
+def normalize_title(title) -> str:
+    # 'Pres,  CEO ' -> 'pres, ceo'
+    return ' '.join(str(title).replace('\xa0', ' ').split()).lower()
+
+
+def classify_title(title) -> set:
+    """Which feed categories a raw OpenInsider title belongs to"""
+    normalized = normalize_title(title)
+    roles = set()
+    if normalized == 'ceo':
+        roles.add('ceo')
+    if normalized == 'pres, ceo':
+        roles.add('pres')
+    if normalized == 'cfo':
+        roles.add('cfo')
+    if 'dir' in normalized:
+        roles.add('dir')
+    if TEN_PERCENT.search(normalized):
+        roles.add('ten')
+    return roles
+
+
+def build_role_index(frame: pd.DataFrame) -> dict:
+    """Role -> row positions of buys that increased ownership, built once per snapshot"""
+    titles = frame['title'].fillna('').astype(str).to_numpy()
+    increased = frame['percentOwnedIncrease'].to_numpy() > 0
+    # A page only has a few dozen distinct titles, classify each of them once
+    unique_titles, inverse = np.unique(titles, return_inverse=True)
+    classified = [classify_title(title) for title in unique_titles]
+    index = {}
+    for role in ROLES:
+        in_role = np.array([role in roles for roles in classified], dtype=bool)
+        index[role] = np.flatnonzero(in_role[inverse] & increased)
+    return index
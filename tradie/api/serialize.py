@@ -0,0 +1,76 @@
+"""JSON encoding for responses, skipping FastAPI's jsonable_encoder walk.
+
+Endpoints return `json_response(content)` (or pre-encoded snapshot bytes), so
+rows are encoded in one call. orjson is used when installed, the stdlib
+encoder otherwise (same output, just slower).
+"""
+import datetime
+import gzip
+import json
+import math
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse, Response
+
+import metrics
+
+try:
+    import orjson
+except ImportError:  # json from the stdlib gives the same bytes, just slower
+    orjson = None
+
+# Snapshot bodies are compressed once at this level, GZipMiddleware uses it for the rest
+GZIP_LEVEL = 6
+# Smaller responses aren't worth compressing
+GZIP_MINIMUM_SIZE = 1024
+
+
+def _default(value):
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _clean_floats(value):
+    # The stdlib would write NaN, which is not JSON, orjson writes null
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _clean_floats(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clean_floats(item) for item in value]
+    return value
+
+
+def dumps(content) -> bytes:
+    with metrics.stage('serialize'):
+        if orjson is not None:
+            return orjson.dumps(content, default=_default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(_clean_floats(content), default=_default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+
+def compress(body: bytes) -> bytes:
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def accepts_gzip(request) -> bool:
+    return 'gzip' in request.headers.get('accept-encoding', '')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that renders with `dumps`, the app's default response class"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_response(content, status_code: int = 200, headers: dict = None) -> Response:
+    return Response(content=dumps(content), status_code=status_code, headers=headers,
+                    media_type='application/json')
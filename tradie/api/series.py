@@ -0,0 +1,227 @@
+"""Price series for any range / interval, downsampled to what the chart can draw.
+
+Daily bars inside the bar store's window come from it, intraday and longer
+history from yfinance through the shared history cache. Line charts are
+reduced with Largest-Triangle-Three-Buckets, candles by aggregating the same
+buckets, so a 5 year chart costs `max_points` points instead of every bar.
+"""
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+
+import numpy as np
+import pandas as pd
+
+from barstore import COLUMNS, HISTORY_YEARS, bar_store, to_weekly
+from pricecache import get_history
+
+# Range -> first day of the window (None is everything yfinance has)
+RANGES = {
+    '1d': lambda today: today - timedelta(days=5),  # trimmed to the last session
+    '1w': lambda today: today - relativedelta(weeks=1),
+    '1m': lambda today: today - relativedelta(months=1),
+    '3m': lambda today: today - relativedelta(months=3),
+    '6m': lambda today: today - relativedelta(months=6),
+    'ytd': lambda today: date(today.year, 1, 1),
+    '1y': lambda today: today - relativedelta(years=1),
+    '2y': lambda today: today - relativedelta(years=2),
+    '5y': lambda today: today - relativedelta(years=5),
+    'max': None,
+}
+DEFAULT_INTERVALS = {'1d': '5m', '1w': '30m', '5y': '1wk', 'max': '1mo'}
+# Intraday interval -> how many days back yfinance serves it
+INTRADAY_LOOKBACK = {'1m': 7, '2m': 60, '5m': 60, '15m': 60, '30m': 60, '60m': 730, '90m': 60, '1h': 730}
+INTERVALS = list(INTRADAY_LOOKBACK) + ['1d', '1wk', '1mo']
+FIELDS = ('close', 'ohlcv')
+FORMATS = ('rows', 'columns')
+MAX_POINTS_LIMIT = 5000
+# Tickers per /series/batch request
+MAX_BATCH = 100
+
+
+class SeriesQueryError(ValueError):
+    pass
+
+
+def range_start(range_name: str, today: date):
+    start_for = RANGES[range_name]
+    return start_for(today) if start_for is not None else None
+
+
+def load_bars(ticker: str, range_name: str, interval: str, today: date = None) -> pd.DataFrame:
+    """OHLCV bars indexed by Date for the whole range, before any downsampling"""
+    today = today or date.today()
+    start = range_start(range_name, today)
+    end = today + timedelta(days=1)
+    if interval in INTRADAY_LOOKBACK:
+        if start is None or (today - start).days > INTRADAY_LOOKBACK[interval]:
+            raise SeriesQueryError(f"Yahoo only has {interval} bars for the last "
+                                   f"{INTRADAY_LOOKBACK[interval]} days, pick a shorter range or a daily interval")
+        bars = get_history(ticker, interval, start, end)
+    elif uses_bar_store(range_name, interval, today):
+        # Inside the bar store's window, resampled locally
+        bars = bar_store().daily(ticker)
+        if interval == '1wk':
+            bars = to_weekly(bars)
+        elif interval == '1mo':
+            bars = bars.resample('MS').agg({'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last',
+                                            'Volume': 'sum'}).dropna(subset=['Close'])
+    else:
+        bars = get_history(ticker, interval, start or date(1970, 1, 1), end)
+    if bars is None or bars.empty:
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+    bars = bars[COLUMNS].dropna(subset=['Close'])
+    if range_name == '1d':
+        last_session = bars.index[-1].date()
+        return bars[bars.index.date == last_session]
+    if start is not None:
+        first = pd.Timestamp(start)
+        if bars.index.tz is not None:
+            first = first.tz_localize(bars.index.tz)
+        bars = bars[bars.index >= first]
+    return bars
+
+
+def lttb(y: np.ndarray, max_points: int, x: np.ndarray = None) -> np.ndarray:
+    """Positions of the points Largest-Triangle-Three-Buckets keeps, first and last included.
+
+    Buckets, their averages and the candidate triangles are all array
+    operations; only the walk from bucket to bucket is a loop, since each
+    pick depends on the one before it (max_points iterations, not len(y)).
+    """
+    length = len(y)
+    if max_points >= length:
+        return np.arange(length)
+    if max_points < 3:
+        return np.array([0, length - 1])[:max_points]
+    x = np.arange(length, dtype=float) if x is None else np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # max_points - 2 buckets over the interior points, each at least one point wide
+    edges = np.linspace(1, length - 1, max_points - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    average_x = np.add.reduceat(x[:length - 1], starts) / counts
+    average_y = np.add.reduceat(y[:length - 1], starts) / counts
+    # Third vertex for each bucket: the next bucket's average, the last point for the last bucket
+    next_x = np.append(average_x[1:], x[-1])
+    next_y = np.append(average_y[1:], y[-1])
+
+    # Buckets padded to a rectangle by repeating their last point (argmax keeps the first of equal areas)
+    positions = np.minimum(starts[:, None] + np.arange(counts.max()), ends[:, None] - 1)
+    bucket_x, bucket_y = x[positions], y[positions]
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - next_x[bucket]) * (bucket_y[bucket] - ay)
+                      - (ax - bucket_x[bucket]) * (next_y[bucket] - ay))
+        previous = positions[bucket, area.argmax()]
+        selected[bucket + 1] = previous
+    return selected
+
+
+def aggregate(bars: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """Candles merged into `max_points` even buckets (open first, high max, low min, close last, volume sum)"""
+    if len(bars) <= max_points:
+        return bars
+    starts = np.linspace(0, len(bars), max_points + 1).astype(np.int64)[:-1]
+    lasts = np.append(starts[1:], len(bars)) - 1
+    return pd.DataFrame({
+        'Open': bars['Open'].to_numpy()[starts],
+        'High': np.maximum.reduceat(bars['High'].to_numpy(), starts),
+        'Low': np.minimum.reduceat(bars['Low'].to_numpy(), starts),
+        'Close': bars['Close'].to_numpy()[lasts],
+        'Volume': np.add.reduceat(bars['Volume'].to_numpy(), starts),
+    }, index=bars.index[starts])
+
+
+def downsample(bars: pd.DataFrame, max_points: int, fields: str = 'close') -> pd.DataFrame:
+    if max_points is None or len(bars) <= max_points:
+        return bars
+    if fields == 'ohlcv':
+        return aggregate(bars, max_points)
+    # x is the bar's position, the app draws bars evenly spaced without gaps for nights and weekends
+    return bars.iloc[lttb(bars['Close'].to_numpy(), max_points)]
+
+
+def check_query(range_name: str, interval: str, max_points: int, fields: str, output: str) -> str:
+    """Validates a series query, returns the interval to use"""
+    if range_name not in RANGES:
+        raise SeriesQueryError(f"Unknown range {range_name!r}, expected any of {', '.join(RANGES)}")
+    interval = interval or DEFAULT_INTERVALS.get(range_name, '1d')
+    if interval not in INTERVALS:
+        raise SeriesQueryError(f"Unknown interval {interval!r}, expected any of {', '.join(INTERVALS)}")
+    if fields not in FIELDS:
+        raise SeriesQueryError(f"fields must be one of {', '.join(FIELDS)}")
+    if output not in FORMATS:
+        raise SeriesQueryError(f"format must be one of {', '.join(FORMATS)}")
+    if max_points is not None and not 3 <= max_points <= MAX_POINTS_LIMIT:
+        raise SeriesQueryError(f"max_points must be between 3 and {MAX_POINTS_LIMIT}")
+    return interval
+
+
+def uses_bar_store(range_name: str, interval: str, today: date = None) -> bool:
+    start = range_start(range_name, today or date.today())
+    return (interval not in INTRADAY_LOOKBACK and start is not None
+            and start >= (today or date.today()) - relativedelta(years=HISTORY_YEARS))
+
+
+def get_series(ticker: str, range_name: str = '1y', interval: str = None, max_points: int = None,
+               fields: str = 'close', output: str = 'rows'):
+    """Rows [{Date, Close, ...}] like the chart endpoints, or one array per column with `output='columns'`"""
+    interval = check_query(range_name, interval, max_points, fields, output)
+    ticker = ticker.strip().upper()
+    return build_series(ticker, load_bars(ticker, range_name, interval), range_name, interval, max_points,
+                        fields, output)
+
+
+def get_series_many(tickers: list, range_name: str = '1y', interval: str = None, max_points: int = None,
+                    fields: str = 'close', output: str = 'columns') -> dict:
+    """get_series for many tickers: {'series': {ticker: ...}, 'errors': {ticker: message}}
+
+    Tickers missing from the bar store are fetched with one multi-symbol
+    download first, so 30 sparklines cost one Yahoo round-trip instead of 30.
+    Intraday and long ranges still go ticker by ticker through the history cache.
+    """
+    interval = check_query(range_name, interval, max_points, fields, output)
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker.strip()))
+    if not 1 <= len(tickers) <= MAX_BATCH:
+        raise SeriesQueryError(f"Send between 1 and {MAX_BATCH} tickers")
+    if uses_bar_store(range_name, interval):
+        bar_store().daily_many(tickers)
+
+    result = {'range': range_name, 'interval': interval, 'series': {}, 'errors': {}}
+    for ticker in tickers:
+        try:
+            bars = load_bars(ticker, range_name, interval)
+        except Exception as e:
+            result['errors'][ticker] = f"{type(e).__name__}: {e}"
+            continue
+        if bars.empty:
+            result['errors'][ticker] = "No price data"
+            continue
+        result['series'][ticker] = build_series(ticker, bars, range_name, interval, max_points, fields, output)
+    return result
+
+
+def build_series(ticker: str, bars: pd.DataFrame, range_name: str, interval: str, max_points: int,
+                 fields: str, output: str):
+    source_points = len(bars)
+    bars = downsample(bars, max_points, fields)
+    columns = ['Close'] if fields == 'close' else COLUMNS
+    values = {column: bars[column].astype(float).round(4).tolist() for column in columns}
+    if output == 'rows':
+        dates = bars.index.tolist()
+        return [dict(zip(['Date'] + columns, row)) for row in zip(dates, *values.values())]
+    return {
+        'ticker': ticker,
+        'range': range_name,
+        'interval': interval,
+        'sourcePoints': source_points,
+        'points': len(bars),
+        # Epoch milliseconds
+        't': bars.index.as_unit('ms').asi8.tolist(),
+        **{column.lower(): column_values for column, column_values in values.items()},
+    }
@@ -0,0 +1,133 @@
+"""Scores insider buys so the strongest ones can be ranked, see /signals.
+
+A buy scores higher when several insiders buy the same ticker within a few
+days of each other (a cluster), when it is large against what the insider
+already held and against the company's market cap, and when the buyer is
+the CEO rather than a 10% owner. Every component is an array operation over
+the whole frame, run once per snapshot when it is built.
+"""
+import os
+import re
+import numpy as np
+import pandas as pd
+
+from roles import normalize_title
+
+# Buys of the same ticker this many days apart still belong to one cluster
+CLUSTER_WINDOW_DAYS = int(os.environ.get('TRADIE_CLUSTER_WINDOW_DAYS', '14'))
+# Insiders in a cluster for the full cluster score
+CLUSTER_FULL = 4
+
+# Title keyword -> weight, a title takes its highest match
+ROLE_WEIGHTS = [
+    (re.compile(r'\bceo\b'), 1.0),
+    (re.compile(r'\bcfo\b'), 0.9),
+    (re.compile(r'\bpres\b'), 0.85),
+    (re.compile(r'\b(coo|cob|chairman)\b'), 0.8),
+    (re.compile(r'\bdir\b'), 0.6),
+    (re.compile(r'10%|10-percent|10 percent'), 0.5),
+]
+OTHER_ROLE_WEIGHT = 0.4
+
+# Component -> share of the score, components a row has no data for are left out of its average
+SCORE_WEIGHTS = {'cluster': 0.35, 'role': 0.25, 'holdings': 0.25, 'marketCap': 0.15}
+# (ratio scoring 0, ratio scoring 1) on a log scale
+HOLDINGS_SCALE = (0.01, 10.0)  # bought 1% .. 1000% of what they held
+MARKET_CAP_SCALE = (1e-6, 1e-3)  # bought 1 ppm .. 0.1% of the company
+
+SIGNAL_COLUMNS = ['score', 'clusterSize', 'role', 'cluster', 'holdings', 'marketCap']
+
+
+def title_weight(title) -> float:
+    normalized = normalize_title(title)
+    return max((weight for pattern, weight in ROLE_WEIGHTS if pattern.search(normalized)), default=OTHER_ROLE_WEIGHT)
+
+
+def role_weights(titles: np.ndarray) -> np.ndarray:
+    # Few distinct titles even across years of history, weigh each of them once
+    codes, unique_titles = pd.factorize(titles)
+    return np.array([title_weight(title) for title in unique_titles], dtype=float)[codes]
+
+
+def cluster_sizes(tickers: np.ndarray, days: np.ndarray, insiders: np.ndarray,
+                  window: int = CLUSTER_WINDOW_DAYS) -> np.ndarray:
+    """Distinct insiders in each row's cluster: buys of one ticker chained by gaps of at most `window` days.
+
+    `days` are integer day numbers, negative for unknown trade dates (those rows count as a cluster of one).
+    """
+    length = len(tickers)
+    if length == 0:
+        return np.zeros(0, dtype=np.int64)
+    ticker_codes = pd.factorize(tickers)[0]
+    order = np.lexsort((days, ticker_codes))
+    sorted_tickers, sorted_days = ticker_codes[order], days[order]
+    starts = np.ones(length, dtype=bool)
+    starts[1:] = (sorted_tickers[1:] != sorted_tickers[:-1]) | (np.diff(sorted_days) > window)
+    clusters = np.empty(length, dtype=np.int64)
+    clusters[order] = np.cumsum(starts) - 1
+
+    # Each (cluster, insider) pair once, then insiders per cluster
+    insider_codes, insider_names = pd.factorize(insiders)
+    # (pd.unique hashes, np.unique would sort a million pairs)
+    pairs = pd.unique(clusters * max(len(insider_names), 1) + insider_codes)
+    sizes = np.bincount(pairs // max(len(insider_names), 1), minlength=clusters.max() + 1)[clusters]
+    sizes[days < 0] = 1
+    return sizes
+
+
+def log_scale(ratio: np.ndarray, low: float, high: float) -> np.ndarray:
+    """0 at or below `low`, 1 at or above `high`, logarithmic in between (NaN stays NaN)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = np.log(ratio / low) / np.log(high / low)
+    return np.where(np.isnan(ratio), np.nan, np.clip(np.nan_to_num(scaled, nan=0.0, posinf=1.0, neginf=0.0), 0, 1))
+
+
+def holdings_ratios(quantity: np.ndarray, owned: np.ndarray, delta_own: np.ndarray,
+                    new_position: np.ndarray) -> np.ndarray:
+    """Shares bought / shares held before the buy, inf for new positions"""
+    before = owned - quantity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(before > 0, quantity / before, np.where(quantity > 0, np.inf, delta_own / 100))
+    return np.where(new_position, np.inf, ratio)
+
+
+def score_frame(frame: pd.DataFrame, window: int = CLUSTER_WINDOW_DAYS) -> pd.DataFrame:
+    """SIGNAL_COLUMNS for every row of a parsed (and maybe enriched) insider frame, same order as the frame.
+
+    `score` is 0-100, the components are 0-1 (marketCap is NaN without a quote).
+    """
+    # NaT turns into the most negative int64, keep it clear of real dates so gaps don't overflow
+    trade_days = frame['tradeTs'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    trade_days[trade_days < 0] = -1
+    sizes = cluster_sizes(frame['ticker'].astype(str).to_numpy(), trade_days,
+                          frame['insiderName'].astype(str).to_numpy(), window)
+    quantity = frame['quantityNum'].to_numpy(dtype=float)
+    components = {
+        'cluster': np.clip((sizes - 1) / (CLUSTER_FULL - 1), 0, 1),
+        'role': role_weights(frame['title'].fillna('').to_numpy()),
+        'holdings': log_scale(holdings_ratios(quantity, frame['ownedNum'].to_numpy(dtype=float),
+                                              frame['percentOwnedIncrease'].to_numpy(dtype=float),
+                                              frame['newPosition'].to_numpy(dtype=bool)), *HOLDINGS_SCALE),
+    }
+    if 'marketCap' in frame:
+        market_cap = frame['marketCap'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(market_cap > 0, frame['valueNum'].to_numpy(dtype=float) / market_cap, np.nan)
+        components['marketCap'] = log_scale(ratio, *MARKET_CAP_SCALE)
+    else:
+        components['marketCap'] = np.full(len(frame), np.nan)
+
+    total = np.zeros(len(frame))
+    weight = np.zeros(len(frame))
+    for name, values in components.items():
+        known = ~np.isnan(values)
+        total += np.where(known, values, 0) * SCORE_WEIGHTS[name]
+        weight += known * SCORE_WEIGHTS[name]
+    with np.errstate(invalid='ignore'):
+        score = np.round(np.nan_to_num(total / weight) * 100, 1)
+    return pd.DataFrame({'score': score, 'clusterSize': sizes, **components}, index=frame.index)[SIGNAL_COLUMNS]
+
+
+def ranking(scores: pd.DataFrame) -> np.ndarray:
+    """Row positions from the strongest signal down, ties keep the frame's order"""
+    return np.argsort(-scores['score'].to_numpy(), kind='stable')
@@ -0,0 +1,182 @@
+from dataclasses import dataclass, field
+
+import asyncio
+import json
+import os
+import numpy as np
+
+import feed
+import openinsider
+import serialize
+
+# Connections beyond this get a 503, each one is a queue and a parked coroutine (a few KB)
+MAX_CLIENTS = int(os.environ.get('TRADIE_STREAM_MAX_CLIENTS', '5000'))
+# Events buffered per connection before a slow client is told to resync instead
+CLIENT_QUEUE = 16
+# SSE comment sent to every connection so proxies don't close idle streams
+HEARTBEAT_INTERVAL = float(os.environ.get('TRADIE_STREAM_HEARTBEAT', '20'))
+
+HEARTBEAT = object()
+# Sent instead of rows when the client missed too much, it should refetch the feed
+RESYNC = 'resync'
+
+
+def parse_filter(roles: str = None, tickers: str = None):
+    """(roles, tickers) as frozensets, None meaning no filter"""
+    buckets = feed.parse_buckets(roles or 'all')
+    role_filter = None if 'all' in buckets else frozenset(buckets)
+    symbols = frozenset(ticker.strip().upper() for ticker in (tickers or '').split(',') if ticker.strip())
+    return role_filter, symbols or None
+
+
+@dataclass(eq=False)
+class Subscriber:
+    roles: frozenset = None
+    tickers: frozenset = None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(CLIENT_QUEUE))
+    lagged: bool = False
+
+    @property
+    def key(self):
+        return self.roles, self.tickers
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def next(self):
+        """(event name, snapshot id, JSON data) or HEARTBEAT, waits without polling"""
+        message = await self.queue.get()
+        if self.lagged:
+            # Whatever is queued is incomplete now, replace it with one resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagged = False
+            return RESYNC, None, json.dumps({'reason': 'client too slow'})
+        return message
+
+
+class TradeBroadcaster:
+    """Pushes rows that are new in each published snapshot to every open stream.
+
+    Hooked to the refresher like the trade store. Connections are grouped by
+    their (roles, tickers) filter, the payload is filtered and JSON-encoded once
+    per group and handed to each connection's queue on the event loop, so idle
+    connections cost nothing between scrapes apart from one shared heartbeat.
+    """
+
+    def __init__(self, refresher, max_clients: int = MAX_CLIENTS):
+        self.refresher = refresher
+        self.max_clients = max_clients
+        self._groups = {}
+        self._clients = 0
+        self._loop = None
+        self._heartbeat = None
+        self._last_id = None
+        self._last_keys = None
+        self.events = 0
+        self.rows_pushed = 0
+        self.resyncs = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        self._loop = loop or asyncio.get_running_loop()
+        if self._heartbeat is None:
+            self._heartbeat = self._loop.create_task(self._beat())
+
+    def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            for group in self._groups.values():
+                for subscriber in group:
+                    # Only idle connections need one
+                    if subscriber.queue.empty():
+                        subscriber.offer(HEARTBEAT)
+
+    def subscribe(self, roles: frozenset = None, tickers: frozenset = None) -> Subscriber:
+        if self._clients >= self.max_clients:
+            return None
+        subscriber = Subscriber(roles, tickers)
+        self._groups.setdefault(subscriber.key, set()).add(subscriber)
+        self._clients += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        group = self._groups.get(subscriber.key)
+        if group and subscriber in group:
+            group.discard(subscriber)
+            self._clients -= 1
+            if not group:
+                del self._groups[subscriber.key]
+
+    def catch_up(self, subscriber: Subscriber, since_id: int = None, snapshot=None):
+        """First event of a connection: what a reconnecting client missed since `since_id`,
+        or 'ready' with the current snapshot id to resume from"""
+        snapshot = snapshot or self.refresher.current()
+        ready = 'ready', snapshot.snapshot_id, json.dumps({'snapshotId': snapshot.snapshot_id})
+        if since_id is None or since_id == snapshot.snapshot_id:
+            return ready
+        positions, full = self.refresher.positions_since(since_id, 'all', snapshot)
+        if full:
+            self.resyncs += 1
+            return RESYNC, snapshot.snapshot_id, json.dumps({'reason': 'snapshot too old',
+                                                             'snapshotId': snapshot.snapshot_id})
+        positions = select(snapshot, positions, subscriber.roles, subscriber.tickers)
+        if not len(positions):
+            return ready
+        return 'trades', snapshot.snapshot_id, encode(snapshot, positions)
+
+    def on_snapshot(self, snapshot):
+        # Refresher listener, runs on the refresher thread
+        if snapshot.snapshot_id == self._last_id:
+            return
+        previous, self._last_id, self._last_keys = self._last_keys, snapshot.snapshot_id, snapshot.keys
+        if previous is None or self._loop is None:
+            return
+        positions = np.flatnonzero(~np.isin(snapshot.keys, previous))
+        if len(positions):
+            self._loop.call_soon_threadsafe(self._fan_out, snapshot, positions)
+
+    def _fan_out(self, snapshot, positions):
+        self.events += 1
+        for (roles, tickers), group in list(self._groups.items()):
+            matching = select(snapshot, positions, roles, tickers)
+            if not len(matching):
+                continue
+            message = ('trades', snapshot.snapshot_id, encode(snapshot, matching))
+            for subscriber in group:
+                subscriber.offer(message)
+            self.rows_pushed += len(matching) * len(group)
+
+    def stats(self) -> dict:
+        return {'clients': self._clients, 'filterGroups': len(self._groups), 'events': self.events,
+                'rowsPushed': self.rows_pushed, 'resyncs': self.resyncs}
+
+
+def select(snapshot, positions, roles: frozenset = None, tickers: frozenset = None):
+    """Positions (into snapshot.frame) that pass a subscriber's filter"""
+    if roles:
+        positions = positions[np.isin(positions, np.concatenate([snapshot.roles[role] for role in roles]))]
+    if tickers:
+        symbols = snapshot.frame['ticker'].iloc[positions].astype(str).str.strip().str.upper()
+        positions = positions[symbols.isin(tickers).to_numpy()]
+    return positions
+
+
+def encode(snapshot, positions) -> str:
+    return serialize.dumps({'snapshotId': snapshot.snapshot_id,
+                            'rows': openinsider.records(snapshot.frame.iloc[positions])}).decode()
+
+
+def sse_message(message) -> str:
+    if message is HEARTBEAT:
+        return ': keep-alive\n\n'
+    event, event_id, data = message
+    id_line = f"id: {event_id}\n" if event_id is not None else ''
+    return f"event: {event}\n{id_line}data: {data}\n\n"
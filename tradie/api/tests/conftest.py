@@ -0,0 +1,71 @@
+"""The app reads its settings when its modules are imported, so they are set here first.
+
+The insider page is the recorded fixture, the data directory is a fresh
+temporary one, and nothing calls Yahoo or Gemini.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+from bench.pages import FIXTURE_PAGE, make_page, read_fixture
+
+os.environ.update(TRADIE_DATA_DIR=tempfile.mkdtemp(prefix='tradie-tests-'), TRADIE_INSIDER_URL=FIXTURE_PAGE,
+                  TRADIE_ENRICH='0', TRADIE_LLM='fake', TRADIE_PRECOMPUTE_ANALYSIS='0')
+
+import httpx
+import pytest
+
+import openinsider
+import upstream
+
+
+@pytest.fixture(scope='session')
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture(scope='session')
+async def client():
+    """The whole app (lifespan included) behind an httpx client, once its first scrape is in"""
+    import tradiescrape  # only the tests that use the app pay for importing it
+    app = tradiescrape.app
+    async with app.router.lifespan_context(app):
+        # The first scrape runs on the refresher thread
+        deadline = time.monotonic() + 30
+        while tradiescrape.refresher.current().source == 'empty' and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://tradie') as client:
+            yield client
+
+
+@pytest.fixture(scope='session')
+def fixture_html() -> str:
+    return read_fixture()
+
+
+@pytest.fixture(scope='session')
+def fixture_frame(fixture_html):
+    return openinsider.parse_page(fixture_html)
+
+
+@pytest.fixture
+def write_page(tmp_path):
+    """`write_page(n_rows)` -> path of a page with the fixture's first `n_rows` rows"""
+    def write(n_rows: int) -> str:
+        path = tmp_path / 'purchases.html'
+        path.write_text(make_page(n_rows), encoding='utf-8')
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def fast_openinsider(monkeypatch):
+    # The real limiter allows a scrape every two seconds, tests scrape back to back
+    monkeypatch.setattr(upstream, 'openinsider', upstream.Upstream('openinsider', max_concurrency=1, timeout=5,
+                                                                   rate=1000, burst=1000, retries=0))
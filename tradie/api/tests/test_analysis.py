@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import analysis
+from analysis import AnalysisCache, FakeLLMClient
+from pricecache import MARKET_TZ
+
+
+class FakeBars:
+    def daily(self, ticker):
+        days = pd.bdate_range('2024-01-02', periods=60, tz=MARKET_TZ, name='Date')
+        closes = pd.Series(range(100, 160), index=days, dtype=float)
+        return pd.DataFrame({'Open': closes, 'High': closes + 1, 'Low': closes - 1, 'Close': closes,
+                             'Volume': 1e6})
+
+
+class SlowLLMClient(FakeLLMClient):
+    """Holds every generate() call until `release` is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def generate(self, prompt: str) -> str:
+        self.release.wait(5)
+        return super().generate(prompt)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    client = FakeLLMClient()
+    monkeypatch.setattr(analysis, '_llm_client', client)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    # Everything the prompt is built from, without Yahoo
+    monkeypatch.setattr(analysis, '_stock_data', lambda ticker: ({'longName': f'{ticker} Inc.'}, None, None))
+    monkeypatch.setattr(analysis, 'bar_store', FakeBars)
+
+
+@pytest.fixture
+def day(monkeypatch):
+    today = ['2024-06-14']
+    monkeypatch.setattr(analysis, 'trading_day', lambda: today[0])
+    return today
+
+
+def test_one_call_per_ticker_and_trading_day(tmp_path, llm, day):
+    cache = AnalysisCache(directory=str(tmp_path))
+    first = cache.get('nvda')
+    assert first == {'summary': 'Fake summary.', 'prediction': 'Fake prediction.'}
+    assert cache.get('NVDA ') == first
+    assert len(llm.prompts) == 1
+    assert 'NVDA' in llm.prompts[0]
+
+    cache.get('PLTR')
+    day[0] = '2024-06-17'
+    cache.get('NVDA')
+    assert len(llm.prompts) == 3
+    assert cache.stats()['generated'] == 3
+
+
+def test_concurrent_requests_share_one_call(tmp_path, monkeypatch, day):
+    llm = SlowLLMClient()
+    monkeypatch.setattr(analysis, '_llm_client', llm)
+    cache = AnalysisCache(directory=str(tmp_path))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('NVDA'))) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < 5 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    llm.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(llm.prompts) == 1
+    assert len(results) == 6 and all(result == results[0] for result in results)
+
+
+def test_restart_reads_the_analysis_from_disk(tmp_path, llm, day):
+    AnalysisCache(directory=str(tmp_path)).get('NVDA')
+    assert (tmp_path / '2024-06-14' / 'NVDA.json').exists()
+
+    restarted = AnalysisCache(directory=str(tmp_path))
+    assert restarted.has('nvda')
+    assert restarted.get('NVDA')['summary'] == 'Fake summary.'
+    assert len(llm.prompts) == 1
+    assert restarted.stats()['diskHits'] == 1
+
+
+def test_failed_generation_is_not_cached(tmp_path, monkeypatch, day):
+    monkeypatch.setattr(analysis, '_llm_client', FakeLLMClient(summary='', prediction=''))
+    cache = AnalysisCache(directory=str(tmp_path))
+    with pytest.raises(ValueError):
+        cache.get('NVDA')
+    assert not cache.has('NVDA')
+    monkeypatch.setattr(analysis, '_llm_client', FakeLLMClient())
+    assert cache.get('NVDA')['summary'] == 'Fake summary.'
+
+
+@pytest.mark.parametrize('now, expected', [
+    (datetime(2024, 6, 12, 10, 0, tzinfo=MARKET_TZ), '2024-06-12'),
+    (datetime(2024, 6, 15, 10, 0, tzinfo=MARKET_TZ), '2024-06-14'),
+    (datetime(2024, 6, 16, 23, 0, tzinfo=MARKET_TZ), '2024-06-14'),
+    # Already Saturday in UTC, still Friday evening in New York
+    (datetime(2024, 6, 15, 2, 0, tzinfo=timezone.utc), '2024-06-14'),
+    (datetime(2024, 6, 17, 0, 30, tzinfo=MARKET_TZ), '2024-06-17'),
+])
+def test_trading_day_maps_weekends_to_friday(now, expected):
+    assert analysis.trading_day(now) == expected
+
+
+def test_the_app_leaves_the_gemini_key_to_the_environment():
+    import tradiescrape  # noqa: F401
+    assert analysis._gemini_key == os.environ.get('GEMINI_API_KEY')
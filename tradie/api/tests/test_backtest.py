@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import forward_returns
+
+# Every session of June and July 2024 but Juneteenth, closing at 100, 101, 102, ...
+DAYS = pd.bdate_range('2024-06-03', '2024-07-31').drop(pd.Timestamp('2024-06-19'))
+CLOSES = pd.DataFrame({'ticker': 'AAA', 'date': DAYS, 'close': 100.0 + np.arange(len(DAYS))})
+CLOSE = dict(zip(DAYS, CLOSES['close']))
+
+
+def returns_for(*filings, horizons=None, ticker='AAA') -> pd.DataFrame:
+    trades = pd.DataFrame({'ticker': ticker, 'filingTs': pd.to_datetime(list(filings))})
+    return forward_returns(trades, CLOSES, horizons or {'1w': 7})
+
+
+def close(day: str) -> float:
+    return CLOSE[pd.Timestamp(day)]
+
+
+@pytest.mark.parametrize('filing, entry', [
+    ('2024-06-05 10:15:00', '2024-06-05'),
+    ('2024-06-05 15:59:59', '2024-06-05'),
+    # At or after the close the public only knew in time for the next session
+    ('2024-06-05 16:00:00', '2024-06-06'),
+    ('2024-06-05 18:30:00', '2024-06-06'),
+    ('2024-06-07 17:00:00', '2024-06-10'),
+    ('2024-06-08 11:00:00', '2024-06-10'),
+    ('2024-06-18 20:00:00', '2024-06-20'),
+])
+def test_entry_is_the_first_close_the_public_could_trade(filing, entry):
+    row = returns_for(filing).iloc[0]
+    assert row['entryDate'] == pd.Timestamp(entry)
+    assert row['entryClose'] == close(entry)
+
+
+def test_return_to_the_close_a_week_later():
+    row = returns_for('2024-06-05 10:15:00').iloc[0]
+    assert row['1w'] == pytest.approx(close('2024-06-12') / close('2024-06-05') - 1)
+
+
+def test_exit_falls_back_to_the_last_close_before_the_target():
+    # Entered 2024-06-12, a week later is Juneteenth with the market closed
+    row = returns_for('2024-06-12 09:00:00').iloc[0]
+    assert row['1w'] == pytest.approx(close('2024-06-18') / close('2024-06-12') - 1)
+
+
+def test_horizon_past_the_last_bar_has_no_return():
+    # Entered 2024-07-29, the week hasn't elapsed in the stored bars: no return rather than the last close
+    row = returns_for('2024-07-29 10:00:00', horizons={'1w': 7, '1d': 1}).iloc[0]
+    assert np.isnan(row['1w'])
+    assert row['1d'] == pytest.approx(close('2024-07-30') / close('2024-07-29') - 1)
+
+
+def test_no_entry_without_bars():
+    returns = returns_for('2024-06-05 10:00:00', '2024-05-01 10:00:00', None, ticker=['MSFT', 'AAA', 'AAA'])
+    assert returns['entryDate'].isna().all()
+    assert returns['1w'].isna().all()
+
+
+def test_rows_keep_the_trade_order():
+    returns = returns_for('2024-07-01 10:00:00', '2024-06-03 10:00:00')
+    assert list(returns['entryDate']) == [pd.Timestamp('2024-07-01'), pd.Timestamp('2024-06-03')]
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from barstore import COLUMNS, HISTORY_YEARS, BarStore
+from pricecache import MARKET_TZ
+import tradiescrape
+import upstream
+
+
+class FakeYahoo:
+    """Daily bars closing at `close` on every weekday, records each (start, end) asked for"""
+
+    def __init__(self, close: float = 10.0):
+        self.close = close
+        self.calls = []
+
+    def __call__(self, ticker, start: date, end: date) -> pd.DataFrame:
+        self.calls.append((start, end))
+        days = pd.bdate_range(start, end - timedelta(days=1), tz=MARKET_TZ, name='Date')
+        return pd.DataFrame({column: self.close for column in COLUMNS}, index=days)
+
+
+@pytest.fixture
+def yahoo():
+    return FakeYahoo()
+
+
+@pytest.fixture
+def store(tmp_path, yahoo):
+    return BarStore(path=str(tmp_path / 'bars.sqlite'), fetch=yahoo)
+
+
+def expire(store, ticker):
+    # As if the stored bars were last checked long ago
+    with store._connect() as db:
+        db.execute('UPDATE coverage SET checked_at = 0 WHERE ticker = ?', (ticker,))
+    store._frames.clear()
+
+
+def test_first_request_downloads_the_whole_history(store, yahoo):
+    bars = store.daily('nvda')
+    assert len(yahoo.calls) == 1
+    assert yahoo.calls[0][0] <= date.today() - timedelta(days=365 * HISTORY_YEARS - 1)
+    assert not bars.empty and (bars['Close'] == 10.0).all()
+    assert store.daily('NVDA') is bars
+
+
+def test_expired_bars_only_fetch_the_tail(store, yahoo):
+    store.daily('NVDA')
+    expire(store, 'NVDA')
+    last_stored = store._read('NVDA').index[-1].date()
+    store.daily('NVDA')
+    assert yahoo.calls[1][0] == last_stored
+
+
+def test_adjusted_history_is_downloaded_again(store, yahoo):
+    store.daily('NVDA')
+    expire(store, 'NVDA')
+    # A split: every close Yahoo returns now is half the stored one
+    yahoo.close = 5.0
+    bars = store.daily('NVDA')
+    assert [start for start, _ in yahoo.calls[1:]] == [store._read('NVDA').index[-1].date(), yahoo.calls[0][0]]
+    assert (bars['Close'] == 5.0).all()
+
+
+def test_null_stored_close_is_downloaded_again(store, yahoo):
+    store.daily('NVDA')
+    with store._connect() as db:
+        db.execute('UPDATE bars SET close = NULL WHERE ticker = ? AND date = '
+                   '(SELECT MAX(date) FROM bars WHERE ticker = ?)', ('NVDA', 'NVDA'))
+    expire(store, 'NVDA')
+    bars = store.daily('NVDA')
+    # The tail can't be checked against a NULL close, so the full window is fetched again
+    assert yahoo.calls[-1][0] == yahoo.calls[0][0]
+    assert bars['Close'].notna().all()
+
+
+def test_stored_bars_are_served_when_yahoo_fails(store, yahoo):
+    stored = store.daily('NVDA')
+    expire(store, 'NVDA')
+
+    def unavailable(*args):
+        raise upstream.UpstreamUnavailable('yahoo is rate limiting requests', 60)
+
+    store.fetch = unavailable
+    pd.testing.assert_frame_equal(store.daily('NVDA'), stored)
+
+
+@pytest.mark.anyio
+async def test_ticker_ytd_reports_an_unavailable_upstream(client, monkeypatch):
+    def unavailable(ticker, range_name):
+        raise upstream.UpstreamUnavailable('yahoo is rate limiting requests', 42)
+
+    monkeypatch.setattr(tradiescrape, 'chart_records', unavailable)
+    response = await client.get('/ticker-ytd/NVDA')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '42'
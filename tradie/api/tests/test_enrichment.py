@@ -0,0 +1,37 @@
+import pandas as pd
+
+from enrichment import QuoteEnricher
+
+
+class FlakyQuotes:
+    """Answers with `prices` until `failing` is set"""
+
+    def __init__(self, prices: dict):
+        self.prices = prices
+        self.failing = False
+
+    def __call__(self, tickers: list) -> dict:
+        if self.failing:
+            raise RuntimeError('Yahoo is down')
+        return {ticker: {'price': self.prices[ticker], 'marketCap': 1e9} for ticker in tickers}
+
+
+def trades() -> pd.DataFrame:
+    return pd.DataFrame({'ticker': ['NVDA', 'pltr '], 'priceNum': [100.0, 20.0]})
+
+
+def test_quotes_are_added_to_every_row():
+    enriched = QuoteEnricher(fetch=FlakyQuotes({'NVDA': 110.0, 'PLTR': 15.0}))(trades())
+    assert list(enriched['currentPrice']) == [110.0, 15.0]
+    assert list(enriched['changeSinceTrade']) == [10.0, -25.0]
+
+
+def test_failed_fetch_keeps_the_previous_quotes():
+    quotes = FlakyQuotes({'NVDA': 110.0, 'PLTR': 15.0})
+    enricher = QuoteEnricher(fetch=quotes)
+    enricher(trades())
+    quotes.failing = True
+    enriched = enricher(trades())
+    assert list(enriched['currentPrice']) == [110.0, 15.0]
+    assert list(enriched['marketCap']) == [1e9, 1e9]
+    assert enricher.stats()['lastError'] == 'RuntimeError: Yahoo is down'
@@ -0,0 +1,97 @@
+"""The feed endpoints, served by the whole app with the refresher scraping the fixture page"""
+import gzip
+import json
+
+import pytest
+
+from refresher import Snapshot
+import tradiescrape
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_all_data_serves_the_scraped_page(client):
+    response = await client.get('/allData')
+    assert response.status_code == 200
+    assert response.headers['X-Snapshot-Id'] == '1'
+    rows = response.json()
+    assert len(rows) == 25
+    assert rows[0]['ticker'] == 'ENPH'
+
+
+async def test_status_reports_the_snapshot(client):
+    status = (await client.get('/status')).json()
+    assert status['source'] == 'live'
+    assert status['rows'] == 25
+    assert status['lastError'] is None
+    assert status['running']
+
+
+async def test_role_feeds_follow_the_role_index(client):
+    snapshot = tradiescrape.refresher.current()
+    for path, role in [('/ceo', 'ceo'), ('/pres', 'pres'), ('/cfo', 'cfo'), ('/dir', 'dir'), ('/ten-percent', 'ten')]:
+        rows = (await client.get(path)).json()
+        expected = snapshot.role_frame(role)
+        assert [row['insiderName'] for row in rows] == list(expected['insiderName']), path
+
+
+async def test_etag_and_not_modified(client):
+    response = await client.get('/cfo')
+    etag = response.headers['ETag']
+    assert etag.startswith('W/"')
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    unchanged = await client.get('/cfo', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b''
+    assert unchanged.headers['ETag'] == etag
+    # Weak comparison, and a list of tags
+    assert (await client.get('/cfo', headers={'If-None-Match': etag.removeprefix('W/')})).status_code == 304
+    assert (await client.get('/cfo', headers={'If-None-Match': f'"other", {etag}'})).status_code == 304
+    assert (await client.get('/cfo', headers={'If-None-Match': '"other"'})).status_code == 200
+    # Each feed has its own tag
+    assert (await client.get('/ceo', headers={'If-None-Match': etag})).status_code == 200
+
+
+async def test_gzipped_body_matches_the_plain_one(client):
+    plain = await client.get('/allData', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    # Decoded by hand so the bytes on the wire are what gets checked
+    async with client.stream('GET', '/allData', headers={'Accept-Encoding': 'gzip'}) as zipped:
+        assert zipped.headers['Content-Encoding'] == 'gzip'
+        assert zipped.headers['ETag'] == plain.headers['ETag']
+        raw = b''.join([chunk async for chunk in zipped.aiter_raw()])
+    assert json.loads(gzip.decompress(raw)) == plain.json()
+
+
+async def test_since_the_current_snapshot_is_empty(client):
+    body = (await client.get('/allData', params={'since': 1})).json()
+    assert body == {'snapshotId': 1, 'since': 1, 'full': False, 'rows': []}
+
+
+@pytest.mark.parametrize('since', [0, 42])
+async def test_since_an_unknown_snapshot_is_the_full_feed(client, since):
+    response = await client.get('/dir', params={'since': since})
+    assert 'ETag' not in response.headers
+    body = response.json()
+    assert body['full'] is True
+    assert len(body['rows']) == len(tradiescrape.refresher.current().roles['dir'])
+
+
+async def test_since_a_new_snapshot_has_only_new_rows(client, fixture_frame):
+    refresher = tradiescrape.refresher
+    snapshot = refresher.current()
+    # A later scrape that found five more buys on top of the page
+    refresher.publish(Snapshot(frame=snapshot.frame.iloc[5:].reset_index(drop=True), fetched_at=snapshot.fetched_at,
+                               snapshot_id=snapshot.snapshot_id))
+    refresher.publish(Snapshot(frame=snapshot.frame, fetched_at=snapshot.fetched_at,
+                               snapshot_id=snapshot.snapshot_id + 1, fingerprint=snapshot.fingerprint))
+    try:
+        response = await client.get('/allData', params={'since': snapshot.snapshot_id})
+        assert response.headers['X-Snapshot-Id'] == str(snapshot.snapshot_id + 1)
+        body = response.json()
+        assert body['full'] is False
+        assert [row['ticker'] for row in body['rows']] == list(fixture_frame['ticker'].iloc[:5])
+    finally:
+        refresher.publish(snapshot)
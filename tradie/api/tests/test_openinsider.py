@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+import openinsider
+
+
+def test_parse_page_reads_every_row(fixture_frame):
+    assert len(fixture_frame) == 25
+    first = fixture_frame.iloc[0]
+    assert first['ticker'] == 'ENPH'
+    assert first['title'] == 'Dir, 10%'
+    assert (first['filingDate'], first['tradeDate']) == ('2/28/25', '2/26/25')
+
+
+def test_parse_page_typed_columns(fixture_frame):
+    first = fixture_frame.iloc[0]
+    assert first['priceNum'] == 379.25
+    assert first['quantityNum'] == 10000
+    assert first['ownedNum'] == 10000
+    assert first['valueNum'] == 3792500.0
+    assert first['filingTs'] == pd.Timestamp('2025-02-28 10:30:00')
+    assert first['tradeTs'] == pd.Timestamp('2025-02-26')
+    assert fixture_frame['newPosition'].dtype == bool
+    # 'New' positions have no percentage to compare
+    assert (fixture_frame.loc[fixture_frame['newPosition'], 'percentOwnedIncrease'] == 0).all()
+    assert list(fixture_frame['percentOwnedIncrease'].iloc[6:8]) == [1, 50]
+
+
+def test_records_keep_the_page_text(fixture_frame):
+    record = openinsider.records(fixture_frame.head(1))[0]
+    assert record['price'] == '$379.25'
+    assert record['moneyValueIncrease'] == '+$3,792,500'
+    assert not set(openinsider.TYPED_COLUMNS) & set(record)
+
+
+def test_fingerprint_ignores_the_rest_of_the_page(fixture_html):
+    moved = fixture_html.replace('<body', '<body data-ad="1"', 1)
+    assert moved != fixture_html
+    assert openinsider.table_fingerprint(moved) == openinsider.table_fingerprint(fixture_html)
+    assert openinsider.table_fingerprint(moved.replace('ENPH', 'ENPX')) != openinsider.table_fingerprint(fixture_html)
+
+
+def test_row_keys_identify_trades(fixture_frame):
+    keys = openinsider.row_keys(fixture_frame)
+    assert keys[0] == '2/28/25|ENPH|Lee Grace|+10,000|$379.25'
+    assert len(set(keys)) == len(fixture_frame)
+
+
+def test_html_parser_fallback_matches_lxml(fixture_html, fixture_frame, monkeypatch):
+    monkeypatch.setattr(openinsider, 'etree_html', None)
+    pd.testing.assert_frame_equal(openinsider.parse_page(fixture_html), fixture_frame)
+
+
+@pytest.mark.parametrize('text, expected', [('+$1,234', 1234.0), ('-5,000', -5000.0), ('$12.34', 12.34),
+                                            ('+12%', 12.0), ('New', None), ('', None)])
+def test_to_number(text, expected):
+    value = openinsider.to_number(pd.Series([text])).iloc[0]
+    assert pd.isna(value) if expected is None else value == expected
+
+
+def test_empty_frame_has_every_column():
+    frame = openinsider.empty_frame()
+    assert frame.empty
+    assert set(openinsider.COLUMN_NAMES.values()) | set(openinsider.TYPED_COLUMNS) <= set(frame.columns)
@@ -0,0 +1,161 @@
+from datetime import date, datetime, timedelta
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import pricecache
+from pricecache import MARKET_TZ, TTLCache
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def run_concurrently(cache, key, loader, callers: int) -> list:
+    """get(key) from `callers` threads while the first load is held open, -> each caller's value or exception"""
+    release = threading.Event()
+    results = [None] * callers
+
+    def held_loader():
+        release.wait(5)
+        return loader()
+
+    def call(i):
+        try:
+            results[i] = cache.get(key, held_loader)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    # Everyone but the leader is parked on the leader's load
+    wait_until(lambda: cache.coalesced == callers - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_hit_until_the_ttl_runs_out():
+    cache = TTLCache(ttl=lambda key, value: 0.05)
+    calls = []
+    loader = lambda: calls.append(1) or len(calls)
+    assert cache.get('a', loader) == 1
+    assert cache.get('a', loader) == 1
+    time.sleep(0.06)
+    assert cache.get('a', loader) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_concurrent_misses_load_once():
+    cache = TTLCache()
+    calls = []
+    results = run_concurrently(cache, 'a', lambda: calls.append(1) or 'value', callers=8)
+    assert calls == [1]
+    assert results == ['value'] * 8
+    assert cache.stats()['coalesced'] == 7
+    assert cache.get('a', lambda: 'other') == 'value'
+
+
+def test_concurrent_misses_share_the_loader_error():
+    cache = TTLCache()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ValueError('no data')
+
+    results = run_concurrently(cache, 'a', failing, callers=5)
+    assert calls == [1]
+    assert all(isinstance(result, ValueError) for result in results)
+    # The same exception, not five loads that each failed
+    assert len({id(result) for result in results}) == 1
+    # Errors are not cached, the next lookup loads again
+    assert cache.get('a', lambda: 'recovered') == 'recovered'
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.get('a', lambda: 1)
+    cache.get('b', lambda: 2)
+    cache.get('a', lambda: None)
+    cache.get('c', lambda: 3)
+    assert cache.evictions == 1
+    assert cache.fresh('a') and cache.fresh('c')
+    assert not cache.fresh('b')
+    assert cache.stats()['entries'] == 2
+
+
+def test_put_replaces_an_entry():
+    cache = TTLCache()
+    cache.get('a', lambda: 1)
+    cache.put('a', 2)
+    assert cache.get('a', lambda: 3) == 2
+
+
+def test_stale_value_is_served_while_it_reloads():
+    cache = TTLCache(stale_ttl=60)
+    cache.get('a', lambda: 'old', ttl=0)
+    loaded = threading.Event()
+
+    def reload():
+        loaded.set()
+        return 'new'
+
+    assert cache.get('a', reload) == 'old'
+    assert loaded.wait(5)
+    wait_until(lambda: cache.fresh('a'))
+    assert cache.get('a', lambda: 'unused') == 'new'
+    assert (cache.stale_hits, cache.hits, cache.misses) == (1, 1, 1)
+
+
+def test_failed_reload_keeps_the_stale_value():
+    cache = TTLCache(stale_ttl=60)
+    cache.get('a', lambda: 'old', ttl=0)
+
+    def failing():
+        raise ConnectionError('Yahoo is down')
+
+    assert cache.get('a', failing) == 'old'
+    wait_until(lambda: cache.revalidation_errors == 1)
+    # Still served, and the next lookup tries again
+    assert cache.get('a', failing) == 'old'
+    wait_until(lambda: cache.revalidation_errors == 2)
+    assert not cache.fresh('a')
+    assert cache.stats()['staleHits'] == 2
+
+
+def test_nothing_is_served_past_the_stale_window():
+    cache = TTLCache(stale_ttl=0.05)
+    cache.get('a', lambda: 'old', ttl=0)
+    time.sleep(0.06)
+    assert cache.get('a', lambda: 'new') == 'new'
+    assert cache.stale_hits == 0
+
+
+@pytest.mark.parametrize('data', [None, pd.DataFrame()])
+def test_empty_history_is_cached_briefly(data):
+    assert pricecache._history_key_ttl(('NVDA', '1d', date(2024, 1, 1), date.today()), data) == pricecache.TTL_EMPTY
+
+
+def test_past_windows_are_cached_for_a_day():
+    bars = pd.DataFrame({'Close': [1.0]})
+    key = ('NVDA', '1d', date(2024, 1, 1), date.today() - timedelta(days=3))
+    assert pricecache._history_key_ttl(key, bars) == pricecache.TTL_HISTORICAL
+
+
+def test_history_ttl_follows_the_market():
+    wednesday = date(2024, 6, 12)
+    open_now = datetime(2024, 6, 12, 11, 0, tzinfo=MARKET_TZ)
+    assert pricecache.history_ttl(wednesday, open_now) == pricecache.TTL_MARKET_OPEN
+    # Closed: until the next open, capped at TTL_MARKET_CLOSED
+    evening = datetime(2024, 6, 12, 20, 0, tzinfo=MARKET_TZ)
+    assert pricecache.history_ttl(wednesday, evening) == min(pricecache.TTL_MARKET_CLOSED, 13.5 * 3600)
+    saturday = datetime(2024, 6, 15, 12, 0, tzinfo=MARKET_TZ)
+    assert pricecache.history_ttl(date(2024, 6, 15), saturday) == pricecache.TTL_MARKET_CLOSED
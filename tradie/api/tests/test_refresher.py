@@ -0,0 +1,155 @@
+import json
+import time
+
+import pytest
+
+from refresher import InsiderRefresher
+
+pytestmark = pytest.mark.usefixtures('fast_openinsider')
+
+
+@pytest.fixture
+def refresher(tmp_path, write_page):
+    return InsiderRefresher(url=write_page(20), data_dir=str(tmp_path / 'data'))
+
+
+def test_refresh_swaps_in_a_new_snapshot(refresher, write_page):
+    assert refresher.current().source == 'empty'
+    assert refresher.refresh()
+    first = refresher.current()
+    assert (first.source, first.snapshot_id, len(first.frame)) == ('live', 1, 20)
+
+    write_page(25)
+    assert refresher.refresh()
+    second = refresher.current()
+    assert (second.snapshot_id, len(second.frame)) == (2, 25)
+    # Published snapshots are never changed in place
+    assert len(first.frame) == 20 and first.snapshot_id == 1
+
+
+def test_unchanged_page_keeps_the_snapshot(refresher):
+    refresher.refresh()
+    first = refresher.current()
+    assert refresher.refresh()
+    assert refresher.current() is first
+    assert refresher.unchanged == 1
+
+
+def test_listeners_see_every_new_snapshot(refresher, write_page):
+    seen = []
+    refresher.subscribe(lambda snapshot: seen.append(snapshot.snapshot_id))
+    refresher.refresh()
+    refresher.refresh()
+    write_page(25)
+    refresher.refresh()
+    assert seen == [1, 2]
+
+
+def test_unchanged_page_is_restaged_under_the_same_id(refresher):
+    price = [1.0]
+    refresher.add_stage(lambda frame: frame.assign(currentPrice=price[0]))
+    seen = []
+    refresher.subscribe(lambda snapshot: seen.append(snapshot.snapshot_id))
+    refresher.refresh()
+    first = refresher.current()
+    price[0] = 2.0
+    assert refresher.refresh()
+    restaged = refresher.current()
+    assert seen == [1, 1]
+    assert restaged.snapshot_id == 1 and (restaged.frame['currentPrice'] == 2.0).all()
+    # Bodies and ETags are rebuilt, so clients holding the old ETag get the new prices
+    assert restaged.bodies['all'] != first.bodies['all']
+    assert restaged.etags['all'] != first.etags['all']
+
+
+def test_failed_scrape_keeps_the_old_snapshot(refresher, tmp_path):
+    refresher.refresh()
+    first = refresher.current()
+    refresher.url = str(tmp_path / 'missing.html')
+    assert not refresher.refresh()
+    assert refresher.current() is first
+    assert refresher.failures == 1
+    assert refresher.last_error.startswith('FileNotFoundError')
+    assert refresher.status()['consecutiveFailures'] == 1
+
+
+def test_failures_back_off_up_to_the_interval(refresher):
+    assert refresher._next_delay() == refresher.interval
+    refresher.failures = 1
+    assert refresher._next_delay() == 30
+    refresher.failures = 3
+    assert refresher._next_delay() == 120
+    refresher.failures = 10
+    assert refresher._next_delay() == refresher.interval
+
+
+def test_persisted_snapshot_is_loaded_on_restart(refresher, tmp_path, write_page):
+    refresher.refresh()
+    write_page(25)
+    refresher.refresh()
+    saved = refresher.current()
+
+    with open(refresher.meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    assert meta['snapshot_id'] == 2 and meta['rows'] == 25
+    assert 'snapshotId' not in meta
+
+    restarted = InsiderRefresher(url=refresher.url, data_dir=str(tmp_path / 'data'))
+    assert restarted.load_persisted()
+    loaded = restarted.current()
+    assert loaded.source == 'persisted'
+    assert loaded.fetched_at == saved.fetched_at
+    assert loaded.snapshot_id == saved.snapshot_id
+    assert loaded.fingerprint == saved.fingerprint
+    assert list(loaded.keys) == list(saved.keys)
+    # Same page, the first scrape after the restart doesn't start a new snapshot
+    assert restarted.refresh()
+    assert restarted.current().snapshot_id == 2
+
+
+def test_nothing_persisted_yet(tmp_path):
+    assert not InsiderRefresher(data_dir=str(tmp_path / 'empty')).load_persisted()
+
+
+def test_background_thread_scrapes_and_stops(refresher):
+    refresher.start()
+    try:
+        deadline = time.monotonic() + 10
+        while refresher.current().source == 'empty' and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert refresher.current().source == 'live'
+        assert refresher.status()['running']
+    finally:
+        refresher.stop()
+    assert not refresher.status()['running']
+
+
+def test_rows_since_returns_only_new_rows(refresher, write_page, fixture_frame):
+    refresher.refresh()
+    write_page(25)
+    refresher.refresh()
+
+    rows, full = refresher.rows_since(1)
+    assert not full
+    assert list(rows['insiderName']) == list(fixture_frame['insiderName'].iloc[20:])
+    rows, full = refresher.rows_since(2)
+    assert not full and rows.empty
+
+
+def test_rows_since_by_role(refresher, write_page):
+    refresher.refresh()
+    write_page(25)
+    refresher.refresh()
+    snapshot = refresher.current()
+
+    rows, full = refresher.rows_since(1, 'cfo')
+    assert not full
+    assert set(rows.index) == {position for position in snapshot.roles['cfo'] if position >= 20}
+
+
+@pytest.mark.parametrize('since_id', [0, 99])
+def test_unknown_snapshot_gets_the_full_feed(refresher, since_id):
+    refresher.refresh()
+    rows, full = refresher.rows_since(since_id)
+    assert full
+    assert len(rows) == 20
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+import json
+
+import pandas as pd
+import pytest
+
+from refresher import Snapshot
+from roles import ROLES, build_role_index, classify_title
+
+# The per-request masks the role index replaced
+OLD_MASKS = {
+    'ceo': lambda titles: titles == 'CEO',
+    'pres': lambda titles: titles == 'Pres, CEO',
+    'cfo': lambda titles: titles == 'CFO',
+    'dir': lambda titles: titles.str.contains('Dir', case=False, na=False),
+    'ten': lambda titles: titles.str.contains('10%|10-Percent|10 Percent', case=False, regex=True, na=False),
+}
+
+
+@pytest.mark.parametrize('title, expected', [('CEO', {'ceo'}), ('Pres,  CEO ', {'pres'}), ('cfo', {'cfo'}),
+                                             ('CEO, Dir', {'dir'}), ('Dir, 10%', {'dir', 'ten'}),
+                                             ('10 Percent Owner', {'ten'}), ('EVP, GC', set()), (None, set())])
+def test_classify_title(title, expected):
+    assert classify_title(title) == expected
+
+
+def test_role_index_only_counts_increased_ownership():
+    frame = pd.DataFrame({'title': ['CEO', 'CEO', 'CFO', 'Dir, 10%', None],
+                          'percentOwnedIncrease': [5, 0, 12, 3, 8]})
+    index = build_role_index(frame)
+    assert set(index) == set(ROLES)
+    assert list(index['ceo']) == [0]
+    assert list(index['cfo']) == [2]
+    assert list(index['dir']) == [3]
+    assert list(index['ten']) == [3]
+    assert list(index['pres']) == []
+
+
+@pytest.mark.parametrize('role', ROLES)
+def test_role_index_matches_the_old_filters(fixture_frame, role):
+    increased = fixture_frame['percentOwnedIncrease'] > 0
+    expected = fixture_frame[increased & OLD_MASKS[role](fixture_frame['title'])]
+    assert list(fixture_frame.iloc[build_role_index(fixture_frame)[role]].index) == list(expected.index)
+
+
+def test_snapshot_bodies_are_the_role_frames(fixture_frame):
+    snapshot = Snapshot(frame=fixture_frame, fetched_at=datetime.now(timezone.utc))
+    assert len(json.loads(snapshot.bodies['all'])) == len(fixture_frame)
+    for role in ROLES:
+        rows = json.loads(snapshot.bodies[role])
+        assert [row['insiderName'] for row in rows] == list(snapshot.role_frame(role)['insiderName'])
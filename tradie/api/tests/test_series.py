@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from series import aggregate, downsample, lttb
+
+
+def reference_lttb(y, max_points: int) -> list:
+    """Steinarsson's original point-by-point LTTB, what series.lttb has to keep matching"""
+    length = len(y)
+    every = (length - 2) / (max_points - 2)
+    selected = [0]
+    a = 0
+    for i in range(max_points - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, length)
+        average_x = sum(range(next_start, next_end)) / (next_end - next_start)
+        average_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, best_area = None, -1
+        for point in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((a - average_x) * (y[point] - y[a]) - (a - point) * (average_y - y[a])) / 2
+            if area > best_area:
+                best, best_area = point, area
+        selected.append(best)
+        a = best
+    selected.append(length - 1)
+    return selected
+
+
+def random_walk(length: int, seed: int = 7) -> np.ndarray:
+    return np.cumsum(np.random.default_rng(seed).normal(size=length)) + 100
+
+
+def bars(length: int) -> pd.DataFrame:
+    days = pd.bdate_range('2024-01-02', periods=length, name='Date')
+    close = random_walk(length)
+    wick = np.arange(length) % 7
+    return pd.DataFrame({'Open': close - 0.5, 'High': close + wick, 'Low': close - wick, 'Close': close,
+                         'Volume': np.arange(length, dtype=float) * 100}, index=days)
+
+
+@pytest.mark.parametrize('length, max_points', [(1000, 50), (1258, 300), (101, 3), (37, 36)])
+def test_lttb_matches_the_reference(length, max_points):
+    y = random_walk(length)
+    selected = lttb(y, max_points)
+    assert len(selected) == max_points
+    assert selected[0] == 0 and selected[-1] == length - 1
+    assert list(selected) == reference_lttb(list(y), max_points)
+
+
+def test_lttb_keeps_the_spikes():
+    y = np.array([0, 1, 0, 0, 9, 0, 0, -7, 0, 0], dtype=float)
+    assert list(lttb(y, 4)) == [0, 4, 7, 9]
+
+
+@pytest.mark.parametrize('max_points', [10, 11, 500])
+def test_short_series_are_kept_whole(max_points):
+    assert list(lttb(random_walk(10), max_points)) == list(range(10))
+    frame = bars(10)
+    assert downsample(frame, max_points) is frame
+    assert aggregate(frame, max_points) is frame
+
+
+def test_downsampled_close_stays_within_max_points():
+    frame = bars(1000)
+    for max_points in (3, 50, 999):
+        line = downsample(frame, max_points)
+        assert len(line) <= max_points
+        assert line.index[0] == frame.index[0] and line.index[-1] == frame.index[-1]
+
+
+def test_aggregate_merges_candles():
+    frame = bars(10)
+    candles = aggregate(frame, 3)
+    # Buckets of rows 0-2, 3-5 and 6-9
+    assert list(candles.index) == list(frame.index[[0, 3, 6]])
+    for candle, (first, last) in zip(candles.itertuples(), [(0, 3), (3, 6), (6, 10)]):
+        bucket = frame.iloc[first:last]
+        assert candle.Open == bucket['Open'].iloc[0]
+        assert candle.High == bucket['High'].max()
+        assert candle.Low == bucket['Low'].min()
+        assert candle.Close == bucket['Close'].iloc[-1]
+        assert candle.Volume == bucket['Volume'].sum()
+    assert len(aggregate(bars(1000), 50)) == 50
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import signals
+
+
+def buys(*rows) -> pd.DataFrame:
+    """A parsed-looking frame from (ticker, insider, title, trade date) rows, every buy 10% of what was held"""
+    tickers, insiders, titles, dates = zip(*rows)
+    length = len(rows)
+    return pd.DataFrame({
+        'ticker': tickers,
+        'insiderName': insiders,
+        'title': titles,
+        'tradeTs': pd.to_datetime(list(dates)),
+        'quantityNum': np.full(length, 100),
+        'ownedNum': np.full(length, 1100),
+        'percentOwnedIncrease': np.full(length, 10),
+        'newPosition': np.zeros(length, dtype=bool),
+        'valueNum': np.full(length, 5000.0),
+    })
+
+
+FRAME = buys(
+    ('AAA', 'Alice', 'CEO', '2024-06-03'),
+    # The same insider again, still one insider
+    ('AAA', 'Alice', 'CEO', '2024-06-05'),
+    ('BBB', 'Bob', 'Dir', '2024-06-03'),
+    ('BBB', 'Carol', 'CFO', '2024-06-10'),
+    # Two months apart, two clusters of one
+    ('CCC', 'Dan', 'Dir', '2024-01-02'),
+    ('CCC', 'Erin', 'Dir', '2024-03-01'),
+    # Chained by gaps of ten days, although the first and last are twenty apart
+    ('EEE', 'Frank', '10%', '2024-05-01'),
+    ('EEE', 'Grace', '10%', '2024-05-11'),
+    ('EEE', 'Heidi', '10%', '2024-05-21'),
+    ('FFF', 'Ivan', 'VP', None),
+)
+
+
+def test_cluster_sizes_count_distinct_insiders():
+    scores = signals.score_frame(FRAME)
+    assert list(scores['clusterSize']) == [1, 1, 2, 2, 1, 1, 3, 3, 3, 1]
+
+
+def test_unknown_trade_dates_are_a_cluster_of_one():
+    days = np.array([100, -1, -1, 105])
+    sizes = signals.cluster_sizes(np.array(['AAA'] * 4), days, np.array(['Ann', 'Bo', 'Cy', 'Di']))
+    assert list(sizes) == [2, 1, 1, 2]
+
+
+def test_cluster_window_is_inclusive():
+    days = np.array([0, 14, 29])
+    sizes = signals.cluster_sizes(np.array(['AAA'] * 3), days, np.array(['Ann', 'Bo', 'Cy']), window=14)
+    assert list(sizes) == [2, 2, 1]
+
+
+def test_score_components():
+    scores = signals.score_frame(FRAME)
+    alice = scores.iloc[0]
+    assert alice['role'] == 1.0 and alice['cluster'] == 0
+    # Bought 10% of the holding: a third of the way from 1% to 1000% on the log scale
+    assert alice['holdings'] == pytest.approx(1 / 3)
+    # No quote, so the market cap is left out of the average
+    assert np.isnan(alice['marketCap'])
+    assert alice['score'] == round((0.25 * 1.0 + 0.25 / 3) / 0.85 * 100, 1)
+
+
+def test_ranking_puts_clusters_and_senior_buyers_first():
+    order = signals.ranking(signals.score_frame(FRAME))
+    names = list(FRAME['insiderName'].iloc[order])
+    assert names == ['Frank', 'Grace', 'Heidi', 'Carol', 'Bob', 'Alice', 'Alice', 'Dan', 'Erin', 'Ivan']
+
+
+def test_market_cap_raises_the_score():
+    enriched = FRAME.assign(marketCap=np.where(FRAME['ticker'] == 'CCC', 5e6, np.nan))
+    scores = signals.score_frame(enriched)
+    # 5000 of a 5M company is 0.1%, the top of the scale
+    assert list(scores['marketCap'].iloc[4:6]) == [1.0, 1.0]
+    assert scores['score'].iloc[4] > signals.score_frame(FRAME)['score'].iloc[4]
@@ -0,0 +1,176 @@
+"""/stream and /ws/trades: the broadcaster on its own, then one WebSocket through the whole app"""
+from contextlib import asynccontextmanager
+import asyncio
+import json
+
+import pytest
+
+from refresher import InsiderRefresher, Snapshot
+from stream import CLIENT_QUEUE, RESYNC, Subscriber, TradeBroadcaster
+import tradiescrape
+
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures('fast_openinsider')]
+
+
+@pytest.fixture
+def refresher(tmp_path, write_page):
+    return InsiderRefresher(url=write_page(20), data_dir=str(tmp_path / 'data'))
+
+
+@pytest.fixture
+async def broadcaster(refresher):
+    broadcaster = TradeBroadcaster(refresher)
+    broadcaster.start()
+    refresher.subscribe(broadcaster.on_snapshot)
+    yield broadcaster
+    broadcaster.stop()
+
+
+def tickers(message) -> list:
+    return [row['ticker'] for row in json.loads(message[2])['rows']]
+
+
+async def test_new_rows_reach_the_matching_filters(refresher, broadcaster, write_page):
+    refresher.refresh()
+    everyone = broadcaster.subscribe()
+    ceos = broadcaster.subscribe(roles=frozenset({'ceo'}))
+    coke = broadcaster.subscribe(tickers=frozenset({'KO'}))
+    directors = broadcaster.subscribe(roles=frozenset({'dir'}))
+    write_page(25)
+    refresher.refresh()
+    # The fan-out is handed over from the refresher thread with call_soon_threadsafe
+    await asyncio.sleep(0)
+
+    message = everyone.queue.get_nowait()
+    assert message[:2] == ('trades', 2)
+    assert tickers(message) == ['CELH', 'KO', 'DKNG', 'PLTR', 'PLTR']
+    assert tickers(ceos.queue.get_nowait()) == ['CELH', 'PLTR']
+    assert tickers(coke.queue.get_nowait()) == ['KO']
+    # None of the new buys is a director's
+    assert directors.queue.empty()
+    assert broadcaster.stats()['rowsPushed'] == 5 + 2 + 1
+
+
+async def test_unchanged_snapshot_pushes_nothing(refresher, broadcaster):
+    refresher.refresh()
+    everyone = broadcaster.subscribe()
+    refresher.refresh()
+    await asyncio.sleep(0)
+    assert everyone.queue.empty()
+    assert broadcaster.stats()['events'] == 0
+
+
+async def test_lagged_subscriber_gets_one_resync():
+    subscriber = Subscriber()
+    for i in range(CLIENT_QUEUE + 3):
+        subscriber.offer(('trades', i, '{}'))
+    assert subscriber.lagged
+    event, event_id, data = await subscriber.next()
+    assert (event, event_id) == (RESYNC, None)
+    assert json.loads(data) == {'reason': 'client too slow'}
+    # What was queued is dropped, the next push arrives as usual
+    assert subscriber.queue.empty() and not subscriber.lagged
+    subscriber.offer(('trades', 99, '{}'))
+    assert await subscriber.next() == ('trades', 99, '{}')
+
+
+async def test_catch_up_after_a_reconnect(refresher, broadcaster, write_page):
+    refresher.refresh()
+    write_page(25)
+    refresher.refresh()
+    subscriber = broadcaster.subscribe()
+
+    event, event_id, _ = broadcaster.catch_up(subscriber, 1)
+    assert (event, event_id) == ('trades', 2)
+    assert tickers(broadcaster.catch_up(subscriber, 1)) == ['CELH', 'KO', 'DKNG', 'PLTR', 'PLTR']
+    # Up to date, or connecting for the first time
+    for since_id in (2, None):
+        assert broadcaster.catch_up(subscriber, since_id) == ('ready', 2, json.dumps({'snapshotId': 2}))
+    # Nothing new that passes the filter
+    directors = broadcaster.subscribe(roles=frozenset({'dir'}))
+    assert broadcaster.catch_up(directors, 1)[0] == 'ready'
+
+
+@pytest.mark.parametrize('since_id', [0, 99])
+async def test_catch_up_from_an_unknown_snapshot_resyncs(refresher, broadcaster, since_id):
+    refresher.refresh()
+    event, event_id, data = broadcaster.catch_up(broadcaster.subscribe(), since_id)
+    assert (event, event_id) == (RESYNC, 1)
+    assert json.loads(data) == {'reason': 'snapshot too old', 'snapshotId': 1}
+    assert broadcaster.stats()['resyncs'] == 1
+
+
+def test_unsubscribe_bookkeeping(refresher):
+    broadcaster = TradeBroadcaster(refresher, max_clients=3)
+    first, second = broadcaster.subscribe(), broadcaster.subscribe()
+    ceos = broadcaster.subscribe(roles=frozenset({'ceo'}))
+    assert broadcaster.subscribe() is None
+    assert broadcaster.stats()['clients'] == 3 and broadcaster.stats()['filterGroups'] == 2
+
+    broadcaster.unsubscribe(first)
+    # A second unsubscribe (the stream's finally after a disconnect) doesn't count twice
+    broadcaster.unsubscribe(first)
+    assert broadcaster.stats()['clients'] == 2 and broadcaster.stats()['filterGroups'] == 2
+    broadcaster.unsubscribe(ceos)
+    assert broadcaster.stats()['clients'] == 1 and broadcaster.stats()['filterGroups'] == 1
+    broadcaster.unsubscribe(second)
+    assert broadcaster.stats()['clients'] == 0 and broadcaster.stats()['filterGroups'] == 0
+    assert broadcaster.subscribe() is not None
+
+
+@asynccontextmanager
+async def websocket(path: str, query: str = ''):
+    """A WebSocket connection to the app, driven through ASGI on the event loop the app runs on.
+
+    -> the queue of messages the app sent; Starlette's TestClient would run the
+    app on a loop of its own, where the broadcaster never pushes.
+    """
+    incoming, sent = asyncio.Queue(), asyncio.Queue()
+    scope = {'type': 'websocket', 'asgi': {'version': '3.0'}, 'scheme': 'ws', 'path': path, 'root_path': '',
+             'raw_path': path.encode(), 'query_string': query.encode(), 'headers': [(b'host', b'tradie')],
+             'client': ('127.0.0.1', 50000), 'server': ('tradie', 80), 'subprotocols': [], 'state': {}}
+    await incoming.put({'type': 'websocket.connect'})
+    app = asyncio.ensure_future(tradiescrape.app(scope, incoming.get, sent.put))
+    try:
+        yield sent
+    finally:
+        await incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(app, 5)
+
+
+async def receive_json(sent: asyncio.Queue) -> dict:
+    message = await asyncio.wait_for(sent.get(), 5)
+    assert message['type'] == 'websocket.send', message
+    return json.loads(message['text'])
+
+
+async def test_websocket_gets_the_new_rows(client):
+    refresher, broadcaster = tradiescrape.refresher, tradiescrape.broadcaster
+    snapshot = refresher.current()
+    clients = broadcaster.stats()['clients']
+    async with websocket('/ws/trades', 'tickers=enph') as sent:
+        assert (await asyncio.wait_for(sent.get(), 5))['type'] == 'websocket.accept'
+        assert await receive_json(sent) == {'event': 'ready', 'data': {'snapshotId': snapshot.snapshot_id}}
+        assert broadcaster.stats()['clients'] == clients + 1
+
+        # Two later scrapes, the second found five more buys on top of the page
+        try:
+            refresher.publish(Snapshot(frame=snapshot.frame.iloc[5:].reset_index(drop=True),
+                                       fetched_at=snapshot.fetched_at, snapshot_id=snapshot.snapshot_id + 1))
+            refresher.publish(Snapshot(frame=snapshot.frame, fetched_at=snapshot.fetched_at,
+                                       snapshot_id=snapshot.snapshot_id + 2, fingerprint=snapshot.fingerprint))
+            pushed = await receive_json(sent)
+        finally:
+            refresher.publish(snapshot)
+        assert pushed['event'] == 'trades'
+        assert pushed['data']['snapshotId'] == snapshot.snapshot_id + 2
+        new = snapshot.frame.iloc[:5]
+        assert [row['insiderName'] for row in pushed['data']['rows']] == \
+            list(new['insiderName'][new['ticker'] == 'ENPH'])
+    assert broadcaster.stats()['clients'] == clients
+
+
+async def test_websocket_rejects_a_bad_filter(client):
+    async with websocket('/ws/trades', 'roles=chef') as sent:
+        message = await asyncio.wait_for(sent.get(), 5)
+    assert (message['type'], message['code']) == ('websocket.close', 1008)
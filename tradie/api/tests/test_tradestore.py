@@ -0,0 +1,39 @@
+import sqlite3
+
+import numpy as np
+
+from tradestore import TradeStore
+
+
+def with_missing_price(frame):
+    frame = frame.head(10).copy()
+    frame.loc[frame.index[0], 'priceNum'] = np.nan
+    frame.loc[frame.index[1], 'quantityNum'] = None
+    return frame
+
+
+def test_same_frame_twice_adds_nothing(tmp_path, fixture_frame):
+    store = TradeStore(path=str(tmp_path / 'trades.sqlite'))
+    frame = with_missing_price(fixture_frame)
+    assert store.ingest(frame) == 10
+    assert store.ingest(frame) == 0
+    assert store.stats()['trades'] == 10
+    assert store.ingest(fixture_frame.iloc[10:12]) == 2
+    assert store.stats()['trades'] == 12
+
+
+def test_old_null_duplicates_are_dropped_on_open(tmp_path, fixture_frame):
+    path = str(tmp_path / 'trades.sqlite')
+    TradeStore(path=path).ingest(with_missing_price(fixture_frame))
+    # What the old NULL-blind key let through: the same price-less buy, stored again
+    with sqlite3.connect(path) as db:
+        db.execute('DROP INDEX trades_key')
+        db.execute('INSERT INTO trades (filing_ts, trade_date, ticker, company, insider, title, trade_type, price, '
+                   'qty, owned, delta_own, value, new_position, x, first_seen) '
+                   'SELECT filing_ts, trade_date, ticker, company, insider, title, trade_type, price, qty, owned, '
+                   'delta_own, value, new_position, x, first_seen FROM trades WHERE price IS NULL')
+    db.close()
+
+    store = TradeStore(path=path)
+    assert store.stats()['trades'] == 10
+    assert store.ingest(with_missing_price(fixture_frame)) == 0
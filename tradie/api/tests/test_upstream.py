@@ -0,0 +1,204 @@
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, TokenBucket, Upstream, UpstreamUnavailable
+
+
+class FakeClock:
+    """Stands in for the time module in upstream.py, sleeping just moves the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(upstream, 'time', clock)
+    return clock
+
+
+# Recognised by class name, like the yfinance / requests / google errors
+class Timeout(Exception):
+    pass
+
+
+class TooManyRequests(Exception):
+    pass
+
+
+class Flaky:
+    """Raises each of `errors` in turn, then answers 'ok'"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def make_upstream(**kwargs) -> Upstream:
+    options = dict(max_concurrency=1, timeout=5, rate=100, burst=100, retries=2, failure_threshold=3, cooldown=30,
+                   rate_limit_cooldown=60)
+    return Upstream('test', **{**options, **kwargs})
+
+
+def test_bucket_spaces_requests_after_the_burst(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    assert bucket.reserve(max_wait=10) == 0
+    assert bucket.reserve(max_wait=10) == 0
+    assert bucket.reserve(max_wait=10) == pytest.approx(0.5)
+    # Queued behind the one that is already waiting
+    assert bucket.reserve(max_wait=10) == pytest.approx(1.0)
+    assert bucket.reserve(max_wait=0.9) is None
+    clock.now += 10
+    assert bucket.reserve(max_wait=0) == 0
+
+
+def test_breaker_opens_after_the_threshold(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    assert breaker.retry_after() == 30
+    clock.now += 29
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_trial_through_after_the_cooldown(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()
+    # A failed trial opens the circuit for another cooldown
+    breaker.failure()
+    assert breaker.state == 'open'
+    clock.now += 30
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_released_trial_goes_to_the_next_caller(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_failure_with_a_cooldown_opens_right_away(clock):
+    breaker = CircuitBreaker(threshold=5, cooldown=30)
+    breaker.failure(cooldown=600)
+    assert breaker.state == 'open'
+    assert breaker.retry_after() == 600
+
+
+def test_transient_errors_are_retried(clock):
+    service = make_upstream()
+    fn = Flaky(Timeout(), ConnectionError())
+    assert service.run(fn) == 'ok'
+    assert fn.calls == 3
+    assert service.stats()['retried'] == 2 and service.stats()['failed'] == 0
+    # Backed off between attempts, and the success closed the circuit again
+    assert len(clock.slept) == 2
+    assert service.breaker.failures == 0
+
+
+def test_retries_run_out(clock):
+    service = make_upstream(retries=1, failure_threshold=5)
+    fn = Flaky(Timeout(), Timeout(), Timeout())
+    with pytest.raises(Timeout):
+        service.run(fn)
+    assert fn.calls == 2
+    assert service.stats()['failed'] == 1 and service.breaker.failures == 2
+
+
+def test_other_errors_are_not_retried(clock):
+    service = make_upstream()
+    fn = Flaky(KeyError('chart'))
+    with pytest.raises(KeyError):
+        service.run(fn)
+    assert fn.calls == 1
+    assert service.stats()['retried'] == 0
+    # The upstream answered, that doesn't count against it
+    assert service.breaker.state == 'closed' and service.breaker.failures == 0
+
+
+def test_rate_limit_opens_the_circuit(clock):
+    service = make_upstream()
+    fn = Flaky(TooManyRequests())
+    with pytest.raises(UpstreamUnavailable) as raised:
+        service.run(fn)
+    assert raised.value.retry_after == 60
+    assert fn.calls == 1
+    assert service.breaker.state == 'open'
+    # Refused without calling the upstream until the cooldown is over
+    with pytest.raises(UpstreamUnavailable):
+        service.run(fn)
+    assert fn.calls == 1
+    assert service.stats()['rateLimited'] == 1 and service.stats()['shortCircuited'] == 1
+    clock.now += 60
+    assert service.run(fn) == 'ok'
+    assert service.breaker.state == 'closed'
+
+
+def test_circuit_opens_after_repeated_failures(clock):
+    service = make_upstream(retries=0, failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(Timeout):
+            service.run(Flaky(Timeout()))
+    fn = Flaky()
+    with pytest.raises(UpstreamUnavailable) as raised:
+        service.run(fn)
+    assert raised.value.retry_after == 30
+    assert fn.calls == 0
+
+
+def test_refused_when_the_queue_is_longer_than_the_timeout(clock):
+    service = make_upstream(rate=1, burst=1, timeout=2)
+    fn = Flaky()
+    for _ in range(3):
+        service.run(fn)
+    assert clock.slept == [pytest.approx(1.0), pytest.approx(1.0)]
+    # Two more requests are queued, a third would wait three seconds
+    service.bucket.reserve(max_wait=10)
+    service.bucket.reserve(max_wait=10)
+    with pytest.raises(UpstreamUnavailable) as raised:
+        service.run(fn)
+    assert raised.value.retry_after == 2
+    assert fn.calls == 3 and service.stats()['throttled'] == 1
+
+
+def test_throttled_trial_is_handed_back(clock):
+    service = make_upstream(rate=1, burst=1, timeout=2, retries=0, failure_threshold=1)
+    with pytest.raises(Timeout):
+        service.run(Flaky(Timeout()))
+    clock.now += 30
+    for _ in range(3):
+        service.bucket.reserve(max_wait=10)
+    # Allowed as the half-open trial, then refused by the bucket
+    with pytest.raises(UpstreamUnavailable, match='queued'):
+        service.run(Flaky())
+    clock.now += 5
+    assert service.run(Flaky()) == 'ok'
+    assert service.breaker.state == 'closed'
@@ -0,0 +1,216 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+import logging
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+from refresher import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+TRADES_PATH = os.path.join(DATA_DIR, 'trades.sqlite')
+MAX_ROWS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    filing_ts TEXT NOT NULL,
+    trade_date TEXT,
+    ticker TEXT NOT NULL,
+    company TEXT,
+    insider TEXT NOT NULL COLLATE NOCASE,
+    title TEXT,
+    trade_type TEXT,
+    price REAL,
+    qty INTEGER,
+    owned INTEGER,
+    delta_own INTEGER,
+    value REAL,
+    new_position INTEGER,
+    x TEXT,
+    first_seen TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_ticker ON trades (ticker, trade_date);
+CREATE INDEX IF NOT EXISTS trades_insider ON trades (insider COLLATE NOCASE, trade_date);
+CREATE INDEX IF NOT EXISTS trades_date ON trades (trade_date);
+"""
+
+# SQLite treats NULLs in a UNIQUE key as all different, so a buy without a
+# parsed price or quantity would be stored again on every scrape: the key
+# compares them as -1 instead. Duplicates stored before this index existed
+# are dropped first or it couldn't be created.
+DEDUP = """
+DELETE FROM trades WHERE id NOT IN (
+    SELECT MIN(id) FROM trades GROUP BY filing_ts, ticker, insider, IFNULL(qty, -1), IFNULL(price, -1)
+);
+CREATE UNIQUE INDEX trades_key ON trades (filing_ts, ticker, insider, IFNULL(qty, -1), IFNULL(price, -1));
+"""
+
+# Store columns -> names used by the API (numbers stay numbers here)
+API_NAMES = {
+    'filing_ts': 'filingDate',
+    'trade_date': 'tradeDate',
+    'ticker': 'ticker',
+    'company': 'companyName',
+    'insider': 'insiderName',
+    'title': 'title',
+    'trade_type': 'tradeType',
+    'price': 'price',
+    'qty': 'quantity',
+    'owned': 'alreadyOwned',
+    'delta_own': 'percentOwnedIncrease',
+    'value': 'moneyValueIncrease',
+    'new_position': 'newPosition',
+    'x': 'x',
+}
+
+
+class TradeQueryError(ValueError):
+    pass
+
+
+class TradeStore:
+    """Append-only history of every insider purchase we have scraped.
+
+    Each snapshot is ingested with INSERT OR IGNORE on the unique
+    (filing time, ticker, insider, qty, price) key, so re-scraping the same
+    page adds nothing and trades that scroll off OpenInsider stay queryable.
+    A missing qty or price counts as -1 in the key.
+    """
+
+    def __init__(self, path: str = TRADES_PATH):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self.last_ingest = None
+        self.last_added = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            # WAL lets readers query while a scrape is being written
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+            if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'trades_key'").fetchone():
+                db.executescript(DEDUP)
+            self._counts = self._count(db)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def ingest(self, frame: pd.DataFrame) -> int:
+        """Store new rows of a parsed insider frame, returns how many were new"""
+        if frame.empty:
+            return 0
+        first_seen = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        rows = pd.DataFrame({
+            'filing_ts': frame['filingTs'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+            'trade_date': frame['tradeTs'].dt.strftime('%Y-%m-%d'),
+            'ticker': frame['ticker'].astype(str).str.strip().str.upper(),
+            'company': frame['companyName'],
+            'insider': frame['insiderName'],
+            'title': frame['title'],
+            'trade_type': frame['tradeType'],
+            'price': frame['priceNum'],
+            'qty': frame['quantityNum'],
+            'owned': frame['ownedNum'],
+            'delta_own': frame['percentOwnedIncrease'],
+            'value': frame['valueNum'],
+            'new_position': frame['newPosition'].astype(int),
+            'x': frame['x'],
+        })
+        rows = rows[rows['filing_ts'].notna()]
+        # object dtype hands sqlite3 plain Python values, NaN becomes NULL
+        rows = rows.astype(object).where(rows.notna(), None)
+        rows['first_seen'] = first_seen
+        rows = list(rows.itertuples(index=False, name=None))
+        with self._write_lock, self._connect() as db:
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO trades (filing_ts, trade_date, ticker, company, insider, title, '
+                           'trade_type, price, qty, owned, delta_own, value, new_position, x, first_seen) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            added = db.total_changes - before
+            if added:
+                self._counts = self._count(db)
+        self.last_ingest = first_seen
+        self.last_added = added
+        return added
+
+    def on_snapshot(self, snapshot):
+        # Refresher listener
+        added = self.ingest(snapshot.frame)
+        if added:
+            logger.info("Stored %d new insider trades", added)
+
+    def query(self, ticker: str = None, insider: str = None, days: int = None, limit: int = 500) -> list:
+        """Buys newest first, optionally for one ticker / insider and within the last `days` days"""
+        # SQLite reads a negative LIMIT as no limit at all
+        if limit < 1:
+            raise TradeQueryError(f"limit must be between 1 and {MAX_ROWS}")
+        clauses, params = [], []
+        if ticker:
+            clauses.append('ticker = ?')
+            params.append(ticker.strip().upper())
+        if insider:
+            clauses.append('insider = ?')
+            params.append(insider.strip())
+        if days is not None:
+            clauses.append('trade_date >= ?')
+            params.append((date.today() - timedelta(days=days)).isoformat())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        columns = ', '.join(API_NAMES)
+        with self._connect() as db:
+            cursor = db.execute(f'SELECT {columns} FROM trades {where} ORDER BY trade_date DESC, filing_ts DESC '
+                                f'LIMIT ?', (*params, min(limit, MAX_ROWS)))
+            names = list(API_NAMES.values())
+            rows = [dict(zip(names, row)) for row in cursor]
+        for row in rows:
+            row['newPosition'] = bool(row['newPosition'])
+        return rows
+
+    def frame(self) -> pd.DataFrame:
+        """Every stored buy, named and typed like the parsed insider frame's typed columns (see backtest.py)"""
+        with self._connect() as db:
+            rows = pd.read_sql_query('SELECT filing_ts, trade_date, ticker, insider, title, price, qty, owned, '
+                                     'delta_own, value, new_position FROM trades', db)
+        return pd.DataFrame({
+            'filingTs': pd.to_datetime(rows['filing_ts'], format='ISO8601', errors='coerce'),
+            'tradeTs': pd.to_datetime(rows['trade_date'], format='ISO8601', errors='coerce'),
+            'ticker': rows['ticker'],
+            'insiderName': rows['insider'],
+            'title': rows['title'],
+            'priceNum': rows['price'].astype(float),
+            'quantityNum': rows['qty'].fillna(0).astype('int64'),
+            'ownedNum': rows['owned'].fillna(0).astype('int64'),
+            'percentOwnedIncrease': rows['delta_own'].fillna(0).astype('int64'),
+            'valueNum': rows['value'].astype(float),
+            'newPosition': rows['new_position'].fillna(0).astype(bool),
+        })
+
+    @staticmethod
+    def _count(db) -> tuple:
+        return db.execute('SELECT COUNT(*), COUNT(DISTINCT ticker), MIN(trade_date) FROM trades').fetchone()
+
+    def stats(self) -> dict:
+        # Counted when the store opens and after each ingest that added rows, not on every /status hit
+        count, tickers, oldest = self._counts
+        return {'trades': count, 'tickers': tickers, 'oldestTrade': oldest,
+                'lastIngest': self.last_ingest, 'lastAdded': self.last_added}
+
+
+_trade_store = None
+_trade_store_lock = threading.Lock()
+
+
+def trade_store() -> TradeStore:
+    global _trade_store
+    with _trade_store_lock:
+        if _trade_store is None:
+            _trade_store = TradeStore()
+        return _trade_store
@@ -1,7 +1,7 @@
 import axios from 'axios';
 
 
-const FAST_API_URL = 'http://127.0.0.1:8000';
+export const FAST_API_URL = 'http://127.0.0.1:8000';
 
 export const getAllData = async () => {
     try {
@@ -63,6 +63,42 @@ export const getTenPercentData = async () => {
     }
 };
 
+// One request for several feeds, e.g. roles 'all,ceo,pres,cfo,dir,ten'.
+// Rows are sent once and each bucket lists indexes into them.
+export const getInsiderTrades = async ({ roles = 'all', sort = 'tradeDate', order = 'desc', limit = 100, cursor, minDeltaOwn, minValue } = {}) => {
+    try {
+        const params = { roles, sort, order, limit };
+        if (cursor) params.cursor = cursor;
+        if (minDeltaOwn !== undefined) params.min_delta_own = minDeltaOwn;
+        if (minValue !== undefined) params.min_value = minValue;
+        const response = await axios.get(`${FAST_API_URL}/insider-trades`, { params });
+        const { rows, buckets } = response.data;
+        const feeds = {};
+        Object.keys(buckets).forEach((bucket) => {
+            feeds[bucket] = buckets[bucket].ids.map((i) => rows[i]);
+        });
+        return { ...response.data, feeds };
+    } catch (error) {
+        console.error('Error fetching insider trades:', error);
+        throw error;
+    }
+};
+
+// Latest buys ranked by signal score (cluster buys, size vs holdings and market cap, role).
+// Each row is a trade with a `signal` object: { score, clusterSize, role, cluster, holdings, marketCap }.
+export const getSignals = async ({ roles = 'all', minScore, ticker, limit = 50 } = {}) => {
+    try {
+        const params = { roles, limit };
+        if (minScore !== undefined) params.min_score = minScore;
+        if (ticker) params.ticker = ticker;
+        const response = await axios.get(`${FAST_API_URL}/signals`, { params });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching signals:', error);
+        throw error;
+    }
+};
+
 export const getAIAnalysis = async (ticker) => {
     try {
         const response = await axios.get(`${FAST_API_URL}/analysis/${ticker}`);
@@ -131,6 +167,35 @@ export const getChartDataOneWeek = async (ticker) => {
     }
 };
 
+// Any range ('1d', '1w', '1m', '3m', '6m', 'ytd', '1y', '2y', '5y', 'max') downsampled to maxPoints.
+// Returns [{Date, Close}] rows like the endpoints above, interval defaults to the server's pick for the range.
+export const getSeries = async (ticker, { range = '1y', interval, maxPoints } = {}) => {
+    try {
+        const params = { range };
+        if (interval) params.interval = interval;
+        if (maxPoints) params.max_points = maxPoints;
+        const response = await axios.get(`${FAST_API_URL}/series/${ticker}`, { params });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching chart series:', error);
+        throw error;
+    }
+};
+
+// Series for many tickers in one request (favorites, sparklines).
+// Returns { series: { TICKER: { t, close, ... } }, errors: { TICKER: reason } }.
+export const getSeriesBatch = async (tickers, { range = '1m', interval, maxPoints = 60 } = {}) => {
+    try {
+        const body = { tickers, range, max_points: maxPoints, format: 'columns' };
+        if (interval) body.interval = interval;
+        const response = await axios.post(`${FAST_API_URL}/series/batch`, body);
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching chart series batch:', error);
+        throw error;
+    }
+};
+
 export const getChartDataOneDay = async (ticker) => {
     try {
         const response = await axios.get(`${FAST_API_URL}/ticker-one-day/${ticker}`);
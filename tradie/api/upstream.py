@@ -0,0 +1,316 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import asyncio
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+
+import metrics
+
+
+class UpstreamTimeout(Exception):
+    pass
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream is rate limiting us or its circuit is open, try again after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Matched by class name (whole MRO) so this module never has to import yfinance, requests or google
+RATE_LIMIT_ERRORS = {'YFRateLimitError', 'TooManyRequests', 'ResourceExhausted'}
+TRANSIENT_ERRORS = {'Timeout', 'TimeoutError', 'ConnectionError', 'ChunkedEncodingError', 'ServiceUnavailable',
+                    'DeadlineExceeded', 'InternalServerError', 'BadGateway', 'GatewayTimeout'}
+
+
+def _status_code(error):
+    code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_rate_limit(error: Exception) -> bool:
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return bool(names & RATE_LIMIT_ERRORS) or _status_code(error) == 429
+
+
+def is_transient(error: Exception) -> bool:
+    """Worth retrying: timeouts, dropped connections and 5xx answers"""
+    names = {cls.__name__ for cls in type(error).__mro__}
+    code = _status_code(error)
+    return bool(names & TRANSIENT_ERRORS) or (code is not None and 500 <= code < 600)
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float):
+        """Seconds to sleep before the request may go out, None if that is longer than max_wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            # Tokens may go negative, later callers queue up behind this one
+            self._tokens -= 1
+            return wait
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after `threshold` failures in a row, for `cooldown` seconds.
+
+    After the cooldown one trial call goes through (half-open), its result
+    closes the circuit again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_until == 0:
+            return 'closed'
+        return 'half-open' if time.monotonic() >= self.opened_until else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_until == 0:
+                return True
+            if time.monotonic() < self.opened_until or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def retry_after(self) -> float:
+        return max(1.0, self.opened_until - time.monotonic())
+
+    def release(self):
+        """The allowed call never reached the upstream, let the next one be the trial"""
+        with self._lock:
+            self._trial = False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_until = 0.0
+            self._trial = False
+
+    def failure(self, cooldown: float = None):
+        """Count a failure, `cooldown` opens the circuit right away (e.g. on a rate limit)"""
+        with self._lock:
+            self.failures += 1
+            if cooldown is not None or self._trial or self.failures >= self.threshold:
+                self.opened_until = time.monotonic() + (cooldown or self.cooldown)
+            self._trial = False
+
+
+class Upstream:
+    """A bounded worker pool and a request guard for one blocking upstream (Yahoo, Gemini, ...).
+
+    Async endpoints `await upstream.call(fn, ...)` so the event loop keeps
+    serving other requests while the call runs. Each upstream has its own pool,
+    so a pile of slow Gemini calls can never take the threads chart requests
+    need, and callers stop waiting after `timeout` seconds.
+
+    The functions that actually talk to the upstream go through `run(fn, ...)`:
+    a token bucket spaces requests out, transient errors are retried with
+    jittered exponential backoff, and a circuit breaker stops calling an
+    upstream that keeps failing or rate limits us. Callers then get
+    UpstreamUnavailable right away and serve what they have cached instead.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, timeout: float, rate: float, burst: int,
+                 retries: int = 2, failure_threshold: int = 5, cooldown: float = 30,
+                 rate_limit_cooldown: float = 60):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.requests = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.short_circuited = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter, so retries from many threads don't line up
+        return random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+
+    def run(self, fn, *args, **kwargs):
+        """Call `fn` (blocking) under the rate limit, retry and circuit breaker rules"""
+        with metrics.stage(f'upstream.{self.name}'):
+            return self._run(fn, *args, **kwargs)
+
+    def _run(self, fn, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.short_circuited += 1
+                raise UpstreamUnavailable(f"{self.name} is unavailable after repeated failures",
+                                          self.breaker.retry_after())
+            wait = self.bucket.reserve(max_wait=self.timeout)
+            if wait is None:
+                self.throttled += 1
+                self.breaker.release()
+                raise UpstreamUnavailable(f"Too many {self.name} requests queued", self.timeout)
+            if wait:
+                time.sleep(wait)
+            self.requests += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if is_rate_limit(e):
+                    self.rate_limited += 1
+                    self.failed += 1
+                    self.breaker.failure(cooldown=self.rate_limit_cooldown)
+                    raise UpstreamUnavailable(f"{self.name} is rate limiting requests", self.rate_limit_cooldown) from e
+                if not is_transient(e):
+                    # The upstream answered, the request itself was bad
+                    self.breaker.success()
+                    self.failed += 1
+                    raise
+                self.breaker.failure()
+                if attempt == self.retries:
+                    self.failed += 1
+                    raise
+                self.retried += 1
+                time.sleep(self.backoff(attempt))
+            else:
+                self.breaker.success()
+                return result
+
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                    thread_name_prefix=f'{self.name}-upstream')
+            return self._executor
+
+    async def call(self, fn, *args, timeout: float = None, **kwargs):
+        loop = asyncio.get_running_loop()
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            # In the request's context, so stages timed on the worker count towards it
+            context = contextvars.copy_context()
+            future = loop.run_in_executor(self.executor(), partial(context.run, fn, *args, **kwargs))
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # The worker thread finishes on its own, the request just stops waiting for it
+            self.timeouts += 1
+            raise UpstreamTimeout(f"{self.name} did not answer within {timeout or self.timeout:g}s")
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            'maxConcurrency': self.max_concurrency,
+            'timeout': self.timeout,
+            'inFlight': self.in_flight,
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'requests': self.requests,
+            'retried': self.retried,
+            'rateLimited': self.rate_limited,
+            'shortCircuited': self.short_circuited,
+            'throttled': self.throttled,
+            'failed': self.failed,
+            'breaker': self.breaker.state,
+        }
+
+
+def retry_after_header(error: UpstreamUnavailable) -> dict:
+    return {'Retry-After': str(math.ceil(error.retry_after))}
+
+
+yahoo = Upstream('yahoo',
+                 max_concurrency=int(os.environ.get('TRADIE_YAHOO_CONCURRENCY', '8')),
+                 timeout=float(os.environ.get('TRADIE_YAHOO_TIMEOUT', '20')),
+                 rate=float(os.environ.get('TRADIE_YAHOO_RATE', '5')), burst=10)
+gemini = Upstream('gemini',
+                  max_concurrency=int(os.environ.get('TRADIE_GEMINI_CONCURRENCY', '2')),
+                  timeout=float(os.environ.get('TRADIE_GEMINI_TIMEOUT', '90')),
+                  # The free tier allows 15 requests a minute
+                  rate=float(os.environ.get('TRADIE_GEMINI_RATE', '0.25')), burst=3, retries=1)
+# Only ever called from the refresher thread, which has its own backoff between scrapes
+openinsider = Upstream('openinsider', max_concurrency=1, timeout=30, rate=0.5, burst=2, failure_threshold=3,
+                       cooldown=120, rate_limit_cooldown=600)
+
+UPSTREAMS = {upstream.name: upstream for upstream in (yahoo, gemini, openinsider)}
+
+
+def shutdown():
+    for upstream in UPSTREAMS.values():
+        upstream.shutdown()
+
+
+def stats() -> dict:
+    return {name: upstream.stats() for name, upstream in UPSTREAMS.items()}
+
+
+# stats() key -> (metric, type, help)
+METRICS = {
+    'calls': ('tradie_upstream_calls_total', 'counter', 'Calls endpoints made on the upstream pool'),
+    'requests': ('tradie_upstream_requests_total', 'counter', 'Requests sent to the upstream, retries included'),
+    'failed': ('tradie_upstream_failures_total', 'counter', 'Upstream calls that failed after their retries'),
+    'retried': ('tradie_upstream_retries_total', 'counter', 'Retries after transient upstream errors'),
+    'rateLimited': ('tradie_upstream_rate_limited_total', 'counter', 'Rate limit answers from the upstream'),
+    'shortCircuited': ('tradie_upstream_short_circuited_total', 'counter', 'Calls refused while the circuit was open'),
+    'throttled': ('tradie_upstream_throttled_total', 'counter', 'Calls refused by our own rate limit'),
+    'timeouts': ('tradie_upstream_timeouts_total', 'counter', 'Calls the endpoint stopped waiting for'),
+    'inFlight': ('tradie_upstream_in_flight', 'gauge', 'Calls running on the upstream pool'),
+}
+
+
+def collect_metrics() -> list:
+    snapshots = stats()
+    families = [metrics.Family(name, kind, help, [({'upstream': upstream}, values[key])
+                                                  for upstream, values in snapshots.items()])
+                for key, (name, kind, help) in METRICS.items()]
+    families.append(metrics.Family('tradie_upstream_circuit_state', 'gauge', 'Circuit breaker state (1 = current)',
+                                   [({'upstream': upstream, 'state': state}, int(values['breaker'] == state))
+                                    for upstream, values in snapshots.items()
+                                    for state in ('closed', 'open', 'half-open')]))
+    return families
+
+
+metrics.add_collector(collect_metrics)
@@ -20,14 +20,8 @@ import { IconSymbol } from '@/components/ui/IconSymbol';
 import { Colors } from '@/constants/Colors';
 import { useColorScheme } from '@/hooks/useColorScheme';
 import AsyncStorage from '@react-native-async-storage/async-storage';
-import { 
-  getAllData, 
-  getCeoData, 
-  getCfoData, 
-  getPresData, 
-  getDirectorData, 
-  getTenPercentData 
-} from '@/api/tradieAPI';
+import { getInsiderTrades } from '@/api/tradieAPI';
+import { subscribeToInsiderTrades } from '@/backend/notifications';
 
 const { width: screenWidth } = Dimensions.get('window');
 const FAVORITES_STORAGE_KEY = 'tradie_favorites';
@@ -136,19 +130,19 @@ export default function HomeScreen() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const allDataResponse = await getAllData();
-        const ceoDataResponse = await getCeoData();
-        const presDataResponse = await getPresData();
-        const cfoDataResponse = await getCfoData();
-        const dirDataResponse = await getDirectorData();
-        const tenPercentDataResponse = await getTenPercentData();
+        // Every tab's feed in one request instead of six
+        const { feeds } = await getInsiderTrades({
+          roles: 'all,ceo,pres,cfo,dir,ten',
+          sort: 'filingDate',
+          limit: 1000,
+        });
 
-        setAllData(allDataResponse);
-        setCeoData(ceoDataResponse);
-        setPresData(presDataResponse);
-        setCfoData(cfoDataResponse);
-        setDirData(dirDataResponse);
-        setTenPercentData(tenPercentDataResponse);
+        setAllData(feeds.all);
+        setCeoData(feeds.ceo);
+        setPresData(feeds.pres);
+        setCfoData(feeds.cfo);
+        setDirData(feeds.dir);
+        setTenPercentData(feeds.ten);
       } catch (error) {
         console.error('Error fetching data:', error);
       } finally {
@@ -157,6 +151,8 @@ export default function HomeScreen() {
     };
 
     fetchData();
+    // Refetch when the server pushes new trades instead of polling
+    return subscribeToInsiderTrades({ onTrades: fetchData, onResync: fetchData });
   }, []);
 
   // Toggle sort order when sort button is pressed
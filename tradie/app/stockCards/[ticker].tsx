@@ -23,11 +23,7 @@ import { Colors } from '@/constants/Colors';
 import { useColorScheme } from '@/hooks/useColorScheme';
 import { 
   getAIAnalysis, 
-  getChartData, 
-  getChartDataOneWeek,
-  getChartDataOneMonth,
-  getChartDataThreeMonth,
-  getChartDataOneYear
+  getSeries
 } from '@/api/tradieAPI';
 import { LineChart } from 'react-native-svg-charts';
 import * as shape from 'd3-shape';
@@ -111,25 +107,13 @@ export default function StockDetails() {
     setAnimatedData([]); // Reset animated data
     
     try {
-      let data;
-      switch (period) {
-        case '1w':
-          data = await getChartDataOneWeek(String(ticker));
-          break;
-        case '1m':
-          data = await getChartDataOneMonth(String(ticker));
-          break;
-        case '3m':
-          data = await getChartDataThreeMonth(String(ticker));
-          break;
-        case '1y':
-          data = await getChartDataOneYear(String(ticker));
-          break;
-        case 'ytd':
-        default:
-          data = await getChartData(String(ticker));
-          break;
-      }
+      // Downsampled on the server, never more points than the chart has pixels.
+      // Daily bars come from the server's bar store, so switching tabs never waits on Yahoo
+      const data = await getSeries(String(ticker), {
+        range: period,
+        interval: '1d',
+        maxPoints: Math.round(Dimensions.get('window').width),
+      });
       
       // Ensure data is an array and has the correct format
       const validData = Array.isArray(data) ? data.filter(item => 
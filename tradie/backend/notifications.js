@@ -0,0 +1,50 @@
+import { FAST_API_URL } from '../api/tradieAPI';
+
+const WS_URL = FAST_API_URL.replace(/^http/, 'ws');
+const MAX_RETRY_DELAY = 60000;
+
+// Live insider buys from the API's /ws/trades stream.
+// onTrades(rows) gets every batch of new rows, onResync() means rows were missed and the feed should be refetched.
+// roles: 'ceo,cfo', tickers: ['AAPL', 'NVDA'] (both optional). Returns a function that closes the stream.
+export const subscribeToInsiderTrades = ({ roles, tickers, onTrades, onResync } = {}) => {
+  let socket = null;
+  let lastSnapshotId = null;
+  let retries = 0;
+  let retryTimer = null;
+  let closed = false;
+
+  const connect = () => {
+    const params = [];
+    if (roles) params.push(`roles=${encodeURIComponent(roles)}`);
+    if (tickers && tickers.length) params.push(`tickers=${encodeURIComponent(tickers.join(','))}`);
+    // After a reconnect the server sends whatever was missed since this snapshot
+    if (lastSnapshotId !== null) params.push(`since=${lastSnapshotId}`);
+    socket = new WebSocket(`${WS_URL}/ws/trades${params.length ? `?${params.join('&')}` : ''}`);
+
+    socket.onmessage = (message) => {
+      retries = 0;
+      try {
+        const { event, data } = JSON.parse(message.data);
+        if (data.snapshotId !== undefined) lastSnapshotId = data.snapshotId;
+        if (event === 'trades' && onTrades) onTrades(data.rows);
+        if (event === 'resync' && onResync) onResync();
+      } catch (error) {
+        console.error('Bad message on insider trade stream:', error);
+      }
+    };
+
+    socket.onclose = () => {
+      if (closed) return;
+      const delay = Math.min(MAX_RETRY_DELAY, 1000 * 2 ** retries);
+      retries += 1;
+      retryTimer = setTimeout(connect, delay);
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (socket) socket.close();
+  };
+};